@@ -0,0 +1,227 @@
+"""
+Memory-resident aligner engines for SeqImprove's cached indexes.
+
+The SYNBICT aligners start a new aligner process per request, which reloads
+the whole index from disk. An engine keeps an index loaded between requests
+and exposes the same align(target_doc, output_path, exact_match, query_seq)
+call, so alignment.align_and_extract_matches can use either:
+
+- Minimap2: an in-process mappy.Aligner holding the .mmi index (optional
+  dependency; without mappy, Minimap2 falls back to the SYNBICT aligner)
+- BWA: one index per process is staged in shared memory with `bwa shm`; the
+  SYNBICT BwaAligner's `bwa mem` then attaches to it instead of reading the
+  index files (other BWA indexes are read from disk as before)
+- KmerIndex / Myers: the built-in matchers (kmer_index, myers_matcher) keep
+  their loaded index
+- BLASTN has no resident mode; blastn memory-maps its database, which stays in
+  the page cache between requests
+
+Engines are created on first use of an index, bounded by an LRU of their own,
+and dropped when IndexManager evicts or removes their index (on_index_removed).
+Dropping only forgets the registry's reference: a request still aligning with
+the engine keeps it alive, and it is freed with its last user.
+
+`bwa shm` staging is host-wide and `bwa shm -d` destroys every staged index,
+including other processes'. Staged indexes therefore stay until the process
+exits, and every process that staged one holds a shared lock on
+<lock_dir>/bwa-shm.lock. At exit, a process runs `bwa shm -d` only if it can
+then lock that file exclusively, i.e. no other process still relies on shm.
+"""
+
+import atexit
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack
+from pathlib import Path
+from typing import Optional, Union
+
+import sbol2
+
+from sequences_to_features import BwaAligner
+
+from file_locks import file_lock
+from kmer_index import KmerIndexAligner
+from myers_matcher import MyersAligner
+from sam_output import sam_record, target_query, unmapped_sam_record
+
+try:
+    import mappy
+except ImportError:  # optional: Minimap2 falls back to the SYNBICT aligner
+    mappy = None
+
+
+DEFAULT_MAX_ENGINES = 8
+BWA_SHM_LOCK = "bwa-shm.lock"
+
+
+class MappyEngine:
+    """Minimap2 index (.mmi) loaded in-process; writes SAM like `minimap2 -a`."""
+
+    algorithm = "minimap2"
+
+    def __init__(self, index_prefix: str):
+        self.index_prefix = index_prefix
+        self.aligner = mappy.Aligner(fn_idx_in=index_prefix + ".mmi")
+        if not self.aligner:
+            raise RuntimeError(f"Could not load minimap2 index {index_prefix}.mmi")
+        # reference dictionary for the SAM header, read once
+        self.header = "@HD\tVN:1.6\tSO:unsorted\n" + "".join(
+            f"@SQ\tSN:{name}\tLN:{len(self.aligner.seq(name))}\n" for name in self.aligner.seq_names
+        ) + "@PG\tID:minimap2\tPN:mappy\n"
+
+    def align(self, target_doc: sbol2.Document, output_path: str, exact_match: bool, query_seq: Optional[str] = None):
+        # exact_match is applied by SAMFeatureMapper when it reads the output
+        name, sequence = target_query(target_doc, query_seq)
+        records = [
+            sam_record(name, sequence, hit.ctg, hit.r_st, hit.q_st, hit.q_en, hit.strand, hit.cigar_str,
+                       hit.NM, hit.MD, flag=0 if hit.is_primary else 256, mapq=hit.mapq)
+            for hit in self.aligner.map(sequence, MD=True)
+        ]
+        if not records:
+            records.append(unmapped_sam_record(name, sequence))
+
+        with open(output_path, 'w') as f:
+            f.write(self.header)
+            f.writelines(records)
+
+
+class BwaShmEngine:
+    """BWA index staged in shared memory (`bwa shm`); `bwa mem` attaches to it instead of loading from disk."""
+
+    algorithm = "bwa"
+
+    def __init__(self, index_prefix: str):
+        self.index_prefix = index_prefix
+        subprocess.run(["bwa", "shm", self.index_prefix], check=True, capture_output=True, text=True)
+
+    def align(self, target_doc: sbol2.Document, output_path: str, exact_match: bool, query_seq: Optional[str] = None):
+        BwaAligner(self.index_prefix).align(target_doc, output_path, exact_match, query_seq=query_seq)
+
+
+ENGINE_TYPES = {
+    "minimap2": MappyEngine,
+    "bwa": BwaShmEngine,
+    "kmerindex": KmerIndexAligner,
+    "myers": MyersAligner,
+}
+
+
+class AlignerEngines:
+    """
+    Registry of resident engines, keyed by (algorithm, index prefix). Thread-safe.
+
+    get() returns None when an algorithm has no engine or the engine could not
+    be started; the caller then runs the SYNBICT aligner as before. BWA engines
+    need lock_dir (see the module docstring) and are limited to one staged
+    index per process.
+    """
+
+    def __init__(self, max_engines: int = DEFAULT_MAX_ENGINES, lock_dir: Optional[Union[str, Path]] = None):
+        self.max_engines = max_engines
+        self.lock_dir = Path(lock_dir) if lock_dir is not None else None
+        self._lock = threading.Lock()
+        self._bwa_engine: Optional[BwaShmEngine] = None  # the index this process staged with `bwa shm`
+        self._shm_lock = ExitStack()  # shared bwa-shm.lock, held from staging until exit
+        self._engines: "OrderedDict[tuple, object]" = OrderedDict()  # (algorithm, prefix) -> engine, LRU first
+        self._failed = {}  # (algorithm, prefix) -> error (not retried until the index is removed)
+        self._queries = {}  # (algorithm, prefix) -> queries served
+        self._loaded_at = {}  # (algorithm, prefix) -> time the engine started
+
+    def get(self, algorithm: str, index_prefix: str):
+        """Get the engine for an index, starting it on first use; None to use the SYNBICT aligner."""
+        engine_type = ENGINE_TYPES.get(algorithm.lower())
+        if engine_type is None or (engine_type is MappyEngine and mappy is None):
+            return None
+        key = (engine_type.algorithm, index_prefix)
+
+        with self._lock:
+            engine = self._engines.get(key)
+            if engine is not None:
+                self._engines.move_to_end(key)
+                self._queries[key] += 1
+                return engine
+            if key in self._failed:
+                return None
+            if engine_type is BwaShmEngine and (self.lock_dir is None or (
+                    self._bwa_engine is not None and self._bwa_engine.index_prefix != index_prefix)):
+                return None  # one staged index per process; the others are read from disk
+
+            try:
+                if engine_type is BwaShmEngine:
+                    engine = self._start_bwa(index_prefix)
+                else:
+                    engine = engine_type(index_prefix)
+            except (OSError, ValueError, RuntimeError, subprocess.CalledProcessError) as e:
+                print(f"Warning: Could not start resident {algorithm} engine for {index_prefix}: {e}")
+                self._failed[key] = str(e)
+                return None
+
+            self._engines[key] = engine
+            self._queries[key] = 1
+            self._loaded_at[key] = time.time()
+            print(f"Started resident {algorithm} engine for {index_prefix}")
+
+            while len(self._engines) > self.max_engines:
+                self._drop(next(iter(self._engines)))
+            return engine
+
+    def _start_bwa(self, index_prefix: str) -> BwaShmEngine:
+        """Stage this process's BWA index, or reuse it after a drop. Caller must hold the lock."""
+        if self._bwa_engine is not None:
+            return self._bwa_engine  # still staged
+
+        # blocks while another process's exit cleanup is running `bwa shm -d`
+        self._shm_lock.enter_context(file_lock(self.lock_dir / BWA_SHM_LOCK, shared=True))
+        try:
+            engine = BwaShmEngine(index_prefix)
+        except BaseException:
+            self._shm_lock.close()
+            raise
+        self._bwa_engine = engine
+        atexit.register(self._destroy_shm)
+        return engine
+
+    def _destroy_shm(self):
+        """At exit: destroy the staged BWA indexes unless another process still holds bwa-shm.lock."""
+        self._shm_lock.close()
+        with file_lock(self.lock_dir / BWA_SHM_LOCK, blocking=False) as held:
+            if held:
+                subprocess.run(["bwa", "shm", "-d"], check=False, capture_output=True, text=True)
+
+    def _drop(self, key: tuple):
+        """Forget an engine; requests still using it keep their reference. Caller must hold the lock."""
+        self._engines.pop(key, None)
+        self._queries.pop(key, None)
+        self._loaded_at.pop(key, None)
+
+    def on_index_removed(self, index_key: str, index_prefix: str):
+        """IndexManager removal listener: drop the engine of an evicted or removed index."""
+        with self._lock:
+            for key in [key for key in list(self._engines) + list(self._failed) if key[1] == index_prefix]:
+                self._failed.pop(key, None)
+                self._drop(key)
+
+    def clear(self):
+        """Drop every engine."""
+        with self._lock:
+            for key in list(self._engines):
+                self._drop(key)
+            self._failed.clear()
+
+    def get_stats(self) -> dict:
+        """Get statistics about the resident engines."""
+        with self._lock:
+            return {
+                "max_engines": self.max_engines,
+                "mappy_available": mappy is not None,
+                "bwa_shm_index": self._bwa_engine.index_prefix if self._bwa_engine is not None else None,
+                "engines": [
+                    {"index_prefix": key[1], "algorithm": key[0], "queries": self._queries[key],
+                     "loaded_at": self._loaded_at[key]}
+                    for key in self._engines
+                ],
+                "failed": [{"index_prefix": key[1], "algorithm": key[0], "error": error}
+                           for key, error in self._failed.items()],
+            }
@@ -0,0 +1,407 @@
+"""
+Alignment of target sequences against cached indexes for SeqImprove.
+
+Wraps the SYNBICT aligners (BWA, Minimap2, BLASTN), the built-in aligners
+(exact-match KmerIndex in kmer_index, approximate Myers in myers_matcher) and
+their feature mappers:
+- A single index prefix (combined index, or a BLAST alias over shards) is
+  aligned against once
+- Several prefixes (per-library BWA / Minimap2 shards) are aligned against one
+  by one and their SAM outputs merged before SAMFeatureMapper parses them
+- With an AlignerEngines registry, indexes that have a resident engine
+  (aligner_engines) are queried through it instead of a new aligner process
+- In streaming mode the alignment output is a named pipe: the feature mapper
+  parses records while the aligner is still writing them, and no alignment
+  file is written to disk
+- Long targets (SAM aligners) are split into windows that overlap by the
+  longest library feature and aligned concurrently; the window outputs are
+  shifted back into target coordinates and merged before the mapper reads
+  them; hits cut off by an inner window edge are dropped (see plan_windows
+  and shift_sam_record)
+"""
+
+import os
+import re
+import select
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor
+from typing import Callable, Dict, List, Optional, Tuple
+
+import sbol2
+
+from sequences_to_features import BwaAligner, Minimap2Aligner, BlastAligner
+from sequences_to_features.Annotator import SAMFeatureMapper, TableFeatureMapper
+
+from kmer_index import KmerIndexAligner
+from myers_matcher import MyersAligner
+from sam_output import target_query, unmapped_sam_record
+
+
+# aligners whose output is SAM (mergeable across shards)
+SAM_ALIGNERS = {
+    'bwa': BwaAligner,
+    'minimap2': Minimap2Aligner,
+    'kmerindex': KmerIndexAligner,  # built-in, exact matches only
+    'myers': MyersAligner,  # built-in, exact and similar matches without seeding
+}
+
+# aligners whose output is BLAST tabular
+TABLE_ALIGNERS = {
+    'blastn': BlastAligner,
+}
+
+SUPPORTED_ALGORITHMS = set(SAM_ALIGNERS) | set(TABLE_ALIGNERS)
+
+_CIGAR_OPS = re.compile(r"(\d+)([MIDNSHP=X])")
+
+
+def is_supported(algorithm: str) -> bool:
+    """Check if an algorithm name is one of the index-based aligners."""
+    return algorithm.lower() in SUPPORTED_ALGORITHMS
+
+
+def merge_sam_files(sam_paths: List[str], output_path: str,
+                    rewrites: Optional[List[Callable[[str], Optional[str]]]] = None,
+                    empty_record: Optional[str] = None):
+    """
+    Merge SAM files produced against different reference shards into one.
+
+    Header lines are unioned (one @HD, every distinct @SQ/@RG/@PG/@CO line), then
+    the alignment records of every input follow in order. rewrites (one per
+    input) optionally map each record to a new line, or None to drop it;
+    empty_record is written if no record was.
+    """
+    header_seen = set()
+    has_hd = False
+    records = 0
+
+    with open(output_path, 'w') as out:
+        # headers first — SAM requires them before any record
+        for sam_path in sam_paths:
+            with open(sam_path, 'r') as f:
+                for line in f:
+                    if not line.startswith('@'):
+                        break
+                    if line.startswith('@HD'):
+                        if has_hd:
+                            continue
+                        has_hd = True
+                    elif line in header_seen:
+                        continue
+                    header_seen.add(line)
+                    out.write(line)
+
+        for i, sam_path in enumerate(sam_paths):
+            rewrite = rewrites[i] if rewrites else None
+            with open(sam_path, 'r') as f:
+                for line in f:
+                    if line.startswith('@'):
+                        continue
+                    if rewrite is not None:
+                        line = rewrite(line)
+                        if line is None:
+                            continue
+                    out.write(line)
+                    records += 1
+
+        if not records and empty_record:
+            out.write(empty_record)
+
+
+def plan_windows(length: int, window_size: int, overlap: int) -> List[Tuple[int, int, int]]:
+    """
+    Split a query into windows of window_size + overlap bases, window_size apart.
+
+    Returns (start, end, owned_end) per window: a hit belongs to the window
+    where it starts in [start, owned_end), so a hit no longer than overlap is
+    reported whole by exactly one window.
+    """
+    windows = []
+    start = 0
+    while start + window_size + overlap < length:
+        windows.append((start, start + window_size + overlap, start + window_size))
+        start += window_size
+    windows.append((start, length, length))
+    return windows
+
+
+def drop_unmapped_record(line: str) -> Optional[str]:
+    """merge_sam_files rewrite keeping only mapped records."""
+    return None if int(line.split('\t', 2)[1]) & 4 else line
+
+
+def reference_lengths(sam_paths: List[str]) -> Dict[str, int]:
+    """Reference name -> length, from the @SQ header lines of SAM files."""
+    lengths = {}
+    for sam_path in sam_paths:
+        with open(sam_path, 'r') as f:
+            for line in f:
+                if not line.startswith('@'):
+                    break
+                if line.startswith('@SQ'):
+                    tags = dict(field.split(':', 1) for field in line.rstrip('\n').split('\t')[1:] if ':' in field)
+                    if 'SN' in tags and tags.get('LN', '').isdigit():
+                        lengths[tags['SN']] = int(tags['LN'])
+    return lengths
+
+
+def shift_sam_record(line: str, window: Tuple[int, int, int], query_length: int,
+                     ref_lengths: Optional[Dict[str, int]] = None) -> Optional[str]:
+    """
+    Rewrite a SAM record of a window's alignment into whole-query coordinates.
+
+    The query outside the window becomes hard clips (SEQ stays the window's),
+    the way aligners write supplementary records. Returns None for unmapped
+    records, for hits another window owns and for hits cut off by an inner
+    window edge: the unaligned part of the feature on that side does not fit
+    between the alignment and the edge (ref_lengths gives the feature lengths
+    for the side after the alignment). A feature cut off by one window lies
+    whole in the previous or next one. SA tags, which hold window coordinates,
+    are dropped.
+    """
+    start, end, owned_end = window
+    fields = line.rstrip('\n').split('\t')
+    flag = int(fields[1])
+    if flag & 4 or fields[5] == '*':
+        return None
+
+    operations = [(int(length), op) for length, op in _CIGAR_OPS.findall(fields[5])]
+    leading = trailing = 0
+    for length, op in operations:
+        if op not in 'HS':
+            break
+        leading += length
+    for length, op in reversed(operations):
+        if op not in 'HS':
+            break
+        trailing += length
+
+    # reverse-strand CIGARs run along the reverse complement of the window
+    reverse = bool(flag & 16)
+    hit_start = start + (trailing if reverse else leading)
+    if not start <= hit_start < owned_end:
+        return None
+
+    # feature bases left unaligned before and after the hit
+    ref_before = int(fields[3]) - 1
+    ref_span = sum(length for length, op in operations if op in 'MDN=X')
+    ref_length = (ref_lengths or {}).get(fields[2])
+    ref_after = ref_length - ref_before - ref_span if ref_length is not None else 0
+    left_room, left_missing, right_room, right_missing = leading, ref_before, trailing, ref_after
+    if reverse:
+        left_room, left_missing, right_room, right_missing = trailing, ref_after, leading, ref_before
+    if (start > 0 and left_room < left_missing) or (end < query_length and right_room < right_missing):
+        return None
+
+    before, after = start, query_length - end
+    if reverse:
+        before, after = after, before
+    if before:
+        if operations[0][1] == 'H':
+            operations[0] = (operations[0][0] + before, 'H')
+        else:
+            operations.insert(0, (before, 'H'))
+    if after:
+        if operations[-1][1] == 'H':
+            operations[-1] = (operations[-1][0] + after, 'H')
+        else:
+            operations.append((after, 'H'))
+
+    fields[5] = "".join(f"{length}{op}" for length, op in operations)
+    fields = fields[:11] + [tag for tag in fields[11:] if not tag.startswith('SA:Z:')]
+    return '\t'.join(fields) + '\n'
+
+
+def align_windows(algorithm: str, index_prefixes: List[str], target_doc: sbol2.Document, exact_match: bool,
+                  query: str, windows: List[Tuple[int, int, int]], output_path: str, tmp_dir: str,
+                  engines=None, executor: Optional[Executor] = None):
+    """
+    Align each window of a query against each index (SAM aligners) and merge the outputs
+    into one SAM in whole-query coordinates. Windows run concurrently on executor.
+    """
+    tasks = [(w, s) for w in range(len(windows)) for s in range(len(index_prefixes))]
+
+    def align_window(task):
+        w, s = task
+        window_output = os.path.join(tmp_dir, f'window_{w}_{s}.sam')
+        start, end, _ = windows[w]
+        get_aligner(algorithm, index_prefixes[s], engines).align(
+            target_doc, window_output, exact_match, query_seq=query[start:end])
+        return window_output
+
+    # list() re-raises the first failure
+    window_outputs = list(executor.map(align_window, tasks) if executor is not None else map(align_window, tasks))
+    # the first window's outputs carry the header of every index
+    ref_lengths = reference_lengths(window_outputs[:len(index_prefixes)])
+    rewrites = [lambda line, window=windows[w]: shift_sam_record(line, window, len(query), ref_lengths)
+                for w, _ in tasks]
+    name, _ = target_query(target_doc, query)
+    merge_sam_files(window_outputs, output_path, rewrites, empty_record=unmapped_sam_record(name, query))
+
+
+def can_stream() -> bool:
+    """Check if streaming mode is available (named pipes, POSIX only)."""
+    return hasattr(os, 'mkfifo')
+
+
+def _drain_pipe(pipe_path: str, writer_done: threading.Event):
+    """Read and discard a pipe until its writer has finished, so a writer is never left blocked."""
+    fd = os.open(pipe_path, os.O_RDONLY | os.O_NONBLOCK)
+    try:
+        while True:
+            readable, _, _ = select.select([fd], [], [], 0.1)
+            data = os.read(fd, 65536) if readable else None
+            if not data:
+                # EOF (no writer right now) or nothing yet: done only once the writer has returned
+                if writer_done.is_set():
+                    return
+                if data == b"":
+                    time.sleep(0.01)
+    finally:
+        os.close(fd)
+
+
+def _release_reader(pipe_path: str, reader: threading.Thread):
+    """Give a reader blocked opening the pipe an EOF (the writer never opened it, or already closed it)."""
+    while reader.is_alive():
+        try:
+            os.close(os.open(pipe_path, os.O_WRONLY | os.O_NONBLOCK))
+        except OSError:
+            pass  # reader not at open() yet, or already past it
+        reader.join(0.05)
+
+
+def run_streamed(write_output: Callable[[str], None], read_output: Callable[[str], Tuple[list, list]],
+                 tmp_dir: str) -> Tuple[list, list]:
+    """
+    Run an aligner and a feature mapper concurrently over a named pipe.
+
+    write_output(path) writes the alignment (e.g. Aligner.align) and
+    read_output(path) parses it (e.g. SAMFeatureMapper); the reader runs in its
+    own thread. If either side fails, the other is released instead of being
+    left blocked on the pipe, and the first error is raised.
+    """
+    pipe_path = os.path.join(tmp_dir, 'aligned.pipe')
+    os.mkfifo(pipe_path)
+
+    writer_done = threading.Event()
+    outcome = {}
+
+    def read():
+        try:
+            outcome["matches"] = read_output(pipe_path)
+        except BaseException as e:
+            outcome["error"] = e
+        finally:
+            _drain_pipe(pipe_path, writer_done)
+
+    reader = threading.Thread(target=read, name="alignment-reader", daemon=True)
+    reader.start()
+    try:
+        write_output(pipe_path)
+    finally:
+        writer_done.set()
+        _release_reader(pipe_path, reader)
+
+    if "error" in outcome:
+        raise outcome["error"]
+    return outcome["matches"]
+
+
+def get_aligner(algorithm: str, index_prefix: str, engines=None):
+    """The resident engine for an index if there is one, else a new SYNBICT aligner."""
+    algo_normalized = algorithm.lower()
+    engine = engines.get(algo_normalized, index_prefix) if engines is not None else None
+    if engine is not None:
+        return engine
+    if algo_normalized in SAM_ALIGNERS:
+        return SAM_ALIGNERS[algo_normalized](index_prefix)
+    return TABLE_ALIGNERS[algo_normalized](index_prefix)
+
+
+def align_and_extract_matches(algorithm: str, index_prefixes: List[str], target_doc: sbol2.Document,
+                              exact_match: bool, min_feature_length: int,
+                              query_seq: Optional[str] = None, engines=None,
+                              stream: bool = False, window_size: int = 0, window_overlap: int = 0,
+                              executor: Optional[Executor] = None) -> Tuple[list, list]:
+    """
+    Align a target against one or more indexes and map hits to library features.
+
+    Args:
+        algorithm: One of 'BWA', 'Minimap2', 'BLASTN', 'KmerIndex', 'Myers'
+        index_prefixes: Index prefixes from IndexManager.get_index_prefixes
+        target_doc: Target SBOL document (its first sequence is the query)
+        exact_match: If True, require exact DNA matches; if False, allow ≥95% identity
+        min_feature_length: Minimum match length kept by the mapper
+        query_seq: Optional query override (e.g. circular targets with an origin overlap)
+        engines: Optional AlignerEngines registry of resident aligners
+        stream: Pipe the alignment output into the mapper instead of a temp file (see run_streamed)
+        window_size: If set, SAM aligners align queries longer than window_size + window_overlap
+            in overlapping windows (see plan_windows), window_overlap being at least the
+            longest library feature
+        executor: Runs the windows concurrently (sequentially without one)
+
+    Returns:
+        Tuple of (inline_matches, rc_matches) for FeatureAnnotatorSimple
+    """
+    algo_normalized = algorithm.lower()
+
+    # temp files cleaned up automatically when TemporaryDirectory exits
+    with tempfile.TemporaryDirectory(prefix="seqimprove_align_") as tmp_dir:
+        query = target_query(target_doc, query_seq)[1] if window_size else None
+        if algo_normalized in SAM_ALIGNERS and query and len(query) > window_size + window_overlap:
+            windows = plan_windows(len(query), window_size, window_overlap)
+
+            def write_output(path):
+                align_windows(algo_normalized, index_prefixes, target_doc, exact_match, query, windows, path,
+                              tmp_dir, engines=engines, executor=executor)
+
+            def read_output(path):
+                return SAMFeatureMapper(path).extract_matches(min_feature_length, exact_match)
+
+            output_path = os.path.join(tmp_dir, 'aligned.sam')
+        elif algo_normalized in SAM_ALIGNERS:
+            if len(index_prefixes) == 1:
+                def write_output(path):
+                    get_aligner(algo_normalized, index_prefixes[0], engines).align(
+                        target_doc, path, exact_match, query_seq=query_seq)
+            else:
+                # shards are merged header-first, so each shard's output is a file; the merge streams
+                shard_outputs = []
+                for i, index_prefix in enumerate(index_prefixes):
+                    shard_output = os.path.join(tmp_dir, f'aligned_{i}.sam')
+                    get_aligner(algo_normalized, index_prefix, engines).align(
+                        target_doc, shard_output, exact_match, query_seq=query_seq)
+                    shard_outputs.append(shard_output)
+
+                # every shard reports the unmapped query; the merged output reports it once
+                name, sequence = target_query(target_doc, query_seq)
+
+                def write_output(path):
+                    merge_sam_files(shard_outputs, path, [drop_unmapped_record] * len(shard_outputs),
+                                    empty_record=unmapped_sam_record(name, sequence))
+
+            def read_output(path):
+                return SAMFeatureMapper(path).extract_matches(min_feature_length, exact_match)
+
+            output_path = os.path.join(tmp_dir, 'aligned.sam')
+        elif algo_normalized in TABLE_ALIGNERS:
+            # sharded BLAST selections arrive as a single alias database
+            def write_output(path):
+                get_aligner(algo_normalized, index_prefixes[0], engines).align(
+                    target_doc, path, exact_match, query_seq=query_seq)
+
+            def read_output(path):
+                return TableFeatureMapper(path).extract_matches(min_feature_length, exact_match)
+
+            output_path = os.path.join(tmp_dir, 'aligned.txt')
+        else:
+            raise ValueError(f'Algorithm {algorithm} not supported')
+
+        if stream and can_stream():
+            return run_streamed(write_output, read_output, tmp_dir)
+
+        write_output(output_path)
+        return read_output(output_path)
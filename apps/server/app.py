@@ -1,5 +1,5 @@
 from typing import Optional, List
-from flask import Flask, request
+from flask import Flask, Response, request, stream_with_context
 from flask_cors import CORS
 from flask_api import status
 # from quart import Quart
@@ -9,20 +9,23 @@ import os
 import asyncio
 import shutil
 import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from pathlib import Path
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(levelname)s] %(message)s')
 logger = logging.getLogger(__name__)
 import json
+import hashlib
 import subprocess
 import tempfile
 import requests
 import re, sys
 from sequences_to_features import FeatureAnnotater, load_sbol, FeatureLibrary, download_sequences
-from sequences_to_features.Annotator import SAMFeatureMapper, TableFeatureMapper, ProkkaTableFeatureMapper
+from sequences_to_features.Annotator import ProkkaTableFeatureMapper
 from sequences_to_features.FeatureAnnotatorBase import FeatureAnnotatorSimple
 from sequences_to_features.FeatureExtractor import FeatureExtractor
-from sequences_to_features import BwaAligner, Minimap2Aligner, BlastAligner, ProkkaAligner, ProkkaParser
+from sequences_to_features import ProkkaParser
 from waitress import serve
 
 conda_bin = os.path.expanduser("~/miniconda3/envs/synbict_conda/bin")
@@ -32,63 +35,208 @@ prokka_bin = os.environ.get("PROKKA_BIN") or os.path.expanduser("~/miniconda3/en
 # Put conda env bins FIRST so `perl` and `prokka` resolve correctly
 os.environ["PATH"] = f"{prokka_bin}:{conda_bin}:" + os.environ["PATH"]
 
-print("Python:", sys.executable)
-print("CONDA_PREFIX:", os.environ.get("CONDA_PREFIX"))
-print("PATH head:", os.environ.get("PATH","").split(":")[:5])
+def print_toolchain_diagnostics():
+    """Print the interpreter, PATH and the Prokka / Perl / BioPerl toolchain (once, from setup)."""
+    print("Python:", sys.executable)
+    print("CONDA_PREFIX:", os.environ.get("CONDA_PREFIX"))
+    print("PATH head:", os.environ.get("PATH","").split(":")[:5])
 
-print("\nwhich prokka:")
-subprocess.run(["bash", "-lc", "which prokka && prokka --version"], check=False)
+    print("\nwhich prokka:")
+    subprocess.run(["bash", "-lc", "which prokka && prokka --version"], check=False)
 
-print("\nwhich perl:")
-subprocess.run(["bash", "-lc", "which perl && perl -v | head -n 2"], check=False)
+    print("\nwhich perl:")
+    subprocess.run(["bash", "-lc", "which perl && perl -v | head -n 2"], check=False)
 
-print("\nBioPerl hmmer3 module check:")
-subprocess.run(["bash", "-lc", "perl -MBio::SearchIO::hmmer3 -e 'print \"OK\\n\"'"], check=False)
+    print("\nBioPerl hmmer3 module check:")
+    subprocess.run(["bash", "-lc", "perl -MBio::SearchIO::hmmer3 -e 'print \"OK\\n\"'"], check=False)
 
-# Prokka uses hardcoded paths (./database_protein.fasta, ./PROKKA_SYNBICT/) so
-# concurrent invocations would clobber each other. Serialize them.
-_prokka_lock = threading.Lock()
+# Prokka uses hardcoded paths (./database_protein.fasta, ./PROKKA_SYNBICT/), so each
+# run happens in a worker process inside its own scratch directory. This bounds how
+# many run at once.
+PROKKA_WORKER = str(Path(__file__).resolve().parent / "prokka_worker.py")
+PROKKA_TIMEOUT = int(os.environ.get("SEQIMPROVE_PROKKA_TIMEOUT") or 1800)  # seconds
+_prokka_slots = threading.BoundedSemaphore(int(os.environ.get("SEQIMPROVE_PROKKA_CONCURRENCY") or 2))
 
 # import caching system
 from library_cache import (
     init_cache, get_library_cache, get_index_manager,
     LibraryCache, IndexManager
 )
+from jobs import JobManager, QueueFullError, DEFAULT_RETRY_AFTER
+from result_cache import ResultCache, make_result_key
+from prokka_cache import ProkkaCache, make_prokka_key
+from flashtext_annotation import build_merged_matcher, annotate_single_pass
+from aligner_engines import AlignerEngines
+import alignment
 
 # cache instances — initialized in setup(), used throughout the app
 library_cache: LibraryCache = None
 index_manager: IndexManager = None
 
+# background index builds — bounded pool, separate from the request threads
+index_build_jobs: JobManager = None
+
+# resident aligner engines (loaded indexes) — None unless SEQIMPROVE_RESIDENT_ALIGNERS is set
+aligner_engines: Optional[AlignerEngines] = None
+
+# index pre-warming — (algorithm, library set) entries built in the background at startup
+PREWARM_ALL_LIBRARIES = "all"  # preset: every bundled library
+PREWARM_ENTRIES = []
+
+# annotation results keyed by target + library hashes + algorithm + flags (memory + disk tiers)
+result_cache: ResultCache = None
+
+# Prokka outputs keyed by target sequence + topology + protein database
+prokka_cache: ProkkaCache = None
+
+# asynchronous annotation jobs — results kept for a TTL so clients can poll / reconnect
+annotation_jobs: JobManager = None
+
+# batch annotation — documents of one batch are annotated across this pool
+annotation_pool: ThreadPoolExecutor = None
+MAX_BATCH_SIZE = int(os.environ.get("SEQIMPROVE_MAX_BATCH_SIZE") or 500)
+
+# per-library FlashText annotation — the libraries of one request are annotated across this pool
+flashtext_pool: ThreadPoolExecutor = None
+
+# long targets — the windows of one alignment are aligned across this pool
+window_pool: ThreadPoolExecutor = None
+
 # FlashText FeatureLibrary dict (keyed by path or SynBioHub URL)
 # For alignment algorithms, use library_cache.get_feature_library_for_subset() instead
 FEATURE_LIBRARIES = {}
 
-def setup():
-    print("Initializing the app...")
+# FlashText FeatureAnnotaters (keyword automata), same keys as FEATURE_LIBRARIES.
+# Built once per library and reused by every request.
+FEATURE_ANNOTATERS = {}
+FLASHTEXT_MIN_FEATURE_LENGTH = 10
+
+# merged automata for single-pass FlashText, keyed by library selection (LRU)
+MERGED_MATCHERS = OrderedDict()
+MAX_MERGED_MATCHERS = int(os.environ.get("SEQIMPROVE_MERGED_MATCHERS") or 4)
+_merged_matchers_lock = threading.Lock()
+
+def _env_flag(name: str, default: bool = False) -> bool:
+    """Read a boolean flag (1/true/yes) from the environment."""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes")
+
+# similar-match annotation: re-parse library XML per request instead of using a copy-on-write overlay
+FRESH_LIBRARY_COPIES = _env_flag("SEQIMPROVE_FRESH_LIBRARY_COPIES")
+
+# pipe aligner output straight into the feature mappers instead of a temp file
+STREAM_ALIGNMENTS = _env_flag("SEQIMPROVE_STREAM_ALIGNMENTS")
+
+# targets longer than this (plus the window overlap) are aligned in overlapping windows; 0 disables
+LONG_TARGET_WINDOW = int(os.environ.get("SEQIMPROVE_LONG_TARGET_WINDOW", 100_000))  # bases
+
+# Myers scans the target one position per step (a few kb/s): longer targets are rejected; 0 disables
+MYERS_MAX_TARGET = int(os.environ.get("SEQIMPROVE_MYERS_MAX_TARGET") or 20_000)  # bases
+
+def load_libraries():
+    """
+    Initialize the caches and preload every bundled library.
+
+    This is the state prefork.py builds once and shares with the workers it forks;
+    it starts no threads but the metadata flusher, which LibraryCache carries over a fork.
+    Runs once per process: a forked worker's setup() keeps what the parent loaded.
+    """
+    global library_cache, index_manager
+    if library_cache is not None:
+        return
+
+    # not at import time: spawned preload workers import this module too
+    print_toolchain_diagnostics()
+
     # set pySBOL configuration parameters
     sbol2.setHomespace('http://seqimprove.synbiohub.org')
     sbol2.Config.setOption('validate', True)
     sbol2.Config.setOption('sbol_typed_uris', False)
 
     # steps 1-2 — initialize caching system, read XML → SBOL docs + FeatureLibraries (kept forever)
-    global library_cache, index_manager
     library_cache, index_manager = init_cache(
         cache_dir="./.cache/seqimprove",
-        max_indexes=10
+        max_indexes=10,
+        # per-library indexes combined at query time instead of one index per selection
+        sharded=_env_flag("SEQIMPROVE_SHARDED_INDEXES"),
+        # access times are written in batches, never on the request path
+        metadata_flush_interval=float(os.environ.get("SEQIMPROVE_METADATA_FLUSH_SECONDS") or 30)
     )
 
+    # keep Minimap2 / BWA indexes loaded between requests; engines go away with their index
+    global aligner_engines
+    if _env_flag("SEQIMPROVE_RESIDENT_ALIGNERS"):
+        aligner_engines = AlignerEngines(max_engines=int(os.environ.get("SEQIMPROVE_RESIDENT_ALIGNERS_MAX") or 8),
+                                         lock_dir=index_manager.lock_dir)
+        index_manager.add_removal_listener(aligner_engines.on_index_removed)
+
+    # annotation result cache — registered before preload so changed libraries invalidate their results
+    global result_cache
+    result_cache = ResultCache(
+        "./.cache/seqimprove",
+        max_memory_bytes=int(os.environ.get("SEQIMPROVE_RESULT_CACHE_MEMORY_MB") or 64) * 1024 * 1024,
+        max_disk_bytes=int(os.environ.get("SEQIMPROVE_RESULT_CACHE_DISK_MB") or 512) * 1024 * 1024,
+    )
+    library_cache.add_change_listener(result_cache.on_library_changed)
+
+    global prokka_cache
+    prokka_cache = ProkkaCache("./.cache/seqimprove",
+                               max_memory_entries=int(os.environ.get("SEQIMPROVE_PROKKA_CACHE_ENTRIES") or 32),
+                               max_disk_bytes=int(os.environ.get("SEQIMPROVE_PROKKA_CACHE_DISK_MB") or 512) * 1024 * 1024)
+
     # preload all feature libraries: XML → SBOL Documents → FeatureLibraries (permanent)
+    # libraries missing from the snapshot cache are parsed across a process pool
     feature_libraries_dir = "./assets/synbict/feature-libraries"
-    print(f"Preloading libraries from {feature_libraries_dir}...")
-    library_cache.preload_libraries(feature_libraries_dir)
+    # each worker is a spawned interpreter that imports SYNBICT and pySBOL: keep the default small
+    preload_workers = int(os.environ.get("SEQIMPROVE_PRELOAD_WORKERS") or min(4, os.cpu_count() or 1))
+    print(f"Preloading libraries from {feature_libraries_dir} ({preload_workers} workers)...")
+    library_cache.preload_libraries(feature_libraries_dir, workers=preload_workers)
 
     # populate FlashText FEATURE_LIBRARIES dict from the permanent cache
     for name, abs_path in library_cache._library_name_map.items():
         FEATURE_LIBRARIES[abs_path] = library_cache.get_feature_library(abs_path)
+        FEATURE_ANNOTATERS[abs_path] = FeatureAnnotater(FEATURE_LIBRARIES[abs_path], FLASHTEXT_MIN_FEATURE_LENGTH)
 
     print(f"Loaded {len(FEATURE_LIBRARIES)} libraries into cache")
     print(f"Available libraries: {library_cache.get_available_library_names()}")
 
+def setup():
+    print("Initializing the app...")
+    load_libraries()
+
+    global annotation_pool
+    annotation_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("SEQIMPROVE_ANNOTATION_WORKERS") or os.cpu_count() or 1),
+                                         thread_name_prefix="annotation")
+
+    # separate from annotation_pool: batch items running there fan out their libraries here
+    global flashtext_pool
+    flashtext_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("SEQIMPROVE_FLASHTEXT_WORKERS") or os.cpu_count() or 1),
+                                        thread_name_prefix="flashtext")
+
+    # separate from the other pools: their threads wait on the windows queued here
+    global window_pool
+    window_pool = ThreadPoolExecutor(max_workers=int(os.environ.get("SEQIMPROVE_WINDOW_WORKERS") or os.cpu_count() or 1),
+                                     thread_name_prefix="align-window")
+
+    # finished builds are kept for polling this long; a resubmission builds again if the index is gone
+    global index_build_jobs
+    index_build_jobs = JobManager("index-build", max_workers=int(os.environ.get("SEQIMPROVE_INDEX_BUILD_WORKERS") or 2),
+                                  result_ttl=float(os.environ.get("SEQIMPROVE_INDEX_BUILD_JOB_TTL") or 3600))
+
+    global annotation_jobs
+    annotation_jobs = JobManager(
+        "annotation",
+        max_workers=int(os.environ.get("SEQIMPROVE_ANNOTATION_JOB_WORKERS") or 2),
+        max_queued=int(os.environ.get("SEQIMPROVE_ANNOTATION_JOB_QUEUE") or 100),
+        result_ttl=float(os.environ.get("SEQIMPROVE_ANNOTATION_JOB_TTL") or 3600),
+    )
+
+    # pre-warm configured indexes in the background so the first request doesn't build them
+    prewarm_config = os.environ.get("SEQIMPROVE_PREWARM_CONFIG") or "./prewarm.json"
+    prewarm_indexes(load_prewarm_config(prewarm_config), "./assets/synbict/feature-libraries")
+
 app = Flask(__name__) # app = Quart(__name__)
 CORS(app)
 app.before_first_request(setup)
@@ -108,10 +256,71 @@ def create_app():
 # ===========================================================================================================================
 # ===========================================================================================================================
 
+def feature_library_key(part_library_file_name):
+    """Key of a library in FEATURE_LIBRARIES: canonical URI for SynBioHub, else absolute path."""
+    if ('synbiohub.org' in part_library_file_name):
+        # strip api. if present
+        return re.sub(r'^(https?://)api\.', r'\1', part_library_file_name)
+    feature_libraries_dir = "./assets/synbict/feature-libraries"
+    return os.path.abspath(os.path.join(feature_libraries_dir, part_library_file_name))
+
+def get_feature_annotater(part_library_file_name):
+    """
+    Get the FlashText FeatureAnnotater for a library, building it on first use.
+
+    The annotater's keyword automaton only depends on the library, so it is
+    kept in FEATURE_ANNOTATERS; it is rebuilt if the library entry was replaced.
+    """
+    feature_library = create_feature_library(part_library_file_name)
+    key = feature_library_key(part_library_file_name)
+
+    annotater = FEATURE_ANNOTATERS.get(key)
+    if annotater is None or annotater.feature_library is not feature_library:
+        if annotater is not None:
+            invalidate_merged_matchers(key)
+        annotater = FeatureAnnotater(feature_library, FLASHTEXT_MIN_FEATURE_LENGTH)
+        FEATURE_ANNOTATERS[key] = annotater
+    return annotater
+
+def get_merged_matcher(part_library_file_names, named_annotaters):
+    """
+    Get the merged FlashText automaton for a library selection (single-pass mode), building it on first use.
+
+    Cached per selection (feature library keys). An entry holds the annotaters
+    it was built from and is only used with those same objects; entries of a
+    library are dropped when its annotater is replaced or removed
+    (invalidate_merged_matchers).
+    """
+    key = tuple(feature_library_key(name) for name in part_library_file_names)
+    annotaters = tuple(annotater for _, annotater in named_annotaters)
+
+    with _merged_matchers_lock:
+        cached = MERGED_MATCHERS.get(key)
+        if cached is not None and all(a is b for a, b in zip(cached[0], annotaters)):
+            MERGED_MATCHERS.move_to_end(key)
+            return cached[1]
+
+    merged_matcher = build_merged_matcher(named_annotaters, FLASHTEXT_MIN_FEATURE_LENGTH)
+
+    with _merged_matchers_lock:
+        # a library replaced while this was building: don't cache the stale automaton
+        if all(FEATURE_ANNOTATERS.get(library_key) is annotater for library_key, annotater in zip(key, annotaters)):
+            MERGED_MATCHERS[key] = (annotaters, merged_matcher)
+            MERGED_MATCHERS.move_to_end(key)
+            while len(MERGED_MATCHERS) > MAX_MERGED_MATCHERS:
+                MERGED_MATCHERS.popitem(last=False)
+    return merged_matcher
+
+def invalidate_merged_matchers(library_key):
+    """Drop the cached merged automata of every selection that includes a library."""
+    with _merged_matchers_lock:
+        for key in [key for key in MERGED_MATCHERS if library_key in key]:
+            del MERGED_MATCHERS[key]
+
 def create_feature_library(part_library_file_name):
     if ('synbiohub.org' in part_library_file_name):
         # Normalize to canonical URI as the consistent dictionary key (strip api. if present)
-        canonical = re.sub(r'^(https?://)api\.', r'\1', part_library_file_name)
+        canonical = feature_library_key(part_library_file_name)
         logger.info(f"Creating feature library for: {canonical}")
 
         # Check if already in cache (user-imported or previous on-demand fetch)
@@ -137,11 +346,13 @@ def create_feature_library(part_library_file_name):
         except Exception as e:
             raise KeyError(f"Failed to parse on-demand library '{canonical}': {e}")
 
-    feature_libraries_dir = "./assets/synbict/feature-libraries"
-    feature_library_path = os.path.abspath(os.path.join(feature_libraries_dir, part_library_file_name))
+    feature_library_path = feature_library_key(part_library_file_name)
     if feature_library_path not in FEATURE_LIBRARIES:
         raise KeyError(f"Library not found in cache: '{part_library_file_name}'. "
                        f"Available libraries: {list(FEATURE_LIBRARIES.keys())}")
+    # through library_cache, which reloads a file whose content changed (the result cache key
+    # already uses the new hash); get_feature_annotater then rebuilds its automaton
+    FEATURE_LIBRARIES[feature_library_path] = library_cache.get_feature_library(feature_library_path)
     return FEATURE_LIBRARIES[feature_library_path]
 
 def sbh_pull_library(uri):
@@ -262,13 +473,92 @@ def clean_target_document(target_doc: sbol2.Document) -> sbol2.Document:
 
     return target_doc
 
+def submit_index_build(algorithm: str, library_paths: List[str]):
+    """Queue a background build of the index (or shards) for algorithm + libraries (deduplicated by index key)."""
+    index_key = index_manager.get_index_key(algorithm, library_paths)
+    return index_build_jobs.submit(f"index_build:{algorithm.lower()}", index_manager.get_index_prefixes,
+                                   algorithm, library_paths, key=index_key)
+
+def index_build_status(job) -> dict:
+    """Serialize an index build job for polling clients, with a retry hint while it runs."""
+    job_status = job.to_dict()
+    if not job.finished:
+        job_status["retryAfter"] = index_build_jobs.estimate_retry_after(job)
+    return job_status
+
+def load_prewarm_config(config_path: str) -> list[dict]:
+    """
+    Read the index pre-warm configuration.
+
+    The file is a JSON list of {"algorithm": ..., "libraries": [...]} entries;
+    "libraries" may also be "all" for every bundled library. A missing file
+    means nothing is pre-warmed.
+    """
+    if not os.path.exists(config_path):
+        return []
+
+    try:
+        with open(config_path, 'r') as f:
+            entries = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        logger.warning(f"Could not read pre-warm config {config_path}: {e}")
+        return []
+
+    valid_entries = []
+    for entry in entries:
+        algorithm = entry.get("algorithm") if isinstance(entry, dict) else None
+        libraries = entry.get("libraries", PREWARM_ALL_LIBRARIES) if isinstance(entry, dict) else None
+        if not algorithm or algorithm == 'FlashText' or not (libraries == PREWARM_ALL_LIBRARIES or isinstance(libraries, list)):
+            logger.warning(f"Ignoring invalid pre-warm entry: {entry}")
+            continue
+        valid_entries.append({"algorithm": algorithm, "libraries": libraries})
+    return valid_entries
+
+def prewarm_indexes(entries: list[dict], library_dir: str):
+    """Queue a background index build for each pre-warm entry (runs in parallel on index_build_jobs)."""
+    PREWARM_ENTRIES.clear()
+    for entry in entries:
+        if entry["libraries"] == PREWARM_ALL_LIBRARIES:
+            library_names = library_cache.get_available_library_names()
+        else:
+            library_names = entry["libraries"]
+
+        library_paths, skipped = library_cache.resolve_library_paths(library_names, library_dir=library_dir)
+        if skipped:
+            logger.warning(f"Pre-warm {entry['algorithm']}: could not resolve libraries (skipping): {skipped}")
+        if not library_paths:
+            continue
+
+        job = submit_index_build(entry["algorithm"], library_paths)
+        PREWARM_ENTRIES.append({
+            "algorithm": entry["algorithm"],
+            "libraries": entry["libraries"],
+            "library_paths": library_paths,
+            "job": job,
+        })
+        print(f"Pre-warming {entry['algorithm']} index for {len(library_paths)} libraries (job {job.job_id})")
+
+def prewarm_status() -> list[dict]:
+    """Readiness of each pre-warm entry."""
+    entries = []
+    for entry in PREWARM_ENTRIES:
+        job = entry["job"]
+        ready = index_manager.is_index_ready(entry["algorithm"], entry["library_paths"])
+        entries.append({
+            "algorithm": entry["algorithm"],
+            "libraries": entry["libraries"],
+            "ready": ready,
+            "job": index_build_status(job),
+        })
+    return entries
+
 def run_synbict_all(sbol_content: str, library_paths: list[str], exact_match: bool, algorithm: str,
-                    index_prefix: str, codon_matches: bool = False,
+                    index_prefixes: List[str], codon_matches: bool = False,
                     include_hypothetical: bool = False,
                     protein_exact_match: bool = True,
                     is_circular: bool = False) -> tuple[Optional[int], Optional[str], Optional[List]]:
     """
-    Run annotation with alignment-based algorithms (BWA, Minimap2, BLASTN), with
+    Run annotation with alignment-based algorithms (BWA, Minimap2, BLASTN, KmerIndex, Myers), with
     optional Prokka augmentation for protein-level matching.
 
     Pipeline:
@@ -281,23 +571,30 @@ def run_synbict_all(sbol_content: str, library_paths: list[str], exact_match: bo
         sbol_content: Target SBOL XML string (from user)
         library_paths: Absolute paths to selected library files
         exact_match: DNA-level — if True, require exact DNA matches; if False, allow ≥95% identity
-        algorithm: One of 'BWA', 'Minimap2', 'BLASTN'
-        index_prefix: Path prefix for the cached index files
+        algorithm: One of 'BWA', 'Minimap2', 'BLASTN', 'KmerIndex' (exact DNA matches only), 'Myers'
+        index_prefixes: Path prefixes of the cached index files (one, or one per shard)
         codon_matches: If True, also run Prokka and merge its matches (codon-aware annotation)
         include_hypothetical: When codon_matches=True with similar protein matching,
             include hits annotated as "hypothetical protein"
         protein_exact_match: Prokka-level — if True, require 100% protein identity;
             if False, allow ≥95% protein identity
     """
-    algo_normalized = algorithm.lower()
+    if not alignment.is_supported(algorithm):
+        return status.HTTP_400_BAD_REQUEST, f'Algorithm {algorithm} not supported', None
+    if algorithm.lower() == 'kmerindex' and not exact_match:
+        return status.HTTP_400_BAD_REQUEST, 'KmerIndex only finds exact DNA matches; disable similar DNA matches or use another algorithm', None
 
     # step 2 — get FeatureLibrary
     # Variants get created if (a) similar DNA match (DNA mismatch allowed),
     # (b) similar protein match within Prokka, or (c) Prokka augmentation
     # (synonymous codons can yield DNA-different matches).
-    # Variant creation needs a mutable doc, so use fresh copies in those cases.
+    # Variant creation mutates library docs, so those cases get a per-request
+    # copy-on-write overlay of the cached library (or fully re-parsed copies).
     if codon_matches or not exact_match or not protein_exact_match:
-        feature_library = library_cache.get_fresh_feature_library_for_subset(library_paths)
+        if FRESH_LIBRARY_COPIES:
+            feature_library = library_cache.get_fresh_feature_library_for_subset(library_paths)
+        else:
+            feature_library = library_cache.get_overlay_feature_library_for_subset(library_paths)
     else:
         feature_library = library_cache.get_feature_library_for_subset(library_paths)
 
@@ -310,6 +607,13 @@ def run_synbict_all(sbol_content: str, library_paths: list[str], exact_match: bo
     # clean the target document to remove existing annotations from previous runs
     target_doc = clean_target_document(target_doc)
 
+    if algorithm.lower() == 'myers' and MYERS_MAX_TARGET and len(target_doc.componentDefinitions):
+        from sequences_to_features.sbol_utils import sbol_sequence
+        if len(sbol_sequence(target_doc)) > MYERS_MAX_TARGET:
+            return (status.HTTP_400_BAD_REQUEST,
+                    f'Myers is limited to targets of {MYERS_MAX_TARGET} bases; use BWA, Minimap2 or BLASTN for longer sequences',
+                    None)
+
     min_feature_length = 10
 
     # Circular-target support (SYNBICT2 API): if the user marked the sequence
@@ -320,14 +624,13 @@ def run_synbict_all(sbol_content: str, library_paths: list[str], exact_match: bo
     # the annotator emits a two-Range (wrap-around) SequenceAnnotation.
     query_seq = None
     target_length = None
+    max_feature_length = library_cache.get_max_feature_length(library_paths)
     target_cd = target_doc.componentDefinitions[0] if len(target_doc.componentDefinitions) else None
     effective_is_circular = bool(target_cd is not None and (is_circular or sbol2.SO_CIRCULAR in target_cd.types))
     if effective_is_circular and target_cd is not None:
         from sequences_to_features.sbol_utils import sbol_sequence
         target_seq = sbol_sequence(target_doc)
         target_length = len(target_seq)
-        max_feature_length = max(
-            (len(f.nucleotides) for f in feature_library.features), default=0)
         overlap = max(0, min(max_feature_length - 1, target_length))
         if overlap > 0:
             query_seq = target_seq + target_seq[:overlap]
@@ -336,29 +639,20 @@ def run_synbict_all(sbol_content: str, library_paths: list[str], exact_match: bo
             target_cd.types = target_cd.types + [sbol2.SO_CIRCULAR]
         logger.info(f"Annotating {target_cd.displayId} as circular (origin overlap {overlap} bp)")
 
-    try:
-        # step 4 — align query to temp directory (not index cache dir)
-        with tempfile.TemporaryDirectory(prefix="seqimprove_align_") as tmp_dir:
-            if algo_normalized == 'bwa':
-                output_path = os.path.join(tmp_dir, 'aligned.sam')
-                aligner = BwaAligner(index_prefix)
-                aligner.align(target_doc, output_path, exact_match, query_seq=query_seq)
-                mapper = SAMFeatureMapper(output_path)
-            elif algo_normalized == 'minimap2':
-                output_path = os.path.join(tmp_dir, 'aligned.sam')
-                aligner = Minimap2Aligner(index_prefix)
-                aligner.align(target_doc, output_path, exact_match, query_seq=query_seq)
-                mapper = SAMFeatureMapper(output_path)
-            elif algo_normalized == 'blastn':
-                output_path = os.path.join(tmp_dir, 'aligned.txt')
-                aligner = BlastAligner(index_prefix)
-                aligner.align(target_doc, output_path, exact_match, query_seq=query_seq)
-                mapper = TableFeatureMapper(output_path)
-            else:
-                return status.HTTP_400_BAD_REQUEST, f'Algorithm {algorithm} not supported', None
+    # Long-target mode: queries longer than LONG_TARGET_WINDOW + overlap are aligned in
+    # windows across window_pool. Windows overlap by the longest feature, plus room for
+    # the insertions of a ≥95% identity match, so every hit lies whole in some window.
+    window_overlap = max_feature_length if exact_match else max_feature_length + max_feature_length // 20 + 1
 
-            inline_matches, rc_matches = mapper.extract_matches(min_feature_length, exact_match)
-            # temp files cleaned up automatically when TemporaryDirectory exits
+    try:
+        # step 4 — align query to temp directory (not index cache dir); shard outputs are merged
+        # pinned: no server process may evict these indexes while they are aligned against
+        with index_manager.pin_indexes(algorithm, library_paths, index_prefixes) as pinned_prefixes:
+            inline_matches, rc_matches = alignment.align_and_extract_matches(
+                algorithm, pinned_prefixes, target_doc, exact_match, min_feature_length, query_seq=query_seq,
+                engines=aligner_engines, stream=STREAM_ALIGNMENTS,
+                window_size=LONG_TARGET_WINDOW, window_overlap=window_overlap, executor=window_pool
+            )
 
         # Normalize origin-spanning hits back into the circular reference frame.
         if effective_is_circular and query_seq is not None:
@@ -408,19 +702,70 @@ def _run_prokka(target_doc, library_paths, prokka_mode, min_feature_length):
     Run Prokka against the target SBOL doc and extract matches.
 
     Prokka uses hardcoded paths (./database_protein.fasta, ./PROKKA_SYNBICT/),
-    so calls are serialized via _prokka_lock.
+    so each call runs prokka_worker.py with a private scratch directory as its
+    working directory. Up to SEQIMPROVE_PROKKA_CONCURRENCY calls run at once.
+
+    Prokka's output depends only on the target sequence, its topology and the
+    protein database, so it is cached (prokka_cache) under those; mode changes
+    (similar / hypothetical) just re-filter the cached ProkkaParser dataframe.
 
     Returns (inline_matches, rc_matches) for merging with the main aligner's results.
     """
-    with _prokka_lock:
-        # Stage the protein database at the path Prokka expects
-        protein_fasta_src = library_cache.get_protein_fasta_path(library_paths)
-        shutil.copyfile(protein_fasta_src, os.path.abspath("./database_protein.fasta"))
+    from sequences_to_features.sbol_utils import sbol_sequence
+
+    protein_fasta_src = library_cache.get_protein_fasta_path(library_paths)
+    target_cd = target_doc.componentDefinitions[0] if len(target_doc.componentDefinitions) else None
+    circular = bool(target_cd is not None and sbol2.SO_CIRCULAR in target_cd.types)
+    # the protein FASTA is named by the content hash of the library subset
+    prokka_key = make_prokka_key(sbol_sequence(target_doc), circular, Path(protein_fasta_src).stem)
+
+    final_df = prokka_cache.get_dataframe(prokka_key)
+    if final_df is None:
+        output_paths = prokka_cache.get_output_paths(prokka_key)
+        if output_paths is None:
+            output_paths = _run_prokka_worker(target_doc, protein_fasta_src, prokka_key)
+        else:
+            logger.info(f"Reusing cached Prokka output ({prokka_key[:16]})")
+        final_df = ProkkaParser(*output_paths).parse_gff_and_blast()
+        prokka_cache.put_dataframe(prokka_key, final_df)
 
-        # Run Prokka — outputs to ./PROKKA_SYNBICT/
-        ProkkaAligner(target_doc).align()
+    # the cached dataframe is shared between requests — copy before adding columns
+    final_df = final_df.copy()
+
+    # Map BLASTP protein IDs (CDS_000001 etc.) back to library component identities
+    extractor = library_cache.get_feature_extractor_for_subset(library_paths)
+    final_df["ids_sequence"] = [
+        extractor.cds_id_map.get(pid) for pid in final_df['protein_id']
+    ]
+
+    return ProkkaTableFeatureMapper().extract_matches(
+        final_df, min_feature_length=min_feature_length, mode=prokka_mode
+    )
+
+def _run_prokka_worker(target_doc, protein_fasta_src: str, prokka_key: str) -> tuple[str, str]:
+    """Run Prokka in a scratch directory and store its outputs in prokka_cache; returns (gff_path, blast_path)."""
+    with _prokka_slots, tempfile.TemporaryDirectory(prefix="seqimprove_prokka_") as scratch_dir:
+        # reference the cached protein database in place at the path Prokka expects
+        protein_fasta_dst = os.path.join(scratch_dir, "database_protein.fasta")
+        try:
+            os.symlink(os.path.abspath(protein_fasta_src), protein_fasta_dst)
+        except OSError:
+            shutil.copyfile(protein_fasta_src, protein_fasta_dst)
 
-        outdir = Path("PROKKA_SYNBICT")
+        target_path = os.path.join(scratch_dir, "target.xml")
+        with open(target_path, 'w') as f:
+            f.write(target_doc.writeString())
+
+        # run Prokka — outputs to <scratch_dir>/PROKKA_SYNBICT/
+        try:
+            result = subprocess.run([sys.executable, PROKKA_WORKER, target_path], cwd=scratch_dir,
+                                    capture_output=True, text=True, timeout=PROKKA_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"Prokka did not finish within {PROKKA_TIMEOUT} seconds")
+        if result.returncode != 0:
+            raise RuntimeError(f"Prokka failed: {result.stderr.strip()[-2000:]}")
+
+        outdir = Path(scratch_dir) / "PROKKA_SYNBICT"
         blast_files = sorted(outdir.glob("PROKKA_SYNBICT.proteins.tmp.*.blast"))
         if not blast_files:
             raise RuntimeError("Prokka produced no BLAST output (is prokka installed?)")
@@ -428,56 +773,100 @@ def _run_prokka(target_doc, library_paths, prokka_mode, min_feature_length):
         gff_path = str(outdir / "PROKKA_SYNBICT.gff")
         blast_path = str(blast_files[-1])
 
-        final_df = ProkkaParser(gff_path, blast_path).parse_gff_and_blast()
-
-        # Map BLASTP protein IDs (CDS_000001 etc.) back to library component identities
-        extractor = library_cache.get_feature_extractor_for_subset(library_paths)
-        final_df["ids_sequence"] = [
-            extractor.cds_id_map.get(pid) for pid in final_df['protein_id']
-        ]
+        # copied out before the scratch directory is removed
+        return prokka_cache.store_outputs(prokka_key, gff_path, blast_path)
 
-        return ProkkaTableFeatureMapper().extract_matches(
-            final_df, min_feature_length=min_feature_length, mode=prokka_mode
-        )
+def run_synbict(sbol_content: str, part_library_file_names: list[str],
+                single_pass: bool = False) -> tuple[Optional[int], Optional[str], Optional[List]]:
+    """
+    Annotate with FlashText against each selected library; returns one [sbol, library] pair per library.
 
-def run_synbict(sbol_content: str, part_library_file_names: list[str]) -> tuple[Optional[int], Optional[str], Optional[str]]:
-    anno_lib_assoc = []
+    single_pass: scan the target once against a merged automaton of all selected
+        libraries (flashtext_annotation) instead of once per library
+    """
+    if single_pass:
+        try:
+            named_annotaters = [(name, get_feature_annotater(name)) for name in part_library_file_names]
+            merged_matcher = get_merged_matcher(part_library_file_names, named_annotaters)
+        except KeyError as e:
+            return status.HTTP_400_BAD_REQUEST, str(e), None
 
-    for part_lib_f_name in part_library_file_names:            
-        target_doc = sbol2.Document()
         try:
-            target_doc.readString(sbol_content)
+            anno_lib_assoc = annotate_single_pass(sbol_content, named_annotaters, merged_matcher,
+                                                  FLASHTEXT_MIN_FEATURE_LENGTH)
         except Exception as e:
             logger.error(f"Could not parse sbol_content: {e}", exc_info=True)
             return status.HTTP_400_BAD_REQUEST, 'Could not parse sbol_content', None
-        else:
-            # Create a temporary file
-            with tempfile.NamedTemporaryFile(prefix="temp_", suffix=".txt", delete=False) as sbol_file_original:
-                # Write data to the temporary file (optional)
-                sbol_file_original.write(bytes(target_doc.writeString(), "utf-8"))
-
-                # Get the file name of the temporary file
-                sbol_file_name_original = sbol_file_original.name
-
-                # Once the 'with' block ends, the temporary file will be automatically deleted.
-
-                target_library = FeatureLibrary([target_doc])
-                # feature_library = FEATURE_LIBRARIES[0]
-                feature_library = create_feature_library(part_lib_f_name)
-                print(f"The key of feature library is {part_lib_f_name}")
-                min_feature_length = 10
-                annotater = FeatureAnnotater(feature_library, min_feature_length)
-                # replace
-                min_target_length = 10  
-                # replace 
-                annotated_identities = annotater.annotate(target_library, min_target_length, in_place=True)
-
-                # The pySBOL2 library hasn't implemented the necessary functionality to retrieve sequence annotations,
-                # so instead I'm serializing the document and grabbing the sequence annotations using the sbolgraph
-                # library in javascript in the front end
-                anno_lib_assoc.append([target_doc.writeString(), part_lib_f_name])
+        return None, None, anno_lib_assoc
+
+    # one task per library across the FlashText pool; results kept in library order
+    futures = [flashtext_pool.submit(annotate_with_library, sbol_content, name) for name in part_library_file_names]
+    try:
+        anno_lib_assoc = [future.result() for future in futures]
+    except SbolParseError as e:
+        logger.error(f"Could not parse sbol_content: {e.__cause__}", exc_info=True)
+        return status.HTTP_400_BAD_REQUEST, 'Could not parse sbol_content', None
+    finally:
+        for future in futures:
+            future.cancel()
     return None, None, anno_lib_assoc
 
+class SbolParseError(ValueError):
+    """The target SBOL document of an annotation request could not be parsed."""
+
+def annotate_with_library(sbol_content: str, part_lib_f_name: str) -> List[str]:
+    """
+    Annotate a target with FlashText against one library; returns its [sbol, library] pair.
+
+    Raises SbolParseError if sbol_content can't be parsed, KeyError if the library can't be loaded.
+    """
+    target_doc = sbol2.Document()
+    try:
+        target_doc.readString(sbol_content)
+    except Exception as e:
+        raise SbolParseError('Could not parse sbol_content') from e
+
+    target_library = FeatureLibrary([target_doc])
+    # prebuilt keyword automaton for this library (see get_feature_annotater)
+    print(f"The key of feature library is {part_lib_f_name}")
+    annotater = get_feature_annotater(part_lib_f_name)
+    # replace
+    min_target_length = 10
+    # replace
+    annotated_identities = annotater.annotate(target_library, min_target_length, in_place=True)
+
+    # The pySBOL2 library hasn't implemented the necessary functionality to retrieve sequence annotations,
+    # so instead I'm serializing the document and grabbing the sequence annotations using the sbolgraph
+    # library in javascript in the front end
+    return [target_doc.writeString(), part_lib_f_name]
+
+def iter_synbict(sbol_content: str, part_library_file_names: list[str]):
+    """
+    Annotate with FlashText against each selected library, yielding results as libraries finish.
+
+    Yields (index, library, [sbol, library]) on success or (index, library, (status, error message))
+    on failure, in completion order, so small libraries are returned while large ones still run.
+    Libraries not yet started are cancelled if the consumer stops early (client disconnect).
+    """
+    futures = {flashtext_pool.submit(annotate_with_library, sbol_content, name): (index, name)
+               for index, name in enumerate(part_library_file_names)}
+    try:
+        for future in as_completed(futures):
+            index, name = futures[future]
+            try:
+                yield index, name, future.result()
+            except SbolParseError as e:
+                logger.error(f"Could not parse sbol_content: {e.__cause__}")
+                yield index, name, (status.HTTP_400_BAD_REQUEST, str(e))
+            except KeyError as e:
+                yield index, name, (status.HTTP_400_BAD_REQUEST, str(e.args[0]) if e.args else str(e))
+            except Exception as e:
+                logger.error(f"FlashText annotation failed for library={name}: {e}", exc_info=True)
+                yield index, name, (status.HTTP_500_INTERNAL_SERVER_ERROR, str(e))
+    finally:
+        for future in futures:
+            future.cancel()
+
 def find_similar_parts(top_level_uri):
     try:
         response = requests.get(top_level_uri + "/similar", headers={"Accept": "application/json"}); # synchronous!?
@@ -675,17 +1064,71 @@ def cache_stats():
 
     stats = index_manager.get_cache_stats()
     stats["libraries_loaded"] = len(library_cache._documents) if library_cache else 0
+    stats["preload"] = library_cache.get_preload_stats() if library_cache else {}
+    stats["library_memory"] = library_cache.get_memory_stats() if library_cache else {}
+    stats["index_build_queue"] = index_build_jobs.get_stats() if index_build_jobs else {}
+    stats["annotation_queue"] = annotation_jobs.get_stats() if annotation_jobs else {}
+    stats["result_cache"] = result_cache.get_stats() if result_cache else {}
+    stats["prokka_cache"] = prokka_cache.get_stats() if prokka_cache else {}
+    stats["aligner_engines"] = aligner_engines.get_stats() if aligner_engines else {}
+    stats["prewarm"] = prewarm_status()
     return stats
 
 @app.post("/api/cache/clear")
 def clear_cache():
-    """clear all cached indexes (libraries remain in memory)"""
+    """clear all cached indexes and annotation results (libraries remain in memory)"""
     if index_manager is None:
         return {"error": "Cache not initialized"}, 500
 
     index_manager.clear_cache()
+    if result_cache is not None:
+        result_cache.clear()
+    if prokka_cache is not None:
+        prokka_cache.clear()
     return {"message": "Index cache cleared successfully"}
 
+@app.post("/api/index/build")
+def build_index():
+    """queue a background index build for an algorithm and library selection"""
+    request_data = request.get_json()
+    algorithm = request_data.get('algorithm', 'BLASTN')
+    part_library_file_names = request_data['partLibraries']
+
+    if algorithm == 'FlashText':
+        return {"error": "FlashText does not use an alignment index"}, status.HTTP_400_BAD_REQUEST
+    if not alignment.is_supported(algorithm):
+        return {"error": f"Algorithm {algorithm} not supported"}, status.HTTP_400_BAD_REQUEST
+
+    feature_libraries_dir = "./assets/synbict/feature-libraries"
+    library_paths, skipped = library_cache.resolve_library_paths(
+        part_library_file_names, library_dir=feature_libraries_dir
+    )
+    if not library_paths:
+        return {"error": f"No libraries could be loaded. Selected: {part_library_file_names}, unresolved: {skipped}"}, status.HTTP_400_BAD_REQUEST
+
+    if index_manager.is_index_ready(algorithm, library_paths):
+        return {"status": "ready", "skipped": skipped}
+
+    job = submit_index_build(algorithm, library_paths)
+    return {**index_build_status(job), "skipped": skipped}, status.HTTP_202_ACCEPTED
+
+@app.get("/api/index/prewarm")
+def get_index_prewarm():
+    """per-entry readiness of the indexes pre-warmed at startup"""
+    if index_manager is None:
+        return {"error": "Cache not initialized"}, 500
+
+    entries = prewarm_status()
+    return {"ready": all(entry["ready"] for entry in entries), "entries": entries}
+
+@app.get("/api/index/build/<job_id>")
+def get_index_build(job_id):
+    """poll the status of a background index build"""
+    job = index_build_jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown index build job '{job_id}'"}, status.HTTP_404_NOT_FOUND
+    return index_build_status(job)
+
 @app.post("/api/convert/genbanktosbol2")
 def genbank_to_sbol2():    
     request_data = request.get_json()
@@ -718,7 +1161,10 @@ def clean_SBOL():
 
 @app.post("/api/annotateSequence")
 def annotate_sequence():
-    request_data = request.get_json()
+    return annotate_request(request.get_json())
+
+def annotate_request(request_data: dict):
+    """Annotate one document as described by an /api/annotateSequence request body; returns a Flask response tuple."""
     print("Received annotation request")
     sbol_content = request_data['completeSbolContent']
     part_library_file_names = request_data['partLibraries']
@@ -733,6 +1179,23 @@ def annotate_sequence():
     codon_matches = request_data.get('codonMatches', False)
     include_hypothetical = request_data.get('includeHypothetical', False)
     is_circular = request_data.get('isCircular', False)
+    # FlashText only: scan the target once against all selected libraries
+    single_pass = request_data.get('singlePass', False)
+    # if False, answer "index warming" instead of building a missing index inline
+    wait_for_index = request_data.get('waitForIndex', True)
+
+    # same target + library versions + algorithm + flags -> reuse the stored result
+    result_flags = {
+        "allowSimilarDNAMatches": allow_similar_dna_matches, "allowSimilarMatches": allow_similar_matches,
+        "codonMatches": codon_matches, "includeHypothetical": include_hypothetical,
+        "isCircular": is_circular, "cleanDocument": clean_document, "singlePass": single_pass,
+    }
+    result_key, result_library_hashes = annotation_result_key(sbol_content, part_library_file_names, algorithm, result_flags)
+    if result_key is not None:
+        cached_result = result_cache.get(result_key)
+        if cached_result is not None:
+            logger.info(f"Annotation result cache hit ({result_key[:16]})")
+            return {"annotations": cached_result}, status.HTTP_200_OK
 
     if clean_document:
         sbol_content = run_synbio2easy(sbol_content)
@@ -742,7 +1205,7 @@ def annotate_sequence():
     try:
         if algorithm == 'FlashText':
             # use original flashtext-based method
-            error_code, error_message, anno_lib_assoc = run_synbict(sbol_content, part_library_file_names)
+            error_code, error_message, anno_lib_assoc = run_synbict(sbol_content, part_library_file_names, single_pass=single_pass)
         else:
             # resolve library names to absolute paths via LibraryCache
             feature_libraries_dir = "./assets/synbict/feature-libraries"
@@ -756,15 +1219,25 @@ def annotate_sequence():
             if skipped:
                 logger.warning(f"Could not resolve libraries (skipping): {skipped}")
 
-            # step 3 — get or create cached index (keyed by algorithm + library subset hash)
-            index_prefix, fasta_path = index_manager.get_or_create_index(algorithm, library_paths)
+            # step 3 — get or create cached index (keyed by algorithm + library subset hash,
+            # or per-library shards in sharded mode)
+            if wait_for_index:
+                index_prefixes = index_manager.get_index_prefixes(algorithm, library_paths)
+            else:
+                index_prefixes = index_manager.get_ready_index_prefixes(algorithm, library_paths)
+                if index_prefixes is None:
+                    job = submit_index_build(algorithm, library_paths)
+                    retry_after = index_build_status(job).get("retryAfter", 1)
+                    return ({"sbol": sbol_content, "status": "warming", "jobId": job.job_id, "retryAfter": retry_after,
+                             "error_message": f"Index warming, retry after {retry_after} seconds"},
+                            status.HTTP_503_SERVICE_UNAVAILABLE, {"Retry-After": str(retry_after)})
 
             # steps 4-5 — align + annotate (with optional Prokka augmentation)
             # DNA aligner uses similar-DNA flag; Prokka uses similar-protein flag.
             dna_exact_match = not allow_similar_dna_matches
             protein_exact_match = not allow_similar_matches
             error_code, error_message, anno_lib_assoc = run_synbict_all(
-                sbol_content, library_paths, dna_exact_match, algorithm, index_prefix,
+                sbol_content, library_paths, dna_exact_match, algorithm, index_prefixes,
                 codon_matches=codon_matches, include_hypothetical=include_hypothetical,
                 protein_exact_match=protein_exact_match, is_circular=is_circular
             )
@@ -776,8 +1249,285 @@ def annotate_sequence():
         logger.error(f"Annotation failed for libraries={part_library_file_names}: {e}", exc_info=True)
         return {"sbol": sbol_content, "error_message": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR
     else:
+        if result_key is not None:
+            result_cache.put(result_key, anno_lib_assoc, result_library_hashes)
+        return {"annotations": anno_lib_assoc}, status.HTTP_200_OK
+
+def annotation_library_hashes(part_library_file_names: list[str], algorithm: str) -> Optional[list[str]]:
+    """
+    Content hashes of a request's libraries for its result cache key.
+
+    None when the result can't be cached: FlashText over SynBioHub libraries
+    (held in memory only, no content hash) or unresolvable libraries.
+    """
+    if algorithm == 'FlashText' and any('synbiohub.org' in name or name.startswith('http') for name in part_library_file_names):
+        return None
+
+    library_paths, skipped = library_cache.resolve_library_paths(
+        part_library_file_names, library_dir="./assets/synbict/feature-libraries"
+    )
+    if skipped or not library_paths:
+        return None
+    return [library_cache.get_library_hash(path) for path in library_paths]
+
+def annotation_result_key(sbol_content: str, part_library_file_names: list[str], algorithm: str,
+                          flags: dict) -> tuple[Optional[str], list[str]]:
+    """Result cache key and library content hashes for an annotation request; (None, []) if not cacheable."""
+    library_hashes = annotation_library_hashes(part_library_file_names, algorithm)
+    if library_hashes is None:
+        return None, []
+    return make_result_key(sbol_content, library_hashes, algorithm, flags), library_hashes
+
+def annotation_job_key(request_data: dict) -> str:
+    """Deduplication key for an annotation job: a hash of the full request body."""
+    canonical = json.dumps(request_data, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def run_annotation_job(request_data: dict):
+    """Job body for an annotation job; server errors fail the job so a resubmission reruns it."""
+    response = annotate_request(request_data)
+    body, code = response[0], response[1]
+    if code >= 500:
+        raise RuntimeError(body.get("error_message", "Annotation failed"))
+    return body, code
+
+def annotation_job_status(job) -> dict:
+    """Serialize an annotation job for polling clients, with a retry hint while it runs."""
+    job_status = job.to_dict()
+    if not job.finished:
+        job_status["retryAfter"] = annotation_jobs.estimate_retry_after(job)
+    return job_status
+
+@app.post("/api/annotateSequence/jobs")
+def submit_annotation_job():
+    """
+    Queue an /api/annotateSequence request as a background job and return its id.
+
+    Identical requests (same body) submitted while a job is queued or running
+    get the existing job back. A request repeated after its job finished runs
+    again; unchanged inputs are then served by result_cache.
+    """
+    request_data = request.get_json()
+    # a job has no request timeout to protect, so always build a missing index
+    request_data = {**request_data, "waitForIndex": True}
+    algorithm = request_data.get('algorithm', 'FlashText')
+
+    try:
+        job = annotation_jobs.submit(f"annotate:{algorithm.lower()}", run_annotation_job, request_data,
+                                     key=annotation_job_key(request_data))
+    except QueueFullError as e:
+        retry_after = DEFAULT_RETRY_AFTER
+        return ({"error_message": f"Annotation queue is full, retry after {retry_after} seconds", "detail": str(e)},
+                status.HTTP_429_TOO_MANY_REQUESTS, {"Retry-After": str(retry_after)})
+
+    return annotation_job_status(job), status.HTTP_202_ACCEPTED
+
+@app.get("/api/annotateSequence/jobs/<job_id>")
+def get_annotation_job(job_id):
+    """poll the status of an annotation job"""
+    job = annotation_jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired annotation job '{job_id}'"}, status.HTTP_404_NOT_FOUND
+    return annotation_job_status(job)
+
+@app.get("/api/annotateSequence/jobs/<job_id>/result")
+def get_annotation_job_result(job_id):
+    """fetch the result of a finished annotation job (the /api/annotateSequence response)"""
+    job = annotation_jobs.get(job_id)
+    if job is None:
+        return {"error": f"Unknown or expired annotation job '{job_id}'"}, status.HTTP_404_NOT_FOUND
+    if not job.finished:
+        job_status = annotation_job_status(job)
+        return job_status, status.HTTP_202_ACCEPTED, {"Retry-After": str(job_status["retryAfter"])}
+    if job.error is not None:
+        return {"error_message": job.error}, status.HTTP_500_INTERNAL_SERVER_ERROR
+    return job.result
+
+def format_stream_event(event: str, data: dict, sse: bool) -> str:
+    """One streamed annotation message: an NDJSON line, or a server-sent event."""
+    payload = json.dumps(data)
+    if sse:
+        return f"event: {event}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+@app.post("/api/annotateSequence/stream")
+def annotate_sequence_stream():
+    """
+    FlashText annotation streamed per library as each one finishes.
+
+    Same body as /api/annotateSequence (algorithm must be FlashText). The response
+    is NDJSON, or server-sent events when the client accepts text/event-stream:
+    one "annotation" message per library, {"index", "library", "sbol"} or
+    {"index", "library", "error_message", "status"}, in completion order, then a
+    final "done" message {"done": true, "succeeded", "failed"}.
+    """
+    request_data = request.get_json()
+    sbol_content = request_data['completeSbolContent']
+    part_library_file_names = request_data['partLibraries']
+    clean_document = request_data.get('cleanDocument', False)
+    algorithm = request_data.get('algorithm', 'FlashText')
+    sse = request.accept_mimetypes.best_match(["application/x-ndjson", "text/event-stream"]) == "text/event-stream"
+
+    if algorithm != 'FlashText':
+        return ({"error_message": f"Streaming is only supported for FlashText; use /api/annotateSequence for {algorithm}"},
+                status.HTTP_400_BAD_REQUEST)
+
+    logger.info(f"Streamed annotation request: libraries={part_library_file_names}, clean={clean_document}")
+
+    # keyed like a per-library /api/annotateSequence request, so either endpoint can reuse the other's result
+    result_flags = {
+        "allowSimilarDNAMatches": request_data.get('allowSimilarDNAMatches', False),
+        "allowSimilarMatches": request_data.get('allowSimilarMatches', False),
+        "codonMatches": request_data.get('codonMatches', False),
+        "includeHypothetical": request_data.get('includeHypothetical', False),
+        "isCircular": request_data.get('isCircular', False),
+        "cleanDocument": clean_document, "singlePass": False,
+    }
+    result_key, result_library_hashes = annotation_result_key(sbol_content, part_library_file_names, algorithm, result_flags)
+
+    def generate():
+        cached_result = result_cache.get(result_key) if result_key is not None else None
+        if cached_result is not None:
+            logger.info(f"Annotation result cache hit ({result_key[:16]})")
+            for index, (sbol, name) in enumerate(cached_result):
+                yield format_stream_event("annotation", {"index": index, "library": name, "sbol": sbol}, sse)
+            yield format_stream_event("done", {"done": True, "succeeded": len(cached_result), "failed": 0}, sse)
+            return
+
+        target_content = run_synbio2easy(sbol_content) if clean_document else sbol_content
+
+        anno_lib_assoc = [None] * len(part_library_file_names)
+        failed = 0
+        for index, name, result in iter_synbict(target_content, part_library_file_names):
+            if isinstance(result, tuple):
+                error_code, error_message = result
+                failed += 1
+                yield format_stream_event("annotation", {"index": index, "library": name,
+                                                         "error_message": error_message, "status": error_code}, sse)
+            else:
+                anno_lib_assoc[index] = result
+                yield format_stream_event("annotation", {"index": index, "library": name, "sbol": result[0]}, sse)
+
+        if result_key is not None and not failed:
+            result_cache.put(result_key, anno_lib_assoc, result_library_hashes)
+        yield format_stream_event("done", {"done": True, "succeeded": len(anno_lib_assoc) - failed, "failed": failed}, sse)
+
+    # X-Accel-Buffering: let reverse proxies pass each message through as it is written
+    return Response(stream_with_context(generate()),
+                    mimetype="text/event-stream" if sse else "application/x-ndjson",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.post("/api/annotateSequenceBatch")
+def annotate_sequence_batch():
+    """
+    Annotate many documents with one algorithm, library selection and flag set.
+
+    Libraries and the index are resolved once for the whole batch; the documents
+    are then aligned and annotated across the annotation pool. Results come back
+    in input order, each either {"annotations": ...} or {"error_message": ..., "status": ...}.
+    """
+    request_data = request.get_json()
+    sbol_contents = request_data['sbolContents']
+    part_library_file_names = request_data['partLibraries']
+    clean_document = request_data.get('cleanDocument', False)
+
+    algorithm = request_data.get('algorithm', 'FlashText')
+    allow_similar_dna_matches = request_data.get('allowSimilarDNAMatches', False)
+    allow_similar_matches = request_data.get('allowSimilarMatches', False)
+    codon_matches = request_data.get('codonMatches', False)
+    include_hypothetical = request_data.get('includeHypothetical', False)
+    is_circular = request_data.get('isCircular', False)
+    # FlashText only: scan the target once against all selected libraries
+    single_pass = request_data.get('singlePass', False)
+    wait_for_index = request_data.get('waitForIndex', True)
+
+    if not isinstance(sbol_contents, list):
+        return {"error_message": "sbolContents must be a list of SBOL documents"}, status.HTTP_400_BAD_REQUEST
+    if len(sbol_contents) > MAX_BATCH_SIZE:
+        return ({"error_message": f"Batch of {len(sbol_contents)} documents exceeds the limit of {MAX_BATCH_SIZE}"},
+                status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+    logger.info(f"Batch annotation request: {len(sbol_contents)} documents, algorithm={algorithm}, libraries={part_library_file_names}")
+
+    index_prefixes = None
+    library_paths = None
+    if algorithm != 'FlashText':
+        feature_libraries_dir = "./assets/synbict/feature-libraries"
+        library_paths, skipped = library_cache.resolve_library_paths(
+            part_library_file_names, library_dir=feature_libraries_dir
+        )
+        if not library_paths:
+            return {"error_message": f"No libraries could be loaded for {algorithm}. Selected: {part_library_file_names}, unresolved: {skipped}"}, status.HTTP_400_BAD_REQUEST
+
+        if skipped:
+            logger.warning(f"Could not resolve libraries (skipping): {skipped}")
+
+        try:
+            if wait_for_index:
+                index_prefixes = index_manager.get_index_prefixes(algorithm, library_paths)
+            else:
+                index_prefixes = index_manager.get_ready_index_prefixes(algorithm, library_paths)
+                if index_prefixes is None:
+                    job = submit_index_build(algorithm, library_paths)
+                    retry_after = index_build_status(job).get("retryAfter", 1)
+                    return ({"status": "warming", "jobId": job.job_id, "retryAfter": retry_after,
+                             "error_message": f"Index warming, retry after {retry_after} seconds"},
+                            status.HTTP_503_SERVICE_UNAVAILABLE, {"Retry-After": str(retry_after)})
+        except Exception as e:
+            logger.error(f"Batch index lookup failed for libraries={part_library_file_names}: {e}", exc_info=True)
+            return {"error_message": str(e)}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+    dna_exact_match = not allow_similar_dna_matches
+    protein_exact_match = not allow_similar_matches
+    result_flags = {
+        "allowSimilarDNAMatches": allow_similar_dna_matches, "allowSimilarMatches": allow_similar_matches,
+        "codonMatches": codon_matches, "includeHypothetical": include_hypothetical,
+        "isCircular": is_circular, "cleanDocument": clean_document, "singlePass": single_pass,
+    }
+
+    # libraries resolved and hashed once for the batch, not per document
+    if library_paths is None:
+        result_library_hashes = annotation_library_hashes(part_library_file_names, algorithm)
+    else:
+        result_library_hashes = None if skipped else [library_cache.get_library_hash(path) for path in library_paths]
+
+    def annotate_one(sbol_content: str) -> dict:
+        try:
+            result_key = None
+            if result_library_hashes is not None:
+                result_key = make_result_key(sbol_content, result_library_hashes, algorithm, result_flags)
+            if result_key is not None:
+                cached_result = result_cache.get(result_key)
+                if cached_result is not None:
+                    return {"annotations": cached_result}
+
+            if clean_document:
+                sbol_content = run_synbio2easy(sbol_content)
+
+            if algorithm == 'FlashText':
+                error_code, error_message, anno_lib_assoc = run_synbict(sbol_content, part_library_file_names, single_pass=single_pass)
+            else:
+                error_code, error_message, anno_lib_assoc = run_synbict_all(
+                    sbol_content, library_paths, dna_exact_match, algorithm, index_prefixes,
+                    codon_matches=codon_matches, include_hypothetical=include_hypothetical,
+                    protein_exact_match=protein_exact_match, is_circular=is_circular
+                )
+        except Exception as e:
+            logger.error(f"Batch item annotation failed: {e}", exc_info=True)
+            return {"error_message": str(e), "status": status.HTTP_500_INTERNAL_SERVER_ERROR}
+
+        if error_code:
+            return {"error_message": error_message, "status": error_code}
+        if result_key is not None:
+            result_cache.put(result_key, anno_lib_assoc, result_library_hashes)
         return {"annotations": anno_lib_assoc}
 
+    # map preserves input order
+    results = list(annotation_pool.map(annotate_one, sbol_contents))
+    failed = sum(1 for result in results if "error_message" in result)
+    logger.info(f"Batch annotation finished: {len(results) - failed} succeeded, {failed} failed")
+    return {"results": results}
+
 @app.post("/api/findSimilarParts")
 def similar_parts():
     top_level_uri = request.get_json()['topLevelUri']
@@ -845,6 +1595,8 @@ def remove_library():
 
     if collectionURL in FEATURE_LIBRARIES:
         del FEATURE_LIBRARIES[collectionURL]
+        FEATURE_ANNOTATERS.pop(collectionURL, None)
+        invalidate_merged_matchers(collectionURL)
         logger.info(f"Deleted library '{collectionURL}'. Remaining: {list(FEATURE_LIBRARIES.keys())}")
     else:
         logger.warning(f"Attempted to delete library not in cache: '{collectionURL}'. Available: {list(FEATURE_LIBRARIES.keys())}")
@@ -0,0 +1,287 @@
+"""
+Micro-benchmarks for SeqImprove's annotation paths.
+
+Runs against the bundled feature libraries and a target SBOL file, without
+starting the web server:
+
+    python benchmark.py flashtext [--target SrpR_RBS_S3_gate.xml] [--libraries a.xml b.xml] [--repeat 20]
+    python benchmark.py flashtext-single-pass [...]
+    python benchmark.py aligners [--similar] [...]
+    python benchmark.py long-target [--algorithm Minimap2] [--length 2000000] [--similar] [...]
+
+Each benchmark prints per-request latency (median / p95 / mean) for the
+previous behavior ("before") and the current one ("after"); `aligners` prints
+alignment latency and throughput for every available algorithm.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List
+
+import sbol2
+
+from sequences_to_features import FeatureAnnotater, FeatureLibrary
+
+import alignment
+from flashtext_annotation import annotate_single_pass, build_merged_matcher
+from library_cache import IndexManager, LibraryCache
+from sam_output import reverse_complement, target_query
+
+
+FEATURE_LIBRARIES_DIR = "./assets/synbict/feature-libraries"
+DEFAULT_TARGET = "SrpR_RBS_S3_gate.xml"
+MIN_FEATURE_LENGTH = 10
+
+
+def time_runs(fn: Callable[[], None], repeat: int, warmup: int = 1) -> List[float]:
+    """Run fn warmup + repeat times and return the timed durations (seconds)."""
+    for _ in range(warmup):
+        fn()
+
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append(time.perf_counter() - start)
+    return durations
+
+
+def summarize(durations: List[float]) -> Dict[str, float]:
+    """Median / p95 / mean of durations, in milliseconds."""
+    ordered = sorted(durations)
+    p95 = ordered[min(len(ordered) - 1, int(round(0.95 * (len(ordered) - 1))))]
+    return {
+        "median_ms": statistics.median(ordered) * 1000,
+        "p95_ms": p95 * 1000,
+        "mean_ms": statistics.mean(ordered) * 1000,
+    }
+
+
+def report(name: str, before: List[float], after: List[float]):
+    """Print a before/after comparison."""
+    before_stats = summarize(before)
+    after_stats = summarize(after)
+    print(f"\n{name} ({len(before)} runs each)")
+    for label, stats in (("before", before_stats), ("after", after_stats)):
+        print(f"  {label:<7} median {stats['median_ms']:9.2f} ms   p95 {stats['p95_ms']:9.2f} ms   "
+              f"mean {stats['mean_ms']:9.2f} ms")
+    if after_stats["median_ms"] > 0:
+        print(f"  speedup (median): {before_stats['median_ms'] / after_stats['median_ms']:.1f}x")
+
+
+def load_libraries(names: List[str]) -> Dict[str, FeatureLibrary]:
+    """Preload the bundled libraries and return FeatureLibraries for the selected names."""
+    library_cache = LibraryCache()
+    library_cache.preload_libraries(FEATURE_LIBRARIES_DIR)
+    paths, skipped = library_cache.resolve_library_paths(names or library_cache.get_available_library_names(),
+                                                         library_dir=FEATURE_LIBRARIES_DIR)
+    if skipped:
+        print(f"Skipping unknown libraries: {skipped}")
+    return {path: library_cache.get_feature_library(path) for path in paths}
+
+
+def bench_flashtext(args):
+    """FlashText per-request latency: building FeatureAnnotaters per request vs reusing prebuilt ones."""
+    feature_libraries = load_libraries(args.libraries)
+    with open(args.target, 'r') as f:
+        sbol_content = f.read()
+
+    prebuilt = {path: FeatureAnnotater(lib, MIN_FEATURE_LENGTH) for path, lib in feature_libraries.items()}
+
+    def annotate(get_annotater: Callable[[str], FeatureAnnotater]):
+        # one run_synbict request: a fresh target document per selected library
+        for path in feature_libraries:
+            target_doc = sbol2.Document()
+            target_doc.readString(sbol_content)
+            target_library = FeatureLibrary([target_doc])
+            get_annotater(path).annotate(target_library, MIN_FEATURE_LENGTH, in_place=True)
+            target_doc.writeString()
+
+    before = time_runs(lambda: annotate(lambda path: FeatureAnnotater(feature_libraries[path], MIN_FEATURE_LENGTH)),
+                       args.repeat)
+    after = time_runs(lambda: annotate(lambda path: prebuilt[path]), args.repeat)
+    report(f"FlashText request, {len(feature_libraries)} libraries", before, after)
+
+
+def count_annotations(sbol_content: str) -> int:
+    """Number of SequenceAnnotations in a serialized document."""
+    doc = sbol2.Document()
+    doc.readString(sbol_content)
+    return sum(len(cd.sequenceAnnotations) for cd in doc.componentDefinitions)
+
+
+def bench_flashtext_single_pass(args):
+    """FlashText per-request latency: one scan per library vs one scan against a merged automaton."""
+    feature_libraries = load_libraries(args.libraries)
+    with open(args.target, 'r') as f:
+        sbol_content = f.read()
+
+    named_annotaters = [(path, FeatureAnnotater(lib, MIN_FEATURE_LENGTH)) for path, lib in feature_libraries.items()]
+    merged_matcher = build_merged_matcher(named_annotaters, MIN_FEATURE_LENGTH)
+
+    def per_library() -> List[List[str]]:
+        anno_lib_assoc = []
+        for path, annotater in named_annotaters:
+            target_doc = sbol2.Document()
+            target_doc.readString(sbol_content)
+            annotater.annotate(FeatureLibrary([target_doc]), MIN_FEATURE_LENGTH, in_place=True)
+            anno_lib_assoc.append([target_doc.writeString(), path])
+        return anno_lib_assoc
+
+    def single_pass() -> List[List[str]]:
+        return annotate_single_pass(sbol_content, named_annotaters, merged_matcher, MIN_FEATURE_LENGTH)
+
+    before = time_runs(per_library, args.repeat)
+    after = time_runs(single_pass, args.repeat)
+    report(f"FlashText request, {len(named_annotaters)} libraries", before, after)
+
+    # both modes must produce the same documents
+    differing = [
+        (a[1], count_annotations(a[0]), count_annotations(b[0]))
+        for a, b in zip(per_library(), single_pass())
+        if a[0] != b[0]
+    ]
+    print(f"  libraries with different output: {len(differing)}")
+    for path, per_library_count, single_pass_count in differing:
+        print(f"    {path}: {per_library_count} annotations per-library vs {single_pass_count} single-pass")
+
+
+# algorithm -> executable it needs (None: built in)
+ALIGNER_BINARIES = {
+    "KmerIndex": None,
+    "Myers": None,
+    "BWA": "bwa",
+    "Minimap2": "minimap2",
+    "BLASTN": "blastn",
+}
+EXACT_ONLY_ALIGNERS = {"KmerIndex"}
+
+
+def bench_aligners(args):
+    """Alignment latency (align + parse matches) of the built-in aligners vs the external ones."""
+    library_cache = LibraryCache()
+    library_cache.preload_libraries(FEATURE_LIBRARIES_DIR)
+    library_paths, skipped = library_cache.resolve_library_paths(
+        args.libraries or library_cache.get_available_library_names(), library_dir=FEATURE_LIBRARIES_DIR)
+    if skipped:
+        print(f"Skipping unknown libraries: {skipped}")
+    with open(args.target, 'r') as f:
+        sbol_content = f.read()
+    target_doc = sbol2.Document()
+    target_doc.readString(sbol_content)
+    target_length = len(target_query(target_doc, None)[1])
+    exact_match = not args.similar
+
+    def align(algorithm: str, index_prefixes: List[str]):
+        target_doc = sbol2.Document()
+        target_doc.readString(sbol_content)
+        return alignment.align_and_extract_matches(algorithm, index_prefixes, target_doc, exact_match,
+                                                   MIN_FEATURE_LENGTH)
+
+    mode = "Exact" if exact_match else "Similar"
+    print(f"\n{mode}-match alignment, {target_length} bp target, {len(library_paths)} libraries "
+          f"({args.repeat} runs each)")
+    with tempfile.TemporaryDirectory() as cache_dir:
+        index_manager = IndexManager(library_cache, cache_dir=cache_dir)
+        for algorithm, binary in ALIGNER_BINARIES.items():
+            if binary is not None and shutil.which(binary) is None:
+                print(f"  {algorithm:<9} skipped ({binary} not found)")
+                continue
+            if not exact_match and algorithm in EXACT_ONLY_ALIGNERS:
+                print(f"  {algorithm:<9} skipped (exact matches only)")
+                continue
+            start = time.perf_counter()
+            index_prefixes = index_manager.get_index_prefixes(algorithm, library_paths)
+            build_ms = (time.perf_counter() - start) * 1000
+            inline_matches, rc_matches = align(algorithm, index_prefixes)
+            stats = summarize(time_runs(lambda: align(algorithm, index_prefixes), args.repeat))
+            print(f"  {algorithm:<9} median {stats['median_ms']:9.2f} ms   p95 {stats['p95_ms']:9.2f} ms   "
+                  f"mean {stats['mean_ms']:9.2f} ms   {target_length / stats['median_ms']:9.1f} kb/s   "
+                  f"index build {build_ms:9.2f} ms   matches {len(inline_matches)} inline / {len(rc_matches)} reverse complement")
+
+
+def bench_long_target(args):
+    """Long-target alignment: one whole-query alignment vs overlapping windows on 1..cpu_count workers."""
+    library_cache = LibraryCache()
+    library_cache.preload_libraries(FEATURE_LIBRARIES_DIR)
+    library_paths, skipped = library_cache.resolve_library_paths(
+        args.libraries or library_cache.get_available_library_names(), library_dir=FEATURE_LIBRARIES_DIR)
+    if skipped:
+        print(f"Skipping unknown libraries: {skipped}")
+
+    # synthetic genome: library features on both strands between random spacers
+    rng = random.Random(0)
+    feature_library = library_cache.get_feature_library_for_subset(library_paths)
+    sequences = [feature.nucleotides for feature in feature_library.features if feature.nucleotides]
+    parts, length = [], 0
+    while length < args.length:
+        spacer = "".join(rng.choice("ACGT") for _ in range(rng.randint(100, 2000)))
+        feature = rng.choice(sequences)
+        parts += [spacer, feature if rng.random() < 0.5 else reverse_complement(feature)]
+        length += len(spacer) + len(feature)
+    query = "".join(parts)
+
+    exact_match = not args.similar
+    max_feature_length = library_cache.get_max_feature_length(library_paths)
+    overlap = max_feature_length if exact_match else max_feature_length + max_feature_length // 20 + 1
+    target_doc = sbol2.Document()
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        index_prefixes = IndexManager(library_cache, cache_dir=cache_dir).get_index_prefixes(args.algorithm,
+                                                                                            library_paths)
+
+        def align(window_size: int = 0, executor=None):
+            return alignment.align_and_extract_matches(args.algorithm, index_prefixes, target_doc, exact_match,
+                                                       MIN_FEATURE_LENGTH, query_seq=query, window_size=window_size,
+                                                       window_overlap=overlap, executor=executor)
+
+        print(f"\n{args.algorithm}, {len(query)} bp target, windows of {args.window} bp + {overlap} bp overlap "
+              f"({args.repeat} runs each)")
+        whole = summarize(time_runs(align, args.repeat, warmup=0))
+        print(f"  whole query       median {whole['median_ms']:10.1f} ms")
+        workers = 1
+        while True:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                windowed = summarize(time_runs(lambda: align(args.window, executor), args.repeat, warmup=0))
+            print(f"  {workers:>3} worker(s)      median {windowed['median_ms']:10.1f} ms   "
+                  f"speedup vs whole {whole['median_ms'] / windowed['median_ms']:5.2f}x")
+            if workers >= (os.cpu_count() or 1):
+                break
+            workers = min(workers * 2, os.cpu_count() or 1)
+
+
+BENCHMARKS = {
+    "flashtext": bench_flashtext,
+    "flashtext-single-pass": bench_flashtext_single_pass,
+    "aligners": bench_aligners,
+    "long-target": bench_long_target,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS))
+    parser.add_argument("--target", default=DEFAULT_TARGET, help="target SBOL file")
+    parser.add_argument("--libraries", nargs="*", default=[], help="library file names (default: all bundled)")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per variant")
+    parser.add_argument("--similar", action="store_true", help="aligners, long-target: similar instead of exact DNA matches")
+    parser.add_argument("--algorithm", default="KmerIndex", help="long-target: algorithm to align with")
+    parser.add_argument("--length", type=int, default=2_000_000, help="long-target: target length (bp)")
+    parser.add_argument("--window", type=int, default=100_000, help="long-target: window size (bp)")
+    args = parser.parse_args()
+
+    sbol2.setHomespace('http://seqimprove.synbiohub.org')
+    sbol2.Config.setOption('validate', False)
+    sbol2.Config.setOption('sbol_typed_uris', False)
+
+    BENCHMARKS[args.benchmark](args)
+
+
+if __name__ == "__main__":
+    main()
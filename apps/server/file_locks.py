@@ -0,0 +1,58 @@
+"""
+Advisory inter-process locks for SeqImprove's cache directory.
+
+Several server processes (or nodes on shared storage) may use the same
+.cache/seqimprove volume. Thread locks only coordinate within one process, so
+cache files that processes share are guarded with flock(2) locks on small lock
+files under <cache_dir>/locks:
+
+- <index_key>.build.lock   exclusive while a process builds or publishes that
+                           index (one build per key across all processes)
+- <index_key>.use.lock     shared while an index is being aligned against;
+                           eviction needs it exclusively and skips indexes in use
+- cache_metadata.lock      exclusive around metadata journal appends and
+                           checkpoints (next to the metadata files)
+- bwa-shm.lock             shared by every process with a `bwa shm` staged
+                           index; `bwa shm -d` at exit needs it exclusively
+                           (aligner_engines)
+
+flock locks belong to an open file, so two threads of one process exclude
+each other too. Locks are released when their file is closed, including when
+the process dies. Lock files are never deleted (deleting one could let two
+processes lock different files under the same name).
+
+On platforms without fcntl the locks are no-ops (single-process use only).
+"""
+
+import os
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Union
+
+try:
+    import fcntl
+except ImportError:  # not POSIX: no inter-process locking
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path: Union[str, Path], shared: bool = False, blocking: bool = True) -> Iterator[bool]:
+    """
+    Hold an flock on path (created if missing) for the duration of the block.
+
+    Yields True once the lock is held. With blocking=False, yields False
+    immediately if another holder conflicts; the block then runs unlocked and
+    should do nothing that needs the lock.
+    """
+    fd = os.open(str(path), os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        if fcntl is not None:
+            operation = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+            try:
+                fcntl.flock(fd, operation if blocking else operation | fcntl.LOCK_NB)
+            except BlockingIOError:
+                yield False
+                return
+        yield True
+    finally:
+        os.close(fd)  # releases the lock
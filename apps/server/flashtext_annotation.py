@@ -0,0 +1,165 @@
+"""
+Single-pass FlashText annotation across several feature libraries.
+
+run_synbict scans the target once per selected library, with each library's
+own FeatureAnnotater. The single-pass mode merges the libraries' keywords into
+one trie whose terminals remember which library each feature came from. Each
+target strand is walked once, and the hits are then split back per library and
+handed to that library's FeatureAnnotater, so the output is the same
+[sbol, library] pairs as run_synbict.
+
+The walk reproduces FlashText's matching rules per library: going left to
+right, take the longest keyword starting at a position, then continue after
+its end. Libraries keep separate cursors, so a long hit in one library never
+hides an overlapping hit in another.
+"""
+
+import copy
+from typing import Dict, List, Tuple
+
+import sbol2
+
+from sequences_to_features import FeatureAnnotater, FeatureLibrary
+
+
+_TERMINAL = "_"  # trie key holding {library_name: canonical features}; never a nucleotide
+
+
+class ScannedMatches:
+    """
+    Stand-in for a FeatureAnnotater's KeywordProcessor that returns hits found by an earlier scan.
+
+    FeatureAnnotater.annotate calls feature_matcher.extract_keywords on the inline
+    and reverse complement text of each target; this answers those calls from
+    precomputed (features, start, end) matches keyed by the scanned text.
+    """
+
+    def __init__(self, matches_by_text: Dict[str, list]):
+        self.matches_by_text = matches_by_text
+
+    def extract_keywords(self, sentence: str, span_info: bool = False) -> list:
+        matches = self.matches_by_text.get(sentence, [])
+        if span_info:
+            return matches
+        return [match[0] for match in matches]
+
+
+class MergedMatcher:
+    """Keyword trie over the features of several libraries, scanned once per target strand."""
+
+    def __init__(self):
+        self.trie: dict = {}
+        self.keyword_count = 0
+
+    def add(self, nucleotides: str, library_name: str, library_features: list):
+        """Register a library's canonical features for a nucleotide sequence."""
+        node = self.trie
+        for nucleotide in nucleotides.lower():
+            node = node.setdefault(nucleotide, {})
+        by_library = node.setdefault(_TERMINAL, {})
+        if not by_library:
+            self.keyword_count += 1
+        by_library.setdefault(library_name, library_features)
+
+    def scan(self, nucleotides: str) -> Dict[str, list]:
+        """
+        Find each library's hits in a sequence.
+
+        Returns {library_name: [(features, start, end), ...]} with FlashText span
+        coordinates (positions in the space-separated text FeatureAnnotater scans).
+        """
+        sequence = nucleotides.lower()
+        length = len(sequence)
+        cursors: Dict[str, int] = {}  # library -> first position it may match at again
+        hits: Dict[str, list] = {}
+
+        for start in range(length):
+            # longest keyword of every library starting here, in one walk down the trie
+            longest: Dict[str, Tuple[list, int]] = {}
+            node = self.trie
+            position = start
+            while position < length:
+                node = node.get(sequence[position])
+                if node is None:
+                    break
+                position += 1
+                by_library = node.get(_TERMINAL)
+                if by_library:
+                    for library_name, library_features in by_library.items():
+                        longest[library_name] = (library_features, position)
+
+            for library_name, (library_features, end) in longest.items():
+                if cursors.get(library_name, 0) <= start:
+                    hits.setdefault(library_name, []).append((library_features, 2 * start, 2 * end - 1))
+                    cursors[library_name] = end
+
+        return hits
+
+
+def build_merged_matcher(named_annotaters: List[Tuple[str, FeatureAnnotater]],
+                         min_feature_length: int) -> MergedMatcher:
+    """
+    Merge the keywords of several libraries' annotaters.
+
+    Each keyword maps to {library_name: canonical features}, where the canonical
+    features are exactly what that library's own annotater stores for the keyword.
+    """
+    merged = MergedMatcher()
+
+    for library_name, annotater in named_annotaters:
+        for feature in annotater.feature_library.features:
+            if min_feature_length and len(feature.nucleotides) < min_feature_length:
+                continue
+
+            library_features = annotater.feature_matcher.get_keyword(' '.join(feature.nucleotides))
+            if library_features:
+                merged.add(feature.nucleotides, library_name, library_features)
+
+    return merged
+
+
+def annotate_single_pass(sbol_content: str, named_annotaters: List[Tuple[str, FeatureAnnotater]],
+                         merged_matcher: MergedMatcher, min_target_length: int) -> List[List[str]]:
+    """
+    Annotate a target against several libraries with one scan per target strand.
+
+    Returns [[annotated sbol, library name], ...] in library order, like run_synbict.
+    Raises whatever sbol2 raises if sbol_content can't be parsed.
+    """
+    # scan every target in the document once, inline and reverse complement
+    scan_doc = sbol2.Document()
+    scan_doc.readString(sbol_content)
+    unannotated_sbol = None
+
+    hits_by_library: Dict[str, Dict[str, list]] = {name: {} for name, _ in named_annotaters}
+    for target in FeatureLibrary([scan_doc]).features:
+        if min_target_length and len(target.nucleotides) < min_target_length:
+            continue
+
+        for nucleotides in (target.nucleotides, target.reverse_complement_nucleotides()):
+            text = ' '.join(nucleotides)
+            for library_name, library_hits in merged_matcher.scan(nucleotides).items():
+                hits_by_library[library_name][text] = library_hits
+
+    anno_lib_assoc = []
+    for library_name, annotater in named_annotaters:
+        library_hits = hits_by_library[library_name]
+        if not library_hits:
+            # nothing to annotate: every such library returns the unmodified target
+            if unannotated_sbol is None:
+                unannotated_sbol = scan_doc.writeString()
+            anno_lib_assoc.append([unannotated_sbol, library_name])
+            continue
+
+        target_doc = sbol2.Document()
+        target_doc.readString(sbol_content)
+        target_library = FeatureLibrary([target_doc])
+
+        # the library's own annotater, answering from this scan instead of rescanning
+        replay = copy.copy(annotater)
+        replay.feature_matcher = ScannedMatches(library_hits)
+        replay.annotate(target_library, min_target_length, in_place=True)
+
+        anno_lib_assoc.append([target_doc.writeString(), library_name])
+
+    return anno_lib_assoc
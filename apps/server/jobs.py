@@ -0,0 +1,204 @@
+"""
+Background job execution for SeqImprove.
+
+Long-running work (index builds, annotation jobs) runs on a bounded thread
+pool owned by a JobManager instead of on a waitress request thread:
+- Bounded worker count, separate from the threads serving interactive requests
+- Optional queue-depth limit: submissions beyond it are rejected (QueueFullError)
+- Deduplication by key: submitting work that is already queued/running
+  returns the existing job; finished work is never reused
+- Per-job status for polling, plus duration estimates for Retry-After hints
+- Optional result TTL: finished jobs are kept for polling/reconnects, then expired
+"""
+
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Optional
+
+
+# job states
+JOB_QUEUED = "queued"
+JOB_RUNNING = "running"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+DEFAULT_RETRY_AFTER = 5  # seconds, used before any job of a kind has finished
+
+
+class QueueFullError(Exception):
+    """Raised when a JobManager already has its maximum number of unfinished jobs."""
+
+
+@dataclass
+class Job:
+    """A unit of background work and its current state."""
+    job_id: str
+    kind: str
+    key: Optional[str]  # deduplication key (e.g. index key), None if not deduplicated
+    status: str
+    submitted_at: float
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JOB_DONE, JOB_FAILED)
+
+    def to_dict(self) -> dict:
+        return {
+            "jobId": self.job_id,
+            "kind": self.kind,
+            "status": self.status,
+            "submitted": self.submitted_at,
+            "started": self.started_at,
+            "finished": self.finished_at,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs jobs on a bounded thread pool and tracks their status.
+
+    Thread-safe. Jobs are kept in memory for status polling; the latest job per
+    key is also indexed so repeated submissions of the same work coalesce.
+    """
+
+    def __init__(self, name: str, max_workers: int = 2, max_queued: Optional[int] = None,
+                 result_ttl: Optional[float] = None):
+        """
+        Args:
+            name: Name used for worker threads and log messages
+            max_workers: Jobs running at once
+            max_queued: Maximum unfinished (queued + running) jobs, None for unlimited
+            result_ttl: Seconds finished jobs (and their results) are kept for polling,
+                None to keep them forever
+        """
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.result_ttl = result_ttl
+
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._jobs: Dict[str, Job] = {}  # job_id -> job
+        self._jobs_by_key: Dict[str, Job] = {}  # key -> latest job for that key
+        self._durations: Dict[str, float] = {}  # kind -> moving average of run time (seconds)
+
+    def submit(self, kind: str, fn: Callable, *args, key: Optional[str] = None, **kwargs) -> Job:
+        """
+        Queue fn(*args, **kwargs) as a job.
+
+        If key is given and a job with that key is still queued or running, that
+        job is returned instead of queueing a duplicate. A finished job is never
+        reused: what it computed may be stale by now (callers cache results that
+        can be reused, e.g. result_cache).
+
+        Raises:
+            QueueFullError: If max_queued unfinished jobs are already waiting/running
+        """
+        with self._lock:
+            self._expire_finished()
+
+            if key is not None:
+                existing = self._jobs_by_key.get(key)
+                if existing is not None and not existing.finished:
+                    return existing
+
+            if self.max_queued is not None:
+                unfinished = sum(1 for job in self._jobs.values() if not job.finished)
+                if unfinished >= self.max_queued:
+                    raise QueueFullError(f"{self.name}: {unfinished} jobs already queued or running")
+
+            job = Job(job_id=uuid.uuid4().hex, kind=kind, key=key, status=JOB_QUEUED,
+                      submitted_at=time.time())
+            self._jobs[job.job_id] = job
+            if key is not None:
+                self._jobs_by_key[key] = job
+
+        self._executor.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    def _run(self, job: Job, fn: Callable, args: tuple, kwargs: dict):
+        """Execute a job on a worker thread and record its outcome."""
+        job.started_at = time.time()
+        job.status = JOB_RUNNING
+        result, error = None, None
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            error = str(e)
+            print(f"{self.name}: job {job.job_id} ({job.kind}) failed: {e}")
+
+        # finished_at is set with the status, so a finished job always has one
+        with self._lock:
+            job.finished_at = time.time()
+            job.result, job.error = result, error
+            job.status = JOB_FAILED if error is not None else JOB_DONE
+        self._record_duration(job.kind, job.finished_at - job.started_at)
+
+    def _expire_finished(self):
+        """Drop finished jobs older than the result TTL. Caller must hold the lock."""
+        if self.result_ttl is None:
+            return
+
+        cutoff = time.time() - self.result_ttl
+        expired = [job for job in self._jobs.values() if job.finished and job.finished_at is not None
+                   and job.finished_at < cutoff]
+        for job in expired:
+            del self._jobs[job.job_id]
+            if job.key is not None and self._jobs_by_key.get(job.key) is job:
+                del self._jobs_by_key[job.key]
+
+    def _record_duration(self, kind: str, seconds: float):
+        """Update the moving average run time for a kind of job."""
+        with self._lock:
+            previous = self._durations.get(kind)
+            self._durations[kind] = seconds if previous is None else 0.7 * previous + 0.3 * seconds
+
+    def get(self, job_id: str) -> Optional[Job]:
+        """Look up a job by id (None if unknown or expired)."""
+        with self._lock:
+            self._expire_finished()
+            return self._jobs.get(job_id)
+
+    def find(self, key: str) -> Optional[Job]:
+        """Look up the latest job submitted with a key."""
+        with self._lock:
+            self._expire_finished()
+            return self._jobs_by_key.get(key)
+
+    def estimate_retry_after(self, job: Job) -> int:
+        """Estimate how many seconds until a job finishes (for Retry-After)."""
+        with self._lock:
+            expected = self._durations.get(job.kind)
+
+        if expected is None:
+            return DEFAULT_RETRY_AFTER
+
+        elapsed = time.time() - job.started_at if job.started_at else 0.0
+        return max(1, int(round(expected - elapsed)))
+
+    def get_stats(self) -> dict:
+        """Get queue statistics."""
+        with self._lock:
+            self._expire_finished()
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.status] = counts.get(job.status, 0) + 1
+            return {
+                "max_workers": self.max_workers,
+                "max_queued": self.max_queued,
+                "result_ttl": self.result_ttl,
+                "jobs": counts,
+                "average_seconds": {kind: round(s, 3) for kind, s in self._durations.items()},
+            }
+
+    def shutdown(self, wait: bool = False):
+        """Stop accepting jobs; optionally wait for running ones."""
+        self._executor.shutdown(wait=wait)
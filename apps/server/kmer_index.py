@@ -0,0 +1,203 @@
+"""
+Built-in exact-match aligner: a hashed k-mer index over library features.
+
+For exact DNA matches against short targets, the external aligners spend most
+of their time on process start-up and index loading. The "KmerIndex"
+algorithm finds exact occurrences of library features in-process:
+
+- build_index reads the library FASTA that IndexManager exports for every
+  algorithm and stores, for each feature and each strand, the 2-bit code of
+  its first k bases (its anchor), sorted, in <index_prefix>.kmi (a NumPy .npz
+  without pickled objects). Features shorter than k, or whose anchor contains
+  a non-ACGT base, are kept unanchored.
+- KmerIndexAligner encodes every k-mer of the target at once, looks the codes
+  up in the sorted anchors (np.searchsorted), and verifies each candidate by
+  comparing the whole feature against the target. Unanchored features are
+  found by substring search.
+
+Hits are written as SAM (sam_output), so SAMFeatureMapper produces the inline
+and reverse-complement matches exactly as for BWA / Minimap2; index building,
+caching, sharding and resident engines work as for the other SAM aligners.
+Only exact matches are supported.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import sbol2
+
+from sam_output import reverse_complement, sam_record, target_query, unmapped_sam_record
+
+
+KMER_INDEX_SUFFIX = ".kmi"
+DEFAULT_K = 12  # below typical feature lengths (min_feature_length is 10); max 32 (64-bit codes)
+
+# byte -> 2-bit base code, 4 for anything that is not A/C/G/T
+_BASE_CODES = np.full(256, 4, dtype=np.uint8)
+for _code, _bases in enumerate(("Aa", "Cc", "Gg", "Tt")):
+    for _base in _bases:
+        _BASE_CODES[ord(_base)] = _code
+AMBIGUOUS_CODE = 4
+
+
+def base_codes(sequence: bytes) -> np.ndarray:
+    """Base code (0-3 for A/C/G/T, AMBIGUOUS_CODE otherwise) of every byte of a sequence."""
+    return _BASE_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+
+
+def read_fasta(fasta_path: str) -> Tuple[List[str], List[str]]:
+    """(names, sequences) of a FASTA file; a name is the first word of its header line."""
+    names, sequences, chunks = [], [], []
+    with open(fasta_path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith(">"):
+                if names:
+                    sequences.append("".join(chunks))
+                names.append(line[1:].split()[0] if len(line) > 1 else "")
+                chunks = []
+            elif line:
+                chunks.append(line)
+    if names:
+        sequences.append("".join(chunks))
+    return names, sequences
+
+
+def kmer_codes(sequence: bytes, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    2-bit codes of every k-mer of a sequence, and which of them contain only A/C/G/T.
+
+    Returns (codes, valid), both of length len(sequence) - k + 1 (empty if shorter than k).
+    """
+    bases = base_codes(sequence)
+    windows = len(bases) - k + 1
+    if windows <= 0:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=bool)
+
+    codes = np.zeros(windows, dtype=np.uint64)
+    for offset in range(k):
+        codes = (codes << np.uint64(2)) | (bases[offset:offset + windows] & 3).astype(np.uint64)
+
+    # a window is valid if no base in it is ambiguous
+    ambiguous = np.concatenate(([0], np.cumsum(bases == AMBIGUOUS_CODE)))
+    valid = (ambiguous[k:] - ambiguous[:windows]) == 0
+    return codes, valid
+
+
+def build_index(fasta_path: str, index_prefix: str, k: int = DEFAULT_K):
+    """Write <index_prefix>.kmi for the features of a library FASTA."""
+    names, sequences = read_fasta(fasta_path)
+    sequences = [sequence.upper() for sequence in sequences]
+
+    anchors, anchored_entries, unanchored_entries = [], [], []
+    for feature, sequence in enumerate(sequences):
+        reverse = reverse_complement(sequence)
+        # a palindromic feature matches both strands at the same place; report it once
+        strands = ((0, sequence),) if reverse == sequence else ((0, sequence), (1, reverse))
+        for strand, strand_sequence in strands:
+            entry = 2 * feature + strand
+            codes, valid = kmer_codes(strand_sequence[:k].encode('ascii'), k)
+            if len(codes) and valid[0]:
+                anchors.append(codes[0])
+                anchored_entries.append(entry)
+            else:
+                unanchored_entries.append(entry)
+
+    anchors = np.array(anchors, dtype=np.uint64)
+    order = np.argsort(anchors, kind='stable')
+    lengths = np.array([len(sequence) for sequence in sequences], dtype=np.int64)
+    offsets = np.zeros(len(lengths), dtype=np.int64)
+    offsets[1:] = np.cumsum(lengths)[:-1]
+
+    with open(index_prefix + KMER_INDEX_SUFFIX, 'wb') as f:
+        np.savez(f, k=np.array(k), names=np.array(names, dtype=str),
+                 sequences=np.frombuffer("".join(sequences).encode('ascii'), dtype=np.uint8),
+                 offsets=offsets, lengths=lengths, anchors=anchors[order],
+                 anchor_entries=np.array(anchored_entries, dtype=np.int64)[order],
+                 unanchored_entries=np.array(unanchored_entries, dtype=np.int64))
+
+
+class KmerIndexAligner:
+    """
+    Exact-match aligner over a KmerIndex; same align(target_doc, output_path, exact_match, query_seq)
+    call as the SYNBICT aligners. Loading is cheap, and it can also stay resident (aligner_engines).
+    """
+
+    algorithm = "kmerindex"
+
+    def __init__(self, index_prefix: str):
+        self.index_prefix = index_prefix
+        with np.load(index_prefix + KMER_INDEX_SUFFIX, allow_pickle=False) as data:
+            self.k = int(data["k"])
+            self.names = [str(name) for name in data["names"]]
+            sequence_bytes = data["sequences"].tobytes()
+            offsets, lengths = data["offsets"], data["lengths"]
+            self.anchors = data["anchors"]
+            self.anchor_entries = data["anchor_entries"]
+            self.unanchored_entries = data["unanchored_entries"]
+
+        self.lengths = lengths.tolist()
+        forward = [sequence_bytes[o:o + n] for o, n in zip(offsets.tolist(), self.lengths)]
+        # entry = 2 * feature + strand (0 forward, 1 reverse complement)
+        self.entry_sequences = [
+            strand_sequence
+            for sequence in forward
+            for strand_sequence in (sequence, reverse_complement(sequence.decode('ascii')).encode('ascii'))
+        ]
+        self.header = "@HD\tVN:1.6\tSO:unsorted\n" + "".join(
+            f"@SQ\tSN:{name}\tLN:{length}\n" for name, length in zip(self.names, self.lengths)
+        ) + "@PG\tID:seqimprove-kmerindex\tPN:kmerindex\n"
+
+    def find(self, sequence: str) -> List[Tuple[int, int, int]]:
+        """Exact occurrences of library features in a sequence: (query start, feature, strand), sorted."""
+        target = sequence.upper().encode('ascii')
+        hits = set()
+
+        codes, valid = kmer_codes(target, self.k)
+        positions = np.flatnonzero(valid)
+        window_codes = codes[positions]
+        starts = np.searchsorted(self.anchors, window_codes, side='left')
+        counts = np.searchsorted(self.anchors, window_codes, side='right') - starts
+        matched = counts > 0
+        if matched.any():
+            counts = counts[matched]
+            # expand each window to all anchors sharing its code
+            first = np.repeat(starts[matched], counts)
+            rank = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+            candidate_positions = np.repeat(positions[matched], counts).tolist()
+            candidate_entries = self.anchor_entries[first + rank].tolist()
+            for position, entry in zip(candidate_positions, candidate_entries):
+                entry_sequence = self.entry_sequences[entry]
+                if target.startswith(entry_sequence, position):
+                    hits.add((position, entry >> 1, entry & 1))
+
+        for entry in self.unanchored_entries.tolist():
+            entry_sequence = self.entry_sequences[entry]
+            if not entry_sequence:
+                continue
+            position = target.find(entry_sequence)
+            while position >= 0:
+                hits.add((position, entry >> 1, entry & 1))
+                position = target.find(entry_sequence, position + 1)
+
+        return sorted(hits)
+
+    def align(self, target_doc: sbol2.Document, output_path: str, exact_match: bool,
+              query_seq: Optional[str] = None):
+        if not exact_match:
+            raise ValueError("KmerIndex only finds exact DNA matches")
+
+        name, sequence = target_query(target_doc, query_seq)
+        records = []
+        for position, feature, strand in self.find(sequence):
+            length = self.lengths[feature]
+            # one local alignment per hit, like a chimeric read: first primary, the rest supplementary
+            records.append(sam_record(name, sequence, self.names[feature], 0, position, position + length,
+                                      -1 if strand else 1, f"{length}M", 0, str(length),
+                                      flag=2048 if records else 0))
+        if not records:
+            records.append(unmapped_sam_record(name, sequence))
+
+        with open(output_path, 'w') as f:
+            f.write(self.header)
+            f.writelines(records)
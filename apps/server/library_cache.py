@@ -4,32 +4,59 @@ Library caching and index management system for SeqImprove.
 This module provides efficient caching mechanisms for SBOL libraries and alignment indexes:
 - Content-based hashing (SHA256) for cache invalidation
 - LRU eviction for index cache (configurable size)
-- Persistent storage across server restarts
+- Persistent storage across server restarts (metadata checkpoint + append-only
+  journal; access times are batched and flushed in the background)
+- Several processes can share one cache directory: index builds, eviction and
+  metadata writes are coordinated with file locks (file_locks)
+- Binary snapshots of parsed libraries for fast cold starts
+- Compressed library XML and subset FeatureLibraries that share the per-library Feature objects
 - Thread-safe operations
 """
 
+import atexit
 import hashlib
 import json
+import logging
 import os
+import pickle
 import re
 import shutil
+import subprocess
+import sys
 import threading
 import time
+import uuid
+import zlib
 from collections import OrderedDict
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
 from dataclasses import dataclass, field, asdict
 from pathlib import Path
-from typing import Dict, List, Optional, Tuple, Set
+from typing import Callable, Dict, Iterator, List, Optional, Tuple, Set, Union
 import requests
 import sbol2
 
 from sequences_to_features import FeatureLibrary
 from sequences_to_features.FeatureExtractor import FeatureExtractor
 
+from file_locks import file_lock
+import kmer_index
+from library_overlay import FeatureLibraryOverlay
+from metadata_journal import MetadataJournal
+import myers_matcher
+
 
 # configuration
 DEFAULT_CACHE_DIR = "./.cache/seqimprove"
 DEFAULT_MAX_INDEXES = 10
+DEFAULT_MAX_SHARDS = 64  # per-library indexes kept in sharded mode
 METADATA_FILE = "cache_metadata.json"
+LOCK_DIR = "locks"
+DEFAULT_METADATA_FLUSH_INTERVAL = 30.0  # seconds between flushes of batched access times
+SNAPSHOT_DIR = "snapshots"
+SNAPSHOT_MANIFEST = "manifest.json"
+SNAPSHOT_VERSION = 1  # bump when the pickled payload layout changes
 
 
 @dataclass
@@ -53,6 +80,7 @@ class IndexInfo:
     created_at: float
     last_accessed: float
     library_files: List[str]  # original file paths for reference
+    shard: bool = False  # per-library index built for sharded mode
 
 
 @dataclass
@@ -63,10 +91,11 @@ class CacheMetadata:
     version: str = "1.0"
 
     def to_dict(self) -> dict:
+        # list() snapshots the items: the index manager mutates indexes under its own lock
         return {
             "version": self.version,
-            "libraries": {k: asdict(v) for k, v in self.libraries.items()},
-            "indexes": {k: asdict(v) for k, v in self.indexes.items()}
+            "libraries": {k: asdict(v) for k, v in list(self.libraries.items())},
+            "indexes": {k: asdict(v) for k, v in list(self.indexes.items())}
         }
 
     @classmethod
@@ -82,6 +111,107 @@ class CacheMetadata:
         return metadata
 
 
+def hash_file(file_path: str) -> str:
+    """Compute SHA256 hash of file contents."""
+    hasher = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        # read in chunks for large files
+        for chunk in iter(lambda: f.read(8192), b''):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def parse_library_snapshot(abs_path: str, content_hash: str) -> dict:
+    """Parse a library XML file into a snapshot payload (Document + FeatureLibrary)."""
+    start = time.time()
+    doc = sbol2.Document()
+    doc.read(abs_path)
+    feature_lib = FeatureLibrary([doc])
+
+    return {
+        "version": SNAPSHOT_VERSION,
+        "content_hash": content_hash,
+        "file_name": os.path.basename(abs_path),
+        "parse_seconds": time.time() - start,
+        "feature_library": feature_lib,
+    }
+
+
+def merge_feature_libraries(feature_libraries: List[FeatureLibrary]) -> FeatureLibrary:
+    """
+    Combine single-library FeatureLibraries into one that shares their Feature objects.
+
+    Same result as FeatureLibrary(docs) over the libraries' documents (features
+    in document order, the first occurrence of a repeated identity wins),
+    without reloading every feature, which would copy every sequence again.
+    """
+    merged = FeatureLibrary.__new__(FeatureLibrary)
+    merged.docs = [doc for feature_lib in feature_libraries for doc in feature_lib.docs]
+    merged.features = []
+    merged.logger = logging.getLogger('synbict')
+
+    feature_map, feature_dict, name_to_idents = {}, {}, {}
+    doc_offset = 0
+    for feature_lib in feature_libraries:
+        library_map = feature_lib._FeatureLibrary__feature_map
+        library_names = {identity: name for name, identities in feature_lib._FeatureLibrary__name_to_idents.items()
+                         for identity in identities}
+        for feature in feature_lib.features:
+            if feature.identity in feature_map:
+                continue
+            merged.features.append(feature)
+            feature_map[feature.identity] = doc_offset + library_map[feature.identity]
+            feature_dict[feature.identity] = feature
+            if feature.identity in library_names:
+                name_to_idents.setdefault(library_names[feature.identity], []).append(feature.identity)
+        doc_offset += len(feature_lib.docs)
+
+    merged._FeatureLibrary__updated_indices = set()
+    merged._FeatureLibrary__feature_map = feature_map
+    merged._FeatureLibrary__feature_dict = feature_dict
+    merged._FeatureLibrary__name_to_idents = name_to_idents
+    return merged
+
+
+def feature_object_nbytes(feature_library: FeatureLibrary) -> int:
+    """
+    Approximate memory held by a FeatureLibrary's Feature objects (object, attribute
+    dict, nucleotide and identity strings, role set).
+    """
+    total = sys.getsizeof(feature_library.features)
+    for feature in feature_library.features:
+        total += (sys.getsizeof(feature) + sys.getsizeof(feature.__dict__)
+                  + sys.getsizeof(feature.nucleotides) + sys.getsizeof(feature.identity)
+                  + sys.getsizeof(feature.roles) + sum(sys.getsizeof(role) for role in feature.roles))
+    return total
+
+
+def _init_preload_worker(homespace: str, config_options: Dict[str, object]):
+    """Apply the parent's pySBOL configuration inside a preload worker process."""
+    sbol2.setHomespace(homespace)
+    for option, value in config_options.items():
+        sbol2.Config.setOption(option, value)
+
+
+def _preload_worker(abs_path: str, snapshot_dir: str) -> dict:
+    """
+    Hash one library file and, if no snapshot exists for that hash, parse it.
+
+    Runs in a worker process. The parsed snapshot is shipped back pickled so the
+    parent can both persist it and unpickle it without touching the XML again.
+    """
+    start = time.time()
+    content_hash = hash_file(abs_path)
+    result = {"abs_path": abs_path, "content_hash": content_hash, "payload": None}
+
+    if not (Path(snapshot_dir) / f"{content_hash}.pkl").exists():
+        snapshot = parse_library_snapshot(abs_path, content_hash)
+        result["payload"] = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+
+    result["worker_seconds"] = time.time() - start
+    return result
+
+
 class LibraryCache:
     """
     Manages loading and caching of SBOL library documents.
@@ -91,59 +221,253 @@ class LibraryCache:
       Loaded once at startup, never evicted. Used for indexing (read-only) and as
       templates for fast fresh copies when annotation mutates docs.
     - Tier 2 (per-subset): FeatureLibrary objects keyed by frozenset of library paths.
-      Reused for exact-match annotation where no mutation occurs.
+      Reused for exact-match annotation where no mutation occurs. They share the
+      Feature objects of the tier 1 FeatureLibraries (merge_feature_libraries).
 
     For similar-match annotation (which mutates library docs via variant creation),
     fresh Document copies are created from cached XML strings — no disk I/O needed.
+    The XML is kept zlib-compressed.
+
+    The length of each library's longest feature is kept for circular-target overlaps.
+
+    Tier 1 is backed by on-disk snapshots: the parsed Document and its
+    FeatureLibrary are pickled under <cache_dir>/snapshots/<content_hash>.pkl,
+    so a restart only parses the XML of libraries whose content changed.
     """
 
-    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR):
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR,
+                 metadata_flush_interval: float = DEFAULT_METADATA_FLUSH_INTERVAL):
         self.cache_dir = Path(cache_dir)
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.snapshot_dir = self.cache_dir / SNAPSHOT_DIR
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
 
         self._lock = threading.RLock()
         self._documents: Dict[str, sbol2.Document] = {}  # abs_path -> document (permanent)
-        self._xml_strings: Dict[str, str] = {}  # abs_path -> serialized XML (for fast fresh copies)
+        self._compressed_xml: Dict[str, bytes] = {}  # abs_path -> zlib-compressed XML (for fast fresh copies)
+        self._xml_sizes: Dict[str, int] = {}  # abs_path -> uncompressed XML size in bytes
+        self._max_lengths: Dict[str, int] = {}  # abs_path -> length of the library's longest feature
         self._feature_libraries: Dict[str, FeatureLibrary] = {}  # abs_path -> single-library FeatureLibrary
+        self._loaded_hashes: Dict[str, str] = {}  # abs_path -> content hash the cached objects were parsed from
         self._subset_feature_libraries: Dict[frozenset, FeatureLibrary] = {}  # frozenset(paths) -> merged FeatureLibrary
         self._hashes: Dict[str, str] = {}  # abs_path -> content_hash
         self._library_name_map: Dict[str, str] = {}  # filename -> abs_path (e.g. "iGEM.xml" -> "/full/path/iGEM.xml")
+        self._preload_stats: dict = {}  # timings of the last preload_libraries run
+        self._change_listeners: List[Callable[[str, str, str], None]] = []  # called on library content change
+
+        # metadata: checkpoint + journal of changes; access times are batched in memory
+        self._journal = MetadataJournal(self.cache_dir / METADATA_FILE)
         self._metadata = self._load_metadata()
+        self._touch_lock = threading.Lock()
+        self._pending_touches: Dict[str, Dict[str, float]] = {"libraries": {}, "indexes": {}}
+        self._flush_interval = metadata_flush_interval
+        self._stop_flushing = threading.Event()
+        self._start_flusher()
+        atexit.register(self.flush_metadata)
+        # a preloading parent forks its workers (prefork.py): the flusher is its only other
+        # thread, so fork while it holds no lock and give each child a flusher of its own
+        os.register_at_fork(before=self._touch_lock.acquire, after_in_parent=self._touch_lock.release,
+                            after_in_child=self._after_fork_in_child)
+
+    def _start_flusher(self):
+        if self._flush_interval > 0:
+            threading.Thread(target=self._flush_loop, args=(self._flush_interval,),
+                             name="metadata-flush", daemon=True).start()
+
+    def _after_fork_in_child(self):
+        self._touch_lock.release()
+        self._stop_flushing = threading.Event()
+        self._start_flusher()
 
     def _load_metadata(self) -> CacheMetadata:
-        """Load cache metadata from disk."""
-        metadata_path = self.cache_dir / METADATA_FILE
-        if metadata_path.exists():
-            try:
-                with open(metadata_path, 'r') as f:
-                    data = json.load(f)
-                return CacheMetadata.from_dict(data)
-            except (json.JSONDecodeError, KeyError) as e:
-                print(f"Warning: Could not load cache metadata: {e}")
+        """Load cache metadata from disk (checkpoint + journal)."""
+        try:
+            return CacheMetadata.from_dict(self._journal.load())
+        except (KeyError, TypeError) as e:
+            print(f"Warning: Could not load cache metadata: {e}")
         return CacheMetadata()
 
     def _save_metadata(self):
-        """Save cache metadata to disk."""
-        metadata_path = self.cache_dir / METADATA_FILE
-        try:
-            with open(metadata_path, 'w') as f:
-                json.dump(self._metadata.to_dict(), f, indent=2)
-        except IOError as e:
-            print(f"Warning: Could not save cache metadata: {e}")
+        """Checkpoint the cache metadata on disk (and empty the journal)."""
+        self._append_pending_touches()
+        # built from the files, so it also holds what other processes journaled
+        self._journal.checkpoint()
+
+    def reload_metadata(self) -> Tuple[Dict[str, IndexInfo], Dict[str, IndexInfo]]:
+        """
+        Merge the indexes recorded on disk (e.g. by other processes) into memory.
+
+        Library records are not merged: each process validates library content
+        itself. Returns (added, removed) as {index_key: IndexInfo}. Call with the
+        IndexManager lock held so no index of this process is half-recorded.
+        """
+        fresh = CacheMetadata.from_dict(self._journal.load())
+        with self._lock:
+            indexes = self._metadata.indexes
+            added = {key: info for key, info in fresh.indexes.items() if key not in indexes}
+            removed = {key: info for key, info in indexes.items() if key not in fresh.indexes}
+            for key, info in fresh.indexes.items():
+                if key in indexes:
+                    info.last_accessed = max(info.last_accessed, indexes[key].last_accessed)
+                indexes[key] = info
+            for key in removed:
+                del indexes[key]
+            return added, removed
+
+    def _journal_metadata(self, record: dict):
+        """Persist one metadata change (see metadata_journal for record types)."""
+        self._journal.append([record])
+
+    def _journal_library(self, abs_path: str):
+        info = self._metadata.libraries.get(abs_path)
+        if info is not None:
+            self._journal_metadata({"op": "library", "key": abs_path, "value": asdict(info)})
+
+    def _touch(self, section: str, key: str, info):
+        """Bump an entry's last_accessed in memory; written by the next flush_metadata."""
+        now = time.time()
+        info.last_accessed = now
+        with self._touch_lock:
+            self._pending_touches[section][key] = now
+
+    def touch_library(self, abs_path: str):
+        info = self._metadata.libraries.get(abs_path)
+        if info is not None:
+            self._touch("libraries", abs_path, info)
+
+    def touch_index(self, index_key: str):
+        info = self._metadata.indexes.get(index_key)
+        if info is not None:
+            self._touch("indexes", index_key, info)
+
+    def _append_pending_touches(self):
+        with self._touch_lock:
+            touches = self._pending_touches
+            self._pending_touches = {"libraries": {}, "indexes": {}}
+        if touches["libraries"] or touches["indexes"]:
+            self._journal.append([{"op": "touch", **touches}])
+
+    def flush_metadata(self):
+        """Write batched access times to the journal, compacting it when it has grown large."""
+        self._append_pending_touches()
+        if self._journal.needs_compaction():
+            self._save_metadata()
+
+    def _flush_loop(self, interval: float):
+        while not self._stop_flushing.wait(interval):
+            try:
+                self.flush_metadata()
+            except Exception as e:
+                print(f"Warning: Could not flush cache metadata: {e}")
+
+    def close(self):
+        """Stop the background flusher and write pending metadata."""
+        self._stop_flushing.set()
+        self.flush_metadata()
 
     def compute_file_hash(self, file_path: str) -> str:
         """Compute SHA256 hash of file contents."""
-        hasher = hashlib.sha256()
-        with open(file_path, 'rb') as f:
-            # read in chunks for large files
-            for chunk in iter(lambda: f.read(8192), b''):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        return hash_file(file_path)
 
     def compute_content_hash(self, content: str) -> str:
         """Compute SHA256 hash of string content."""
         return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
+    def _snapshot_path(self, content_hash: str) -> Path:
+        """Get the snapshot file for a library content hash."""
+        return self.snapshot_dir / f"{content_hash}.pkl"
+
+    def _read_snapshot(self, content_hash: str) -> Optional[dict]:
+        """Load a pickled library snapshot, or None if missing/stale/unreadable."""
+        snapshot_path = self._snapshot_path(content_hash)
+        if not snapshot_path.exists():
+            return None
+        try:
+            with open(snapshot_path, 'rb') as f:
+                snapshot = pickle.load(f)
+        except Exception as e:
+            print(f"Warning: Could not load library snapshot {snapshot_path.name}: {e}")
+            return None
+
+        if snapshot.get("version") != SNAPSHOT_VERSION or snapshot.get("content_hash") != content_hash:
+            return None
+        return snapshot
+
+    def _write_snapshot(self, content_hash: str, snapshot: Union[dict, bytes]):
+        """Persist a library snapshot (payload or already-pickled bytes) atomically."""
+        snapshot_path = self._snapshot_path(content_hash)
+        tmp_path = snapshot_path.with_suffix(f".{os.getpid()}.tmp")
+        try:
+            if isinstance(snapshot, dict):
+                snapshot = pickle.dumps(snapshot, protocol=pickle.HIGHEST_PROTOCOL)
+            with open(tmp_path, 'wb') as f:
+                f.write(snapshot)
+            os.replace(tmp_path, snapshot_path)
+        except (OSError, pickle.PicklingError, RecursionError) as e:
+            print(f"Warning: Could not save library snapshot {snapshot_path.name}: {e}")
+            try:
+                tmp_path.unlink()
+            except OSError:
+                pass
+
+    def _load_snapshot_manifest(self) -> dict:
+        """Load the name -> content hash manifest written by the last preload."""
+        manifest_path = self.snapshot_dir / SNAPSHOT_MANIFEST
+        if manifest_path.exists():
+            try:
+                with open(manifest_path, 'r') as f:
+                    return json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Warning: Could not load snapshot manifest: {e}")
+        return {}
+
+    def _save_snapshot_manifest(self, manifest: dict):
+        """Save the name -> content hash manifest."""
+        manifest_path = self.snapshot_dir / SNAPSHOT_MANIFEST
+        try:
+            with open(manifest_path, 'w') as f:
+                json.dump(manifest, f, indent=2)
+        except IOError as e:
+            print(f"Warning: Could not save snapshot manifest: {e}")
+
+    def _load_library(self, abs_path: str, content_hash: str, use_snapshot: bool = True) -> Tuple[bool, float]:
+        """
+        Populate the permanent cache (document, XML string, FeatureLibrary) for one library.
+
+        Restores the parsed state from the content-hash-keyed snapshot when possible,
+        otherwise parses the XML and writes a fresh snapshot.
+
+        Returns:
+            Tuple of (loaded_from_snapshot, xml_parse_seconds). For snapshot hits the
+            parse time is the one recorded when the snapshot was created.
+        """
+        snapshot = self._read_snapshot(content_hash) if use_snapshot else None
+        from_snapshot = snapshot is not None
+
+        if snapshot is None:
+            snapshot = parse_library_snapshot(abs_path, content_hash)
+            self._write_snapshot(content_hash, snapshot)
+
+        self._install_snapshot(abs_path, snapshot)
+        return from_snapshot, snapshot["parse_seconds"]
+
+    def _install_snapshot(self, abs_path: str, snapshot: dict):
+        """Put a library's parsed state into the permanent in-memory cache."""
+        feature_lib = snapshot["feature_library"]
+        self._loaded_hashes[abs_path] = snapshot["content_hash"]
+        self._documents[abs_path] = feature_lib.docs[0]
+        self._feature_libraries[abs_path] = feature_lib
+        self._max_lengths[abs_path] = max((len(feature.nucleotides) for feature in feature_lib.features), default=0)
+
+        # the raw XML is what fresh copies are parsed from (no writeString() round trip)
+        xml_bytes = Path(abs_path).read_bytes()
+        self._compressed_xml[abs_path] = zlib.compress(xml_bytes, 1)
+        self._xml_sizes[abs_path] = len(xml_bytes)
+
+        # subset libraries share this library's (now replaced) Feature objects
+        for key in [key for key in self._subset_feature_libraries if abs_path in key]:
+            del self._subset_feature_libraries[key]
+
     def get_library_hash(self, file_path: str) -> str:
         """Get content hash for a library file, computing if needed."""
         with self._lock:
@@ -163,9 +487,28 @@ class LibraryCache:
 
             # compute fresh hash
             content_hash = self.compute_file_hash(abs_path)
-            self._hashes[abs_path] = content_hash
+            self._record_library_hash(abs_path, content_hash)
 
-            # update metadata
+            return content_hash
+
+    def add_change_listener(self, listener: Callable[[str, str, str], None]):
+        """Register listener(abs_path, old_hash, new_hash), called when a library's content hash changes."""
+        with self._lock:
+            self._change_listeners.append(listener)
+
+    def _record_library_hash(self, abs_path: str, content_hash: str):
+        """Remember a library's content hash (in memory and in metadata)."""
+        with self._lock:
+            previous_info = self._metadata.libraries.get(abs_path)
+            previous_hash = self._hashes.get(abs_path) or (previous_info.content_hash if previous_info else None)
+            if previous_hash and previous_hash != content_hash:
+                for listener in self._change_listeners:
+                    try:
+                        listener(abs_path, previous_hash, content_hash)
+                    except Exception as e:
+                        print(f"Warning: Library change listener failed for {abs_path}: {e}")
+
+            self._hashes[abs_path] = content_hash
             try:
                 file_size = os.path.getsize(abs_path)
                 self._metadata.libraries[abs_path] = LibraryInfo(
@@ -174,22 +517,21 @@ class LibraryCache:
                     last_accessed=time.time(),
                     file_size=file_size
                 )
-                self._save_metadata()
             except OSError:
-                pass
-
-            return content_hash
+                return
+            self._journal_library(abs_path)
 
     def get_document(self, file_path: str, force_reload: bool = False) -> sbol2.Document:
         """
         Get an SBOL Document for a library file (permanently cached).
 
-        Documents are loaded from disk once and kept in memory forever.
-        The cached XML string is also stored for creating fast fresh copies.
+        Documents are loaded once (from snapshot, or from disk on a snapshot miss)
+        and kept in memory forever. The raw XML string is also stored for creating
+        fast fresh copies.
 
         Args:
             file_path: Path to the library XML file
-            force_reload: If True, bypass cache and reload from disk
+            force_reload: If True, bypass cache and snapshot and reload from disk
 
         Returns:
             sbol2.Document instance (from permanent cache — do NOT mutate)
@@ -199,34 +541,30 @@ class LibraryCache:
             current_hash = self.get_library_hash(abs_path)
 
             # check if we need to reload
+            # (the metadata already holds the new hash once get_library_hash saw a change)
             if not force_reload and abs_path in self._documents:
-                cached_info = self._metadata.libraries.get(abs_path)
-                if cached_info and cached_info.content_hash == current_hash:
-                    # update access time
-                    cached_info.last_accessed = time.time()
+                if self._loaded_hashes.get(abs_path) == current_hash:
+                    # update access time (batched, no file write)
+                    self.touch_library(abs_path)
                     return self._documents[abs_path]
 
-            # load from disk (one-time cost per library)
-            doc = sbol2.Document()
-            doc.read(abs_path)
-            self._documents[abs_path] = doc
-
-            # cache the XML string for fast fresh copies later
-            self._xml_strings[abs_path] = doc.writeString()
+            # load from snapshot or disk (one-time cost per library)
+            self._load_library(abs_path, current_hash, use_snapshot=not force_reload)
+            doc = self._documents[abs_path]
 
             # update metadata
             if abs_path in self._metadata.libraries:
                 self._metadata.libraries[abs_path].last_accessed = time.time()
                 self._metadata.libraries[abs_path].component_count = len(doc.componentDefinitions)
+                self._journal_library(abs_path)
 
-            self._save_metadata()
             return doc
 
     def get_fresh_document(self, file_path: str) -> sbol2.Document:
         """
         Get a fresh (mutable) copy of an SBOL Document.
 
-        Creates a new Document by deserializing the cached XML string — no disk I/O.
+        Creates a new Document by deserializing the cached XML — no disk I/O.
         Use this when the annotation process will mutate the document (e.g. similar matches
         create variant definitions inside library docs).
         """
@@ -234,11 +572,11 @@ class LibraryCache:
             abs_path = os.path.abspath(file_path)
 
             # ensure the document and XML string are cached
-            if abs_path not in self._xml_strings:
+            if abs_path not in self._compressed_xml:
                 self.get_document(abs_path)
 
             doc = sbol2.Document()
-            doc.readString(self._xml_strings[abs_path])
+            doc.readString(zlib.decompress(self._compressed_xml[abs_path]).decode('utf-8'))
             return doc
 
     def get_feature_library(self, file_path: str, force_reload: bool = False) -> FeatureLibrary:
@@ -258,17 +596,13 @@ class LibraryCache:
 
             # check if we need to reload
             if not force_reload and abs_path in self._feature_libraries:
-                cached_info = self._metadata.libraries.get(abs_path)
-                if cached_info and cached_info.content_hash == current_hash:
-                    cached_info.last_accessed = time.time()
+                if self._loaded_hashes.get(abs_path) == current_hash:
+                    self.touch_library(abs_path)
                     return self._feature_libraries[abs_path]
 
-            # load fresh
-            doc = self.get_document(abs_path, force_reload)
-            feature_lib = FeatureLibrary([doc])
-            self._feature_libraries[abs_path] = feature_lib
-
-            return feature_lib
+            # load fresh (the FeatureLibrary is built alongside the document)
+            self.get_document(abs_path, force_reload)
+            return self._feature_libraries[abs_path]
 
     def get_feature_library_for_subset(self, file_paths: List[str]) -> FeatureLibrary:
         """
@@ -288,11 +622,20 @@ class LibraryCache:
             if key in self._subset_feature_libraries:
                 return self._subset_feature_libraries[key]
 
-            docs = self.get_documents_for_libraries(list(key))
-            feature_lib = FeatureLibrary(docs)
+            feature_lib = merge_feature_libraries([self.get_feature_library(path) for path in key])
             self._subset_feature_libraries[key] = feature_lib
             return feature_lib
 
+    def get_max_feature_length(self, file_paths: List[str]) -> int:
+        """Length of the longest feature across several libraries (0 if they have none)."""
+        with self._lock:
+            max_length = 0
+            for file_path in file_paths:
+                abs_path = os.path.abspath(file_path)
+                self.get_feature_library(abs_path)  # loads the library, or reloads it if its content changed
+                max_length = max(max_length, self._max_lengths[abs_path])
+            return max_length
+
     def get_fresh_feature_library_for_subset(self, file_paths: List[str]) -> FeatureLibrary:
         """
         Get a fresh (mutable) FeatureLibrary for a subset of libraries.
@@ -304,6 +647,16 @@ class LibraryCache:
         fresh_docs = self.get_fresh_documents_for_libraries(file_paths)
         return FeatureLibrary(fresh_docs)
 
+    def get_overlay_feature_library_for_subset(self, file_paths: List[str]) -> FeatureLibrary:
+        """
+        Get a per-request mutable FeatureLibrary for a subset of libraries, without re-parsing.
+
+        Wraps the cached subset FeatureLibrary in a copy-on-write overlay
+        (library_overlay): variants created during similar-match annotation go
+        into a per-request layer and the shared documents stay untouched.
+        """
+        return FeatureLibraryOverlay(self.get_feature_library_for_subset(file_paths))
+
     def get_documents_for_libraries(self, file_paths: List[str]) -> List[sbol2.Document]:
         """Get permanently cached documents for multiple library files."""
         return [self.get_document(fp) for fp in file_paths]
@@ -494,37 +847,206 @@ class LibraryCache:
         """Get list of available library filenames."""
         return list(self._library_name_map.keys())
 
-    def preload_libraries(self, library_dir: str):
+    def preload_libraries(self, library_dir: str, workers: int = 1):
         """
         Preload all libraries from a directory into permanent cache (step 1).
 
         Loads XML -> SBOL Documents, caches XML strings, and builds the
-        name-to-path map for library selection by name.
+        name-to-path map for library selection by name. Libraries whose content
+        hash matches a snapshot are restored from it instead of re-parsing XML.
+
+        Args:
+            library_dir: Directory containing library XML files
+            workers: Number of worker processes used to hash and parse libraries.
+                With 1 (default), libraries are loaded one at a time in-process.
         """
         lib_path = Path(library_dir)
         if not lib_path.exists():
             return
 
-        for xml_file in sorted(lib_path.glob("*.xml")):
+        start = time.time()
+        manifest = self._load_snapshot_manifest()
+        previous_hashes = manifest.get(str(lib_path.resolve()), {})
+        current_hashes = {}
+        snapshot_hits = 0
+        parse_seconds_total = 0.0
+
+        xml_files = sorted(lib_path.glob("*.xml"))
+        if workers > 1 and len(xml_files) > 1:
+            loaded = self._preload_parallel(xml_files, workers)
+        else:
+            loaded = self._preload_sequential(xml_files)
+
+        for xml_file, content_hash, from_snapshot, parse_seconds in loaded:
+            abs_path = str(xml_file.resolve())
+            with self._lock:
+                cached_info = self._metadata.libraries.get(abs_path)
+                if cached_info:
+                    cached_info.last_accessed = time.time()
+                    cached_info.component_count = len(self._documents[abs_path].componentDefinitions)
+                    self._journal_library(abs_path)
+
+            # build name -> path map for selection by name
+            self._library_name_map[xml_file.name] = abs_path
+            current_hashes[xml_file.name] = content_hash
+            parse_seconds_total += parse_seconds
+            if from_snapshot:
+                snapshot_hits += 1
+
+            # drop the snapshot of the previous version of a changed library
+            previous_hash = previous_hashes.get(xml_file.name)
+            if previous_hash and previous_hash != content_hash:
+                try:
+                    self._snapshot_path(previous_hash).unlink()
+                except OSError:
+                    pass
+
+        manifest[str(lib_path.resolve())] = current_hashes
+        self._save_snapshot_manifest(manifest)
+        self._save_metadata()
+
+        elapsed = time.time() - start
+        self._preload_stats = {
+            "library_dir": str(lib_path.resolve()),
+            "libraries": len(current_hashes),
+            "workers": max(1, workers),
+            "snapshot_hits": snapshot_hits,
+            "cold_start_seconds": round(elapsed, 3),
+            # what the same preload costs without snapshots (XML parse of every library)
+            "cold_start_seconds_without_snapshot": round(parse_seconds_total, 3),
+        }
+        print(f"Preloaded {len(current_hashes)} libraries in {elapsed:.2f}s "
+              f"({snapshot_hits} from snapshot; parsing all XML takes ~{parse_seconds_total:.2f}s)")
+
+    def _preload_sequential(self, xml_files: List[Path]):
+        """Load libraries one at a time; yields (xml_file, hash, from_snapshot, parse_seconds)."""
+        for xml_file in xml_files:
             try:
+                lib_start = time.time()
                 abs_path = str(xml_file.resolve())
-                self.get_document(abs_path)
-                # build name -> path map for selection by name
-                self._library_name_map[xml_file.name] = abs_path
-                print(f"Preloaded library: {xml_file.name}")
+                content_hash = self.get_library_hash(abs_path)
+
+                with self._lock:
+                    from_snapshot, parse_seconds = self._load_library(abs_path, content_hash)
+
+                source = "snapshot" if from_snapshot else "XML"
+                print(f"Preloaded library: {xml_file.name} (from {source}, {time.time() - lib_start:.2f}s)")
+                yield xml_file, content_hash, from_snapshot, parse_seconds
             except Exception as e:
                 print(f"Warning: Could not preload {xml_file}: {e}")
 
+    def _preload_parallel(self, xml_files: List[Path], workers: int):
+        """
+        Hash and parse libraries in a process pool; yields like _preload_sequential.
+
+        Workers only parse libraries without a snapshot for their current hash and
+        ship the pickled result back; the parent persists it and restores the rest
+        from their snapshots. Largest files are submitted first so total time tracks
+        the largest library rather than the sum.
+        """
+        xml_files = sorted(xml_files, key=lambda f: f.stat().st_size, reverse=True)
+        config_options = {
+            option: sbol2.Config.getOption(option) for option in ('validate', 'sbol_typed_uris')
+        }
+        context = multiprocessing.get_context("spawn")  # never fork a threaded server
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(xml_files)), mp_context=context,
+                                 initializer=_init_preload_worker,
+                                 initargs=(sbol2.getHomespace(), config_options)) as pool:
+            futures = {
+                pool.submit(_preload_worker, str(xml_file.resolve()), str(self.snapshot_dir)): xml_file
+                for xml_file in xml_files
+            }
+            for future in as_completed(futures):
+                xml_file = futures[future]
+                try:
+                    result = future.result()
+                    abs_path = result["abs_path"]
+                    content_hash = result["content_hash"]
+                    install_start = time.time()
+
+                    with self._lock:
+                        self._record_library_hash(abs_path, content_hash)
+                        if result["payload"] is not None:
+                            self._write_snapshot(content_hash, result["payload"])
+                            snapshot = pickle.loads(result["payload"])
+                            self._install_snapshot(abs_path, snapshot)
+                            from_snapshot, parse_seconds = False, snapshot["parse_seconds"]
+                        else:
+                            from_snapshot, parse_seconds = self._load_library(abs_path, content_hash)
+
+                    source = "snapshot" if from_snapshot else "XML"
+                    print(f"Preloaded library: {xml_file.name} (from {source}, "
+                          f"worker {result['worker_seconds']:.2f}s, install {time.time() - install_start:.2f}s)")
+                    yield xml_file, content_hash, from_snapshot, parse_seconds
+                except Exception as e:
+                    print(f"Warning: Could not preload {xml_file}: {e}")
+
+    def get_preload_stats(self) -> dict:
+        """Get timings of the last preload_libraries run (with vs. without snapshots)."""
+        return dict(self._preload_stats)
+
+    def get_memory_stats(self) -> dict:
+        """
+        Approximate memory per loaded library, before and after compressing the XML
+        and sharing Feature objects between subset libraries.
+
+        "before" is the raw XML string plus the library's Feature objects once per
+        cached subset FeatureLibrary that used to hold its own copies; "after" is the
+        compressed XML (subsets now reuse the library's own Feature objects). Those
+        Feature objects (used by FlashText) and the parsed Document are not counted.
+        """
+        with self._lock:
+            libraries = {}
+            for abs_path, feature_lib in self._feature_libraries.items():
+                subset_count = sum(1 for key in self._subset_feature_libraries if abs_path in key)
+                feature_objects = feature_object_nbytes(feature_lib)
+                libraries[os.path.basename(abs_path)] = {
+                    "features": len(feature_lib.features),
+                    "xml_bytes": self._xml_sizes[abs_path],
+                    "xml_compressed_bytes": len(self._compressed_xml[abs_path]),
+                    "feature_objects_bytes": feature_objects,
+                    "subset_libraries": subset_count,
+                    "before_bytes": self._xml_sizes[abs_path] + feature_objects * subset_count,
+                    "after_bytes": len(self._compressed_xml[abs_path]),
+                }
+            return {
+                "libraries": libraries,
+                "before_bytes": sum(info["before_bytes"] for info in libraries.values()),
+                "after_bytes": sum(info["after_bytes"] for info in libraries.values()),
+            }
+
     def clear_cache(self):
         """Clear all in-memory caches."""
         with self._lock:
             self._documents.clear()
-            self._xml_strings.clear()
+            self._compressed_xml.clear()
+            self._xml_sizes.clear()
+            self._max_lengths.clear()
             self._feature_libraries.clear()
             self._subset_feature_libraries.clear()
             self._hashes.clear()
 
 
+@dataclass
+class IndexHandle:
+    """A validated index, remembered by the handle registry until the registry generation changes."""
+    index_key: str
+    index_prefix: str
+    fasta_path: str
+    generation: int
+
+
+@dataclass
+class IndexBuild:
+    """An in-flight index build that concurrent requests for the same key wait on."""
+    index_key: str
+    algorithm: str
+    started_at: float
+    done: threading.Event = field(default_factory=threading.Event)
+    error: Optional[BaseException] = None
+
+
 class IndexManager:
     """
     Manages alignment index caching with LRU eviction.
@@ -534,30 +1056,124 @@ class IndexManager:
     - Content-hash based invalidation
     - LRU eviction when max capacity reached
     - Support for BWA, Minimap2, and BLASTN indexes
+    - Single-flight builds: one build per index key, built in a staging
+      directory and atomically renamed into place; other keys never wait
+    - Optional sharded mode: one index per library, combined at query time
+      (BLAST alias databases, or one alignment per shard with merged SAM output),
+      so N libraries need N indexes instead of one per selected combination
+    - Handle registry: indexes validated once (library hashes, index files) are
+      looked up by (algorithm, library set) without touching disk, until a
+      library changes or any index is removed (generation counter)
+    - Multi-process safe (file_locks): a build holds <key>.build.lock, so
+      processes sharing the cache directory build each index once; alignments
+      pin their indexes with shared <key>.use.locks (pin_indexes) and eviction
+      skips pinned or building indexes; before building or evicting, the
+      indexes other processes recorded are merged in from the metadata journal
     """
 
+    STAGING_PREFIX = ".staging-"
+
     # index file extensions for each algorithm (only required files)
     INDEX_FILES = {
         'bwa': ['.amb', '.ann', '.bwt', '.pac', '.sa'],
         'minimap2': ['.mmi'],
-        'blast': ['.nhr', '.nin', '.nsq']  # only required files, .ndb/.not/.ntf/.nto are optional
+        'blast': ['.nhr', '.nin', '.nsq'],  # only required files, .ndb/.not/.ntf/.nto are optional
+        'kmerindex': [kmer_index.KMER_INDEX_SUFFIX],
+        'myers': [myers_matcher.MYERS_INDEX_SUFFIX]
+    }
+
+    # algorithms whose index is built in-process (from the same library FASTA)
+    BUILTIN_INDEX_BUILDERS = {
+        'kmerindex': kmer_index.build_index,
+        'myers': myers_matcher.build_index,
     }
 
     def __init__(self,
                  library_cache: LibraryCache,
                  cache_dir: str = DEFAULT_CACHE_DIR,
-                 max_indexes: int = DEFAULT_MAX_INDEXES):
+                 max_indexes: int = DEFAULT_MAX_INDEXES,
+                 sharded: bool = False,
+                 max_shards: int = DEFAULT_MAX_SHARDS):
         self.library_cache = library_cache
         self.cache_dir = Path(cache_dir) / "indexes"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.alias_dir = Path(cache_dir) / "aliases"
+        self.lock_dir = Path(cache_dir) / LOCK_DIR
+        self.lock_dir.mkdir(parents=True, exist_ok=True)
         self.max_indexes = max_indexes
+        self.sharded = sharded
+        self.max_shards = max_shards
 
-        self._lock = threading.RLock()
+        self._lock = threading.RLock()  # guards metadata/LRU state only, never held during a build
         self._access_order: OrderedDict[str, float] = OrderedDict()
+        self._builds: Dict[str, IndexBuild] = {}  # index_key -> in-flight build
         self._metadata = library_cache._metadata
 
+        # (algorithm, frozenset(abs library paths)) -> validated index; a handle is only
+        # valid while its generation matches (bumped on library change / index removal)
+        self._handles: Dict[Tuple[str, frozenset], IndexHandle] = {}
+        self._generation = 0
+        self._handle_hits = 0
+        self._handle_misses = 0
+        # no lock here: listeners run under the library cache lock, which is taken after ours
+        library_cache.add_change_listener(lambda abs_path, old_hash, new_hash: self._invalidate_handles())
+        self._removal_listeners: List[Callable[[str, str], None]] = []  # called when an index is removed
+        self._alias_shards: Dict[str, List[str]] = {}  # BLAST alias prefix -> shard index keys
+
         # initialize access order from metadata
         self._init_access_order()
+        self._remove_stale_staging_dirs()
+
+    def _remove_stale_staging_dirs(self):
+        """Remove staging directories left behind by builds that never finished (in any process)."""
+        for item in self.cache_dir.glob(f"{self.STAGING_PREFIX}*"):
+            index_key = item.name[len(self.STAGING_PREFIX):].split("-")[0]
+            with file_lock(self._lock_path(index_key, "build"), blocking=False) as not_building:
+                if not_building:
+                    shutil.rmtree(item, ignore_errors=True)
+
+    def _lock_path(self, index_key: str, kind: str) -> Path:
+        """Lock file of an index: kind is "build" or "use" (see file_locks)."""
+        return self.lock_dir / f"{index_key}.{kind}.lock"
+
+    def _sync_metadata(self):
+        """Merge in indexes other processes published or removed. Caller must hold the lock."""
+        added, removed = self.library_cache.reload_metadata()
+        for index_key, info in removed.items():
+            self._notify_removed(index_key, info.index_path)
+            self._access_order.pop(index_key, None)
+        for index_key, info in added.items():
+            self._access_order[index_key] = info.last_accessed
+        if added:
+            self._access_order = OrderedDict(sorted(self._access_order.items(), key=lambda item: item[1]))
+        if added or removed:
+            self._invalidate_handles()
+
+    def _delete_index_dir(self, index_key: str, holding_build_lock: bool = False) -> bool:
+        """
+        Delete an index directory unless any process is building or aligning against it.
+
+        The directory is renamed away first, so no reader ever sees a partly
+        deleted index. Returns False (nothing deleted) if the index is busy.
+        holding_build_lock: the caller is the key's builder (publishing over a stale directory).
+        """
+        with ExitStack() as locks:
+            if not holding_build_lock and not locks.enter_context(
+                    file_lock(self._lock_path(index_key, "build"), blocking=False)):
+                return False
+            if not locks.enter_context(file_lock(self._lock_path(index_key, "use"), blocking=False)):
+                return False
+            index_dir = self._get_index_dir(index_key)
+            trash_dir = self.cache_dir / f"{self.STAGING_PREFIX}{index_key}-removed-{uuid.uuid4().hex[:8]}"
+            try:
+                os.rename(index_dir, trash_dir)
+            except FileNotFoundError:
+                return True
+            except OSError as e:
+                print(f"Warning: Could not remove index directory: {e}")
+                return False
+            shutil.rmtree(trash_dir, ignore_errors=True)
+            return True
 
     def _init_access_order(self):
         """Initialize LRU order from persisted metadata."""
@@ -570,13 +1186,15 @@ class IndexManager:
             for key, info in sorted_indexes:
                 self._access_order[key] = info.last_accessed
 
-    def _compute_index_key(self, algorithm: str, library_paths: List[str]) -> str:
+    def _compute_index_key(self, algorithm: str, library_paths: List[str], shard: bool = False) -> str:
         """
         Compute a unique key for an index based on algorithm and library content.
 
         The key is a hash of:
         - Algorithm name
         - Sorted list of library content hashes
+        - For per-library shards, a "shard:" namespace, so the shard of a library
+          and a combined index over that one library are separate entries
         """
         # get content hashes for all libraries
         library_hashes = []
@@ -585,43 +1203,69 @@ class IndexManager:
             library_hashes.append(lib_hash)
 
         # combine algorithm and hashes
-        combined = f"{algorithm.lower()}:" + ",".join(library_hashes)
+        combined = ("shard:" if shard else "") + f"{algorithm.lower()}:" + ",".join(library_hashes)
         return hashlib.sha256(combined.encode()).hexdigest()[:16]
 
     def _get_index_dir(self, index_key: str) -> Path:
         """Get directory path for an index."""
         return self.cache_dir / index_key
 
-    def _evict_oldest(self):
-        """Evict the oldest index if at capacity."""
-        with self._lock:
-            while len(self._access_order) >= self.max_indexes:
-                if not self._access_order:
-                    break
+    def _invalidate_handles(self):
+        """Invalidate every registered index handle (they are revalidated on next lookup)."""
+        self._generation += 1
 
-                # get oldest key
-                oldest_key = next(iter(self._access_order))
-
-                # remove from disk
-                index_dir = self._get_index_dir(oldest_key)
-                if index_dir.exists():
-                    try:
-                        shutil.rmtree(index_dir)
-                        print(f"Evicted old index: {oldest_key}")
-                    except OSError as e:
-                        print(f"Warning: Could not remove index directory: {e}")
-
-                # remove from tracking
-                del self._access_order[oldest_key]
-                if oldest_key in self._metadata.indexes:
-                    del self._metadata.indexes[oldest_key]
+    def add_removal_listener(self, listener: Callable[[str, str], None]):
+        """Register listener(index_key, index_prefix), called when an index is evicted or removed."""
+        with self._lock:
+            self._removal_listeners.append(listener)
 
-            self.library_cache._save_metadata()
+    def _notify_removed(self, index_key: str, index_prefix: str):
+        """Call the removal listeners for an index. Caller must hold the lock."""
+        for listener in self._removal_listeners:
+            try:
+                listener(index_key, index_prefix)
+            except Exception as e:
+                print(f"Warning: Index removal listener failed for {index_key}: {e}")
+
+    def _forget_index(self, index_key: str):
+        """Drop an index from metadata, LRU order and the handle registry. Caller must hold the lock."""
+        if index_key in self._metadata.indexes:
+            self._notify_removed(index_key, self._metadata.indexes[index_key].index_path)
+            del self._metadata.indexes[index_key]
+            self.library_cache._journal_metadata({"op": "remove_index", "key": index_key})
+        if index_key in self._access_order:
+            del self._access_order[index_key]
+        self._invalidate_handles()
+
+    def _is_shard(self, index_key: str) -> bool:
+        """Check if a cached index is a per-library shard."""
+        info = self._metadata.indexes.get(index_key)
+        return info is not None and info.shard
+
+    def _evict_oldest(self, shard: bool = False):
+        """Evict the oldest indexes of the same kind (shard or combined) if at capacity, skipping busy ones."""
+        capacity = self.max_shards if shard else self.max_indexes
+        with self._lock:
+            # capacity counts the indexes of every process sharing the cache
+            self._sync_metadata()
+            candidates = [key for key in self._access_order if self._is_shard(key) == shard]
+            excess = len(candidates) - capacity + 1
+            for oldest_key in candidates:
+                if excess <= 0:
+                    break
+                if self._delete_index_dir(oldest_key):
+                    print(f"Evicted old index: {oldest_key}")
+                    self._forget_index(oldest_key)
+                    excess -= 1
+            if excess > 0:
+                print(f"Warning: Index cache over capacity by {excess}; the remaining indexes are in use")
 
     def has_index(self, algorithm: str, library_paths: List[str]) -> bool:
         """Check if a valid index exists for the given algorithm and libraries."""
-        index_key = self._compute_index_key(algorithm, library_paths)
+        return self._check_index(self._compute_index_key(algorithm, library_paths), algorithm, library_paths)
 
+    def _check_index(self, index_key: str, algorithm: str, library_paths: List[str]) -> bool:
+        """Validate an index against its files on disk and the current library hashes."""
         with self._lock:
             if index_key not in self._metadata.indexes:
                 return False
@@ -640,9 +1284,7 @@ class IndexManager:
             for ext in extensions:
                 if not (Path(str(index_prefix) + ext)).exists():
                     # index is incomplete, remove metadata
-                    del self._metadata.indexes[index_key]
-                    if index_key in self._access_order:
-                        del self._access_order[index_key]
+                    self._forget_index(index_key)
                     return False
 
             # verify library hashes haven't changed
@@ -658,21 +1300,10 @@ class IndexManager:
             return True
 
     def _remove_index(self, index_key: str):
-        """Remove an index from cache."""
+        """Remove an index from cache (its directory stays while another process still uses it)."""
         with self._lock:
-            index_dir = self._get_index_dir(index_key)
-            if index_dir.exists():
-                try:
-                    shutil.rmtree(index_dir)
-                except OSError:
-                    pass
-
-            if index_key in self._metadata.indexes:
-                del self._metadata.indexes[index_key]
-            if index_key in self._access_order:
-                del self._access_order[index_key]
-
-            self.library_cache._save_metadata()
+            self._delete_index_dir(index_key)
+            self._forget_index(index_key)
 
     def get_index_paths(self, algorithm: str, library_paths: List[str]) -> Tuple[str, str]:
         """
@@ -687,53 +1318,122 @@ class IndexManager:
         index_key = self._compute_index_key(algorithm, library_paths)
 
         with self._lock:
-            if not self.has_index(algorithm, library_paths):
+            if not self._check_index(index_key, algorithm, library_paths):
                 raise ValueError(f"No index exists for {algorithm} with given libraries")
 
-            # update access time (move to end of OrderedDict)
-            if index_key in self._access_order:
-                self._access_order.move_to_end(index_key)
-                self._access_order[index_key] = time.time()
-
             info = self._metadata.indexes[index_key]
-            info.last_accessed = time.time()
-            self.library_cache._save_metadata()
+            self._touch_index(index_key)
+            return info.index_path, info.fasta_path
+
+    def _touch_index(self, index_key: str):
+        """Mark an index as most recently used. Caller must hold the lock."""
+        if index_key in self._access_order:
+            self._access_order.move_to_end(index_key)
+            self._access_order[index_key] = time.time()
+
+        # batched access time, no file write on the request path
+        self.library_cache.touch_index(index_key)
+
+    def lookup_index(self, algorithm: str, library_paths: List[str], shard: bool = False) -> Optional[Tuple[str, str]]:
+        """
+        Get (index_prefix, fasta_path) of a valid built index, or None.
+
+        The first lookup of an (algorithm, library set) validates it like
+        get_index_paths (library hashes, index files) and registers a handle;
+        later lookups are a dictionary hit with no filesystem calls, until the
+        handle is invalidated by a library change or an index removal.
+        """
+        registry_key = (algorithm.lower(), frozenset(os.path.abspath(p) for p in library_paths), shard)
 
+        with self._lock:
+            handle = self._handles.get(registry_key)
+            if handle is not None and handle.generation == self._generation:
+                self._handle_hits += 1
+                self._touch_index(handle.index_key)
+                return handle.index_prefix, handle.fasta_path
+            self._handle_misses += 1
+            generation = self._generation
+
+        index_key = self._compute_index_key(algorithm, library_paths, shard)
+        with self._lock:
+            if not self._check_index(index_key, algorithm, library_paths):
+                self._handles.pop(registry_key, None)
+                return None
+
+            info = self._metadata.indexes[index_key]
+            self._touch_index(index_key)
+            # if something was invalidated while validating, this handle is already stale
+            self._handles[registry_key] = IndexHandle(index_key, info.index_path, info.fasta_path, generation)
             return info.index_path, info.fasta_path
 
-    def create_index(self, algorithm: str, library_paths: List[str]) -> Tuple[str, str]:
+    def create_index(self, algorithm: str, library_paths: List[str], shard: bool = False) -> Tuple[str, str]:
         """
         Create an index for the given algorithm and libraries.
 
         If an index already exists and is valid, returns the existing paths.
-        Otherwise, creates a new index (evicting oldest if at capacity).
+        If another thread is already building the same index, waits for that
+        build instead of starting a second one. Otherwise, builds a new index
+        (evicting oldest if at capacity).
 
         Returns:
             Tuple of (index_prefix, fasta_path)
         """
-        # check if valid index already exists
-        if self.has_index(algorithm, library_paths):
-            return self.get_index_paths(algorithm, library_paths)
-
-        with self._lock:
-            index_key = self._compute_index_key(algorithm, library_paths)
+        index_key = self._compute_index_key(algorithm, library_paths, shard)
+
+        while True:
+            # check if valid index already exists
+            index_paths = self.lookup_index(algorithm, library_paths, shard)
+            if index_paths is not None:
+                return index_paths
+
+            with self._lock:
+                build = self._builds.get(index_key)
+                if build is None:
+                    build = IndexBuild(index_key=index_key, algorithm=algorithm, started_at=time.time())
+                    self._builds[index_key] = build
+                    break
 
-            # evict oldest if at capacity
-            self._evict_oldest()
+            # someone else is building this key — wait for it, then re-check
+            build.done.wait()
+            if build.error is not None:
+                raise RuntimeError(f"Index build for {algorithm} failed: {build.error}") from build.error
 
-            # create index directory
-            index_dir = self._get_index_dir(index_key)
-            index_dir.mkdir(parents=True, exist_ok=True)
+        try:
+            # one build per key across processes; whoever waited here may find it published
+            with file_lock(self._lock_path(index_key, "build")):
+                with self._lock:
+                    self._sync_metadata()
+                index_paths = self.lookup_index(algorithm, library_paths, shard)
+                if index_paths is not None:
+                    return index_paths
+                return self._build_index(index_key, algorithm, library_paths, shard)
+        except BaseException as e:
+            build.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._builds[index_key]
+            build.done.set()
+
+    def _build_index(self, index_key: str, algorithm: str, library_paths: List[str],
+                     shard: bool = False) -> Tuple[str, str]:
+        """
+        Build an index in a private staging directory, then publish it.
 
-            fasta_path = str(index_dir / "library.fasta")
-            index_prefix = str(index_dir / "index")
+        The FASTA export and the external indexer run without holding the
+        manager lock; only the final rename into indexes/<key> and the metadata
+        update are done under it. The caller holds the key's build lock.
+        """
+        staging_dir = self.cache_dir / f"{self.STAGING_PREFIX}{index_key}-{uuid.uuid4().hex[:8]}"
+        staging_dir.mkdir(parents=True)
 
+        try:
             # load library documents
             library_docs = self.library_cache.get_documents_for_libraries(library_paths)
 
             # extract features and write FASTA
             extractor = FeatureExtractor(library_docs)
-            extractor.write_fasta(fasta_path)
+            extractor.write_fasta(str(staging_dir / "library.fasta"))
 
             # build index
             algo_map = {
@@ -743,7 +1443,10 @@ class IndexManager:
                 'blast': 'blast'
             }
             tool_name = algo_map.get(algorithm.lower(), algorithm.lower())
-            extractor.build_index(fasta_path, index_prefix, tool_name)
+            if tool_name in self.BUILTIN_INDEX_BUILDERS:
+                self.BUILTIN_INDEX_BUILDERS[tool_name](str(staging_dir / "library.fasta"), str(staging_dir / "index"))
+            else:
+                extractor.build_index(str(staging_dir / "library.fasta"), str(staging_dir / "index"), tool_name)
 
             # get library hashes
             library_hashes = [
@@ -751,35 +1454,184 @@ class IndexManager:
                 for p in sorted(library_paths)
             ]
 
-            # update metadata
-            now = time.time()
-            self._metadata.indexes[index_key] = IndexInfo(
-                algorithm=algorithm,
-                library_hashes=library_hashes,
-                combined_hash=index_key,
-                index_path=index_prefix,
-                fasta_path=fasta_path,
-                created_at=now,
-                last_accessed=now,
-                library_files=list(library_paths)
-            )
+            with self._lock:
+                # evict oldest if at capacity
+                self._evict_oldest(shard)
+
+                # publish: replace any stale/incomplete directory (unrecorded, so unused) with the finished build
+                index_dir = self._get_index_dir(index_key)
+                if index_dir.exists():
+                    self._delete_index_dir(index_key, holding_build_lock=True)
+                os.rename(staging_dir, index_dir)
+
+                fasta_path = str(index_dir / "library.fasta")
+                index_prefix = str(index_dir / "index")
+
+                # update metadata
+                now = time.time()
+                self._metadata.indexes[index_key] = IndexInfo(
+                    algorithm=algorithm,
+                    library_hashes=library_hashes,
+                    combined_hash=index_key,
+                    index_path=index_prefix,
+                    fasta_path=fasta_path,
+                    created_at=now,
+                    last_accessed=now,
+                    library_files=list(library_paths),
+                    shard=shard
+                )
+
+                self._access_order[index_key] = now
+                self.library_cache._journal_metadata({"op": "index", "key": index_key,
+                                                      "value": asdict(self._metadata.indexes[index_key])})
+        except BaseException:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
 
-            self._access_order[index_key] = now
-            self.library_cache._save_metadata()
+        print(f"Created index: {index_key} for {algorithm} with {len(library_paths)} libraries")
 
-            print(f"Created index: {index_key} for {algorithm} with {len(library_paths)} libraries")
+        return index_prefix, fasta_path
 
-            return index_prefix, fasta_path
+    def get_index_key(self, algorithm: str, library_paths: List[str]) -> str:
+        """Get the cache key of the index for the given algorithm and libraries."""
+        return self._compute_index_key(algorithm, library_paths)
 
-    def get_or_create_index(self, algorithm: str, library_paths: List[str]) -> Tuple[str, str]:
+    def get_ready_index_prefixes(self, algorithm: str, library_paths: List[str]) -> Optional[List[str]]:
+        """Get index prefixes (see get_index_prefixes) if every needed index is built, else None (never builds)."""
+        if not self.sharded:
+            index_paths = self.lookup_index(algorithm, library_paths)
+            return [index_paths[0]] if index_paths is not None else None
+
+        for path in library_paths:
+            if self.lookup_index(algorithm, [path], shard=True) is None:
+                return None
+        return self.get_index_prefixes(algorithm, library_paths)
+
+    def is_index_ready(self, algorithm: str, library_paths: List[str]) -> bool:
+        """
+        Check if every index a library selection needs is built and current, without side effects.
+
+        Reads only the metadata, the index files' existence and the library
+        hashes: unlike lookup_index it neither marks indexes as used nor
+        forgets invalid ones, and in sharded mode no BLAST alias is created.
+        For status reporting; the request path keeps using lookup_index.
+        """
+        if self.sharded:
+            selections = [[path] for path in sorted(set(os.path.abspath(p) for p in library_paths))]
+        else:
+            selections = [library_paths]
+
+        algo_lower = algorithm.lower()
+        extensions = self.INDEX_FILES.get('blast' if algo_lower == 'blastn' else algo_lower, [])
+        for paths in selections:
+            index_key = self._compute_index_key(algorithm, paths, shard=self.sharded)
+            with self._lock:
+                info = self._metadata.indexes.get(index_key)
+            if info is None:
+                return False
+            index_prefix = self._get_index_dir(index_key) / "index"
+            if not all(Path(str(index_prefix) + ext).exists() for ext in extensions):
+                return False
+            if [self.library_cache.get_library_hash(path) for path in sorted(paths)] != info.library_hashes:
+                return False
+        return True
+
+    def is_building(self, algorithm: str, library_paths: List[str]) -> bool:
+        """Check if an index for the given algorithm and libraries is being built right now."""
+        index_key = self._compute_index_key(algorithm, library_paths)
+        with self._lock:
+            return index_key in self._builds
+
+    def get_or_create_index(self, algorithm: str, library_paths: List[str], shard: bool = False) -> Tuple[str, str]:
         """
         Get existing index or create new one.
 
         This is the main entry point for getting index paths.
         """
-        if self.has_index(algorithm, library_paths):
-            return self.get_index_paths(algorithm, library_paths)
-        return self.create_index(algorithm, library_paths)
+        index_paths = self.lookup_index(algorithm, library_paths, shard)
+        if index_paths is not None:
+            return index_paths
+        return self.create_index(algorithm, library_paths, shard=shard)
+
+    def get_index_prefixes(self, algorithm: str, library_paths: List[str]) -> List[str]:
+        """
+        Get the index prefixes to align against for a library selection, building as needed.
+
+        Combined mode: a single prefix for the index over the whole selection.
+        Sharded mode: one prefix per library (BWA / Minimap2 — the caller aligns
+        against each and merges the output), or a single BLAST alias database
+        spanning the shards (BLASTN).
+        """
+        if not self.sharded:
+            return [self.get_or_create_index(algorithm, library_paths)[0]]
+
+        shard_prefixes = [
+            self.get_or_create_index(algorithm, [path], shard=True)[0]
+            for path in sorted(set(os.path.abspath(p) for p in library_paths))
+        ]
+
+        if algorithm.lower() in ('blastn', 'blast') and len(shard_prefixes) > 1:
+            return [self._get_blast_alias(shard_prefixes)]
+        return shard_prefixes
+
+    def _index_keys_of(self, index_prefixes: List[str]) -> List[str]:
+        """Index keys behind index prefixes (a BLAST alias stands for its shards)."""
+        keys = []
+        for prefix in index_prefixes:
+            keys.extend(self._alias_shards.get(prefix) or [Path(prefix).parent.name])
+        return keys
+
+    @contextmanager
+    def pin_indexes(self, algorithm: str, library_paths: List[str],
+                    index_prefixes: List[str]) -> Iterator[List[str]]:
+        """
+        Keep the indexes behind index_prefixes from being evicted, by any process, for the block.
+
+        Holds a shared use lock per index. If another process evicted one of them
+        before it was pinned, the selection's indexes are looked up (rebuilt if
+        needed) again and the block gets the new prefixes.
+        """
+        for _ in range(3):
+            keys = self._index_keys_of(index_prefixes)
+            with ExitStack() as pins:
+                for index_key in keys:
+                    pins.enter_context(file_lock(self._lock_path(index_key, "use"), shared=True))
+                missing = [index_key for index_key in keys if not self._get_index_dir(index_key).exists()]
+                if not missing:
+                    yield index_prefixes
+                    return
+
+            with self._lock:
+                for index_key in missing:
+                    self._forget_index(index_key)
+            index_prefixes = self.get_index_prefixes(algorithm, library_paths)
+        raise RuntimeError(f"Indexes for {algorithm} kept being evicted before they could be used")
+
+    def _get_blast_alias(self, shard_prefixes: List[str]) -> str:
+        """
+        Get a BLAST alias database spanning several shard databases.
+
+        Aliases are tiny text files (blastdb_aliastool), so creating one for a
+        new combination costs nothing compared to running makeblastdb.
+        """
+        abs_prefixes = sorted(str(Path(p).resolve()) for p in shard_prefixes)
+        alias_key = hashlib.sha256(",".join(abs_prefixes).encode()).hexdigest()[:16]
+        alias_prefix = self.alias_dir / alias_key / "alias"
+
+        with self._lock:
+            self._alias_shards[str(alias_prefix)] = [Path(p).parent.name for p in abs_prefixes]
+            with file_lock(self.lock_dir / f"alias-{alias_key}.lock"):
+                if Path(str(alias_prefix) + ".nal").exists():
+                    return str(alias_prefix)
+
+                alias_prefix.parent.mkdir(parents=True, exist_ok=True)
+                subprocess.run(
+                    # -dblist is split on spaces: quote each path
+                    ["blastdb_aliastool", "-dblist", " ".join(f'"{p}"' for p in abs_prefixes), "-dbtype", "nucl",
+                     "-out", str(alias_prefix), "-title", f"seqimprove_{alias_key}"],
+                    check=True, capture_output=True, text=True
+                )
+                return str(alias_prefix)
 
     def get_cache_stats(self) -> dict:
         """Get statistics about the index cache."""
@@ -787,12 +1639,26 @@ class IndexManager:
             return {
                 "total_indexes": len(self._metadata.indexes),
                 "max_indexes": self.max_indexes,
+                "sharded": self.sharded,
+                "max_shards": self.max_shards,
                 "cache_dir": str(self.cache_dir),
+                "handle_registry": {
+                    "entries": sum(1 for h in self._handles.values() if h.generation == self._generation),
+                    "generation": self._generation,
+                    # lookups answered from the registry, without touching disk
+                    "hits": self._handle_hits,
+                    "misses": self._handle_misses,
+                },
+                "builds_in_flight": [
+                    {"key": key, "algorithm": build.algorithm, "started": build.started_at}
+                    for key, build in self._builds.items()
+                ],
                 "indexes": [
                     {
                         "key": key,
                         "algorithm": info.algorithm,
                         "libraries": len(info.library_files),
+                        "shard": info.shard,
                         "created": info.created_at,
                         "last_accessed": info.last_accessed
                     }
@@ -801,20 +1667,32 @@ class IndexManager:
             }
 
     def clear_cache(self):
-        """Clear all indexes from cache."""
+        """Clear all indexes from cache, except those being built or used (by any process) right now."""
         with self._lock:
-            # remove all index directories
+            self._sync_metadata()
+            busy = []
             if self.cache_dir.exists():
                 for item in self.cache_dir.iterdir():
-                    if item.is_dir():
-                        try:
-                            shutil.rmtree(item)
-                        except OSError:
-                            pass
-
-            self._metadata.indexes.clear()
-            self._access_order.clear()
-            self.library_cache._save_metadata()
+                    # in-flight builds clean up their own staging directories
+                    if item.is_dir() and not item.name.startswith(self.STAGING_PREFIX):
+                        if not self._delete_index_dir(item.name):
+                            busy.append(item.name)
+
+            if not busy:
+                # aliases point at shard databases that no longer exist
+                shutil.rmtree(self.alias_dir, ignore_errors=True)
+                self._alias_shards.clear()
+                for index_key, info in list(self._metadata.indexes.items()):
+                    self._notify_removed(index_key, info.index_path)
+                self._metadata.indexes.clear()
+                self._access_order.clear()
+                self.library_cache._journal_metadata({"op": "clear_indexes"})
+            else:
+                for index_key in [key for key in self._metadata.indexes if key not in busy]:
+                    self._forget_index(index_key)
+                print(f"Kept {len(busy)} indexes that are in use")
+            self._handles.clear()
+            self._invalidate_handles()
             print("Cleared all indexes from cache")
 
 
@@ -823,12 +1701,14 @@ _library_cache: Optional[LibraryCache] = None
 _index_manager: Optional[IndexManager] = None
 
 
-def init_cache(cache_dir: str = DEFAULT_CACHE_DIR, max_indexes: int = DEFAULT_MAX_INDEXES):
+def init_cache(cache_dir: str = DEFAULT_CACHE_DIR, max_indexes: int = DEFAULT_MAX_INDEXES,
+               sharded: bool = False, max_shards: int = DEFAULT_MAX_SHARDS,
+               metadata_flush_interval: float = DEFAULT_METADATA_FLUSH_INTERVAL):
     """Initialize global cache instances."""
     global _library_cache, _index_manager
 
-    _library_cache = LibraryCache(cache_dir)
-    _index_manager = IndexManager(_library_cache, cache_dir, max_indexes)
+    _library_cache = LibraryCache(cache_dir, metadata_flush_interval)
+    _index_manager = IndexManager(_library_cache, cache_dir, max_indexes, sharded, max_shards)
 
     return _library_cache, _index_manager
 
@@ -0,0 +1,114 @@
+"""
+Copy-on-write overlays over cached feature libraries.
+
+Similar-match annotation (variants) adds definitions and sequences to the
+library documents it annotates with: SYNBICT copies a library definition into
+its own document as a "_v1" variant, then calls FeatureLibrary.update(). The
+cached libraries are shared by every request, so that used to require a fresh
+parse of every selected library's XML per request.
+
+A FeatureLibraryOverlay wraps the shared FeatureLibrary instead. Each library
+document gets a per-request OverlayDocument layer: lookups see the layer then
+the shared document, additions only go to the layer. Feature indices are
+layered the same way. The overlay is discarded with the request, so its cost
+scales with the number of variants, not with library size.
+
+Iterating an OverlayDocument's object stores (doc.componentDefinitions, ...)
+only yields the layer's own objects — FeatureLibrary.update() relies on this
+to load just the added features.
+"""
+
+from collections import ChainMap
+
+import sbol2
+
+from sequences_to_features import FeatureLibrary
+
+
+_NOT_FOUND_CODES = (sbol2.SBOLErrorCode.SBOL_ERROR_NOT_FOUND, sbol2.SBOLErrorCode.NOT_FOUND_ERROR)
+
+
+def _is_not_found(exc: sbol2.SBOLError) -> bool:
+    return exc.error_code() in _NOT_FOUND_CODES
+
+
+class OverlayDocument(sbol2.Document):
+    """
+    Writable per-request layer over a shared, read-only Document.
+
+    Behaves like the shared document for URI lookups and uniqueness checks, so
+    SYNBICT's "copy into the same document" variant logic works unchanged.
+    """
+
+    def __init__(self, base: sbol2.Document):
+        super().__init__()
+        self.base = base
+        self._namespaces = dict(base._namespaces)
+
+    def add(self, sbol_obj):
+        # same uniqueness rule as adding to the shared document itself
+        if sbol_obj.is_top_level() and sbol_obj.identity in self.base.SBOLObjects:
+            raise sbol2.SBOLError(sbol2.SBOLErrorCode.SBOL_ERROR_URI_NOT_UNIQUE,
+                                  'Cannot add ' + sbol_obj.identity + ' to Document. An object with this '
+                                  'identity is already contained in the Document')
+        super().add(sbol_obj)
+
+    def get(self, uri):
+        if uri in self.SBOLObjects:
+            return super().get(uri)
+        return self.base.get(uri)
+
+    def find(self, uri):
+        match = super().find(uri)
+        return match if match is not None else self.base.find(uri)
+
+    def getComponentDefinition(self, uri):
+        try:
+            return super().getComponentDefinition(uri)
+        except sbol2.SBOLError as exc:
+            if not _is_not_found(exc):
+                raise
+        return self.base.getComponentDefinition(uri)
+
+    def getSequence(self, uri):
+        try:
+            return super().getSequence(uri)
+        except sbol2.SBOLError as exc:
+            if not _is_not_found(exc):
+                raise
+        return self.base.getSequence(uri)
+
+
+class _CopyOnReadLists(ChainMap):
+    """ChainMap whose list values are copied into the top layer when read, since callers append to them."""
+
+    def __getitem__(self, key):
+        layer = self.maps[0]
+        if key not in layer:
+            value = super().__getitem__(key)
+            if isinstance(value, list):
+                value = list(value)
+                layer[key] = value
+            return value
+        return layer[key]
+
+
+class FeatureLibraryOverlay(FeatureLibrary):
+    """
+    Per-request mutable view of a shared FeatureLibrary.
+
+    Starts with the shared library's features (no reload); features added by
+    variant creation live only in the overlay.
+    """
+
+    def __init__(self, base: FeatureLibrary):
+        # FeatureLibrary.__init__ would reload every feature from the documents
+        self.base = base
+        self.docs = [OverlayDocument(doc) for doc in base.docs]
+        self.features = list(base.features)
+        self.logger = base.logger
+
+        self._FeatureLibrary__updated_indices = set()
+        self._FeatureLibrary__feature_map = ChainMap({}, base._FeatureLibrary__feature_map)
+        self._FeatureLibrary__feature_dict = ChainMap({}, base._FeatureLibrary__feature_dict)
+        self._FeatureLibrary__name_to_idents = _CopyOnReadLists({}, base._FeatureLibrary__name_to_idents)
@@ -0,0 +1,166 @@
+"""
+Crash-consistent persistence for SeqImprove's cache metadata.
+
+The metadata lives in two files:
+- cache_metadata.json: a checkpoint of the full state, replaced atomically
+  (temp file + rename)
+- cache_metadata.journal: changes since the checkpoint, one JSON record per
+  line, appended and fsynced
+
+Loading reads the checkpoint and replays the journal. Every record is an
+idempotent upsert, removal or access-time bump, so replaying a record the
+checkpoint already contains is harmless, and a crash at any point leaves a
+checkpoint plus a journal prefix that together form a valid state. A torn
+last line (crash mid-append) is dropped. Compaction writes a new checkpoint
+and empties the journal.
+
+Several processes may share the files: every read, append and checkpoint
+holds an exclusive flock on cache_metadata.lock (file_locks), and a
+checkpoint is built from the files themselves (checkpoint + journal), not
+from one process's memory, so changes journaled by other processes are
+merged instead of overwritten.
+
+Records (state is {"libraries": {...}, "indexes": {...}} in CacheMetadata.to_dict form):
+    {"op": "library", "key": path, "value": {...}}      upsert a library
+    {"op": "index", "key": key, "value": {...}}         upsert an index
+    {"op": "remove_index", "key": key}
+    {"op": "clear_indexes"}
+    {"op": "touch", "libraries": {path: t}, "indexes": {key: t}}   bump last_accessed
+"""
+
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List
+
+from file_locks import file_lock
+
+
+JOURNAL_SUFFIX = ".journal"
+LOCK_SUFFIX = ".lock"
+DEFAULT_COMPACT_RECORDS = 1000  # compact once the journal holds this many records
+
+
+def apply_record(state: dict, record: dict):
+    """Apply one journal record to a metadata state dict."""
+    op = record.get("op")
+    if op == "library":
+        state["libraries"][record["key"]] = record["value"]
+    elif op == "index":
+        state["indexes"][record["key"]] = record["value"]
+    elif op == "remove_index":
+        state["indexes"].pop(record["key"], None)
+    elif op == "clear_indexes":
+        state["indexes"].clear()
+    elif op == "touch":
+        for section in ("libraries", "indexes"):
+            for key, accessed in record.get(section, {}).items():
+                entry = state[section].get(key)
+                if entry is not None and accessed > entry.get("last_accessed", 0):
+                    entry["last_accessed"] = accessed
+    else:
+        raise ValueError(f"Unknown metadata journal record: {op}")
+
+
+class MetadataJournal:
+    """Checkpoint + append-only journal for a metadata state dict. Thread- and process-safe."""
+
+    def __init__(self, checkpoint_path: Path, compact_records: int = DEFAULT_COMPACT_RECORDS):
+        self.checkpoint_path = Path(checkpoint_path)
+        self.journal_path = self.checkpoint_path.with_suffix(JOURNAL_SUFFIX)
+        self.lock_path = self.checkpoint_path.with_suffix(LOCK_SUFFIX)
+        self.compact_records = compact_records
+
+        self._lock = threading.Lock()
+        self._records = 0  # records appended since the last checkpoint
+        # never fork mid-append (e.g. the metadata flusher of a preloading parent)
+        os.register_at_fork(before=self._lock.acquire, after_in_parent=self._lock.release,
+                            after_in_child=self._lock.release)
+
+    def load(self) -> dict:
+        """Read the checkpoint and replay the journal; returns the metadata state dict."""
+        with self._lock, file_lock(self.lock_path):
+            state, self._records = self._read_state()
+        return state
+
+    def _read_state(self):
+        """(state, journal records) from the files. Caller must hold both locks."""
+        state = {}
+        if self.checkpoint_path.exists():
+            try:
+                with open(self.checkpoint_path, 'r') as f:
+                    state = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Could not load cache metadata: {e}")
+                state = {}
+        state.setdefault("libraries", {})
+        state.setdefault("indexes", {})
+        return state, self._replay(state)
+
+    def _replay(self, state: dict) -> int:
+        """Apply journal records to state; truncates a torn tail. Caller must hold both locks."""
+        if not self.journal_path.exists():
+            return 0
+
+        replayed = 0
+        good_offset = 0
+        with open(self.journal_path, 'rb+') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("incomplete record")
+                    apply_record(state, json.loads(line))
+                except (ValueError, KeyError, TypeError) as e:
+                    # a crash mid-append; appending after it would corrupt the next record too
+                    print(f"Warning: Dropping metadata journal tail after {replayed} records: {e}")
+                    f.truncate(good_offset)
+                    break
+                good_offset += len(line)
+                replayed += 1
+        return replayed
+
+    def append(self, records: List[dict]):
+        """Durably append records to the journal."""
+        if not records:
+            return
+        data = "".join(json.dumps(record) + "\n" for record in records).encode('utf-8')
+        with self._lock, file_lock(self.lock_path):
+            try:
+                with open(self.journal_path, 'ab') as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Warning: Could not append to cache metadata journal: {e}")
+                return
+            self._records += len(records)
+
+    def needs_compaction(self) -> bool:
+        with self._lock:
+            return self._records >= self.compact_records
+
+    def checkpoint(self) -> dict:
+        """
+        Fold the journal into a new checkpoint and empty it; returns the merged state.
+
+        The state is read back from the files under the lock, so it holds every
+        record appended so far by any process.
+        """
+        with self._lock, file_lock(self.lock_path):
+            state, _ = self._read_state()
+            tmp_path = self.checkpoint_path.with_suffix(".tmp")
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(state, f, indent=2)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.checkpoint_path)
+                # the checkpoint now covers every journaled record
+                with open(self.journal_path, 'wb') as f:
+                    os.fsync(f.fileno())
+            except OSError as e:
+                print(f"Warning: Could not save cache metadata: {e}")
+                return state
+            self._records = 0
+            return state
@@ -0,0 +1,330 @@
+"""
+Built-in approximate aligner: Myers' bit-parallel edit distance over library features.
+
+With allowSimilarDNAMatches the external aligners find near matches through
+seeds, which short features (RBSs, promoters near min_feature_length) often
+do not contain. The "Myers" algorithm scans the target against every library
+feature instead, without seeding, and reports every occurrence within the
+similar-match identity (MIN_IDENTITY_PERCENT):
+
+- build_index reads the library FASTA that IndexManager exports and stores
+  the Myers match masks of every feature on both strands in <index_prefix>.myi
+  (a NumPy .npz without pickled objects). A feature of length m is split into
+  ceil(m / 64) blocks of 64 bits ("lanes").
+- MyersAligner.scan runs the block-based Myers recurrence (Hyyro's block
+  formulation, as in edlib) for all lanes at once with NumPy. Block b of a
+  feature needs the horizontal delta of block b - 1 for the same target
+  position, so lanes advance on an anti-diagonal: at step t block b processes
+  target position t - b, and one NumPy pass per step updates every lane of
+  every feature. The last lane of a feature tracks its edit distance at each
+  target position.
+- End positions within the edit budget are reduced to one per occurrence (the
+  best end of each run), and the alignment is recovered with a row-vectorized
+  dynamic program over the window that can hold it.
+
+Hits are written as SAM (sam_output), so SAMFeatureMapper applies SYNBICT's
+identity and length rules and produces the inline and reverse-complement
+matches as for BWA / Minimap2. Exact-match requests scan with an edit budget
+of zero.
+"""
+
+from typing import List, Optional, Tuple
+
+import numpy as np
+import sbol2
+
+from kmer_index import AMBIGUOUS_CODE, base_codes, read_fasta
+from sam_output import reverse_complement, sam_record, target_query, unmapped_sam_record
+
+
+MYERS_INDEX_SUFFIX = ".myi"
+MIN_IDENTITY_PERCENT = 95  # similar DNA matches: at most 5% of a feature's length in edits
+WORD_BITS = 64
+
+_ONE = np.uint64(1)
+_ALL_ONES = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def build_index(fasta_path: str, index_prefix: str):
+    """Write <index_prefix>.myi for the features of a library FASTA."""
+    names, sequences = read_fasta(fasta_path)
+    sequences = [sequence.upper() for sequence in sequences]
+
+    # entries: each feature forward and reverse complement (palindromes once)
+    entry_features, entry_strands, entry_sequences = [], [], []
+    for feature, sequence in enumerate(sequences):
+        if not sequence:
+            continue
+        reverse = reverse_complement(sequence)
+        for strand, strand_sequence in ((0, sequence), (1, reverse)):
+            if strand and reverse == sequence:
+                continue
+            entry_features.append(feature)
+            entry_strands.append(strand)
+            entry_sequences.append(strand_sequence)
+
+    entry_lengths = np.array([len(sequence) for sequence in entry_sequences], dtype=np.int64)
+    entry_blocks = (entry_lengths + WORD_BITS - 1) // WORD_BITS
+    first_lanes = np.zeros(len(entry_blocks), dtype=np.int64)
+    first_lanes[1:] = np.cumsum(entry_blocks)[:-1]
+    lanes = int(entry_blocks.sum())
+
+    lane_blocks = np.arange(lanes, dtype=np.int64) - np.repeat(first_lanes, entry_blocks)
+    lane_tops = np.full(lanes, WORD_BITS - 1, dtype=np.uint64)
+    last_lanes = first_lanes + entry_blocks - 1
+    lane_tops[last_lanes] = ((entry_lengths - 1) % WORD_BITS).astype(np.uint64)
+
+    # match masks: bit i of peq[lane, code] is set if position 64 * block + i of the entry has that base
+    peq = np.zeros((lanes, AMBIGUOUS_CODE + 1), dtype=np.uint64)
+    if lanes:
+        codes = base_codes("".join(entry_sequences).encode('ascii')).astype(np.int64)
+        positions = np.arange(len(codes), dtype=np.int64) - np.repeat(np.cumsum(entry_lengths) - entry_lengths,
+                                                                      entry_lengths)
+        base_lanes = np.repeat(first_lanes, entry_lengths) + positions // WORD_BITS
+        bits = np.left_shift(_ONE, (positions % WORD_BITS).astype(np.uint64))
+        unambiguous = codes != AMBIGUOUS_CODE  # an ambiguous feature base matches nothing
+        np.bitwise_or.at(peq.reshape(-1), (base_lanes * peq.shape[1] + codes)[unambiguous], bits[unambiguous])
+
+    with open(index_prefix + MYERS_INDEX_SUFFIX, 'wb') as f:
+        np.savez(f, names=np.array(names, dtype=str),
+                 sequences=np.frombuffer("".join(sequences).encode('ascii'), dtype=np.uint8),
+                 lengths=np.array([len(sequence) for sequence in sequences], dtype=np.int64),
+                 entry_features=np.array(entry_features, dtype=np.int64),
+                 entry_strands=np.array(entry_strands, dtype=np.int64),
+                 entry_lengths=entry_lengths, last_lanes=last_lanes,
+                 lane_blocks=lane_blocks, lane_tops=lane_tops, peq=peq)
+
+
+def max_edits(lengths: np.ndarray, exact_match: bool) -> np.ndarray:
+    """Edit budget of features of the given lengths."""
+    if exact_match:
+        return np.zeros(len(lengths), dtype=np.int64)
+    return lengths * (100 - MIN_IDENTITY_PERCENT) // 100
+
+
+def align_window(pattern: str, window: str) -> Tuple[int, List[Tuple[str, str, str]]]:
+    """
+    Edit-distance alignment of all of pattern to a suffix of window (semi-global).
+
+    Returns (start of the aligned suffix in window, operations); operations are
+    ('M', ref, query), ('I', None, query) or ('D', ref, None), in window order.
+    """
+    pattern_codes = base_codes(pattern.encode('ascii'))
+    window_codes = base_codes(window.encode('ascii'))
+    m, w = len(pattern_codes), len(window_codes)
+    columns = np.arange(w + 1, dtype=np.int32)
+
+    # rows vectorized: a row is min(diagonal, up) relaxed left to right by a running minimum
+    distances = np.zeros((m + 1, w + 1), dtype=np.int32)
+    for i in range(1, m + 1):
+        previous = distances[i - 1]
+        code = pattern_codes[i - 1]
+        mismatch = (window_codes != code) | (code == AMBIGUOUS_CODE)
+        row = previous + 1
+        np.minimum(row[1:], previous[:-1] + mismatch, out=row[1:])
+        distances[i] = np.minimum.accumulate(row - columns) + columns
+
+    operations = []
+    i, j = m, w
+    while i > 0:
+        if j > 0:
+            code = pattern_codes[i - 1]
+            cost = int(window_codes[j - 1] != code or code == AMBIGUOUS_CODE)
+            if distances[i, j] == distances[i - 1, j - 1] + cost:
+                operations.append(('M', pattern[i - 1], window[j - 1]))
+                i, j = i - 1, j - 1
+                continue
+            if distances[i, j] == distances[i, j - 1] + 1:
+                operations.append(('I', None, window[j - 1]))
+                j -= 1
+                continue
+        operations.append(('D', pattern[i - 1], None))
+        i -= 1
+    operations.reverse()
+    return j, operations
+
+
+def cigar_md(operations: List[Tuple[str, str, str]]) -> Tuple[str, int, str]:
+    """(CIGAR, NM, MD) of alignment operations in reference order."""
+    cigar, md = [], []
+    nm = run = matches = 0
+    last = None
+    for op, ref, query in operations:
+        if op != last and last is not None:
+            cigar.append(f"{run}{last}")
+            run = 0
+        run += 1
+        if op == 'M' and ref == query and ref in "ACGT":
+            matches += 1
+        elif op == 'M':
+            md.append(f"{matches}{ref}")
+            matches = 0
+        elif op == 'D':
+            # a deletion run is one ^ group
+            md.append(ref if last == 'D' else f"{matches}^{ref}")
+            matches = 0
+        last = op
+        nm += op != 'M' or ref != query or ref not in "ACGT"
+    if last is not None:
+        cigar.append(f"{run}{last}")
+    md.append(str(matches))
+    return "".join(cigar), nm, "".join(md)
+
+
+class MyersAligner:
+    """
+    Approximate aligner over a Myers index; same align(target_doc, output_path, exact_match, query_seq)
+    call as the SYNBICT aligners, and it can stay resident (aligner_engines).
+    """
+
+    algorithm = "myers"
+
+    def __init__(self, index_prefix: str):
+        self.index_prefix = index_prefix
+        with np.load(index_prefix + MYERS_INDEX_SUFFIX, allow_pickle=False) as data:
+            self.names = [str(name) for name in data["names"]]
+            sequence_bytes = data["sequences"].tobytes().decode('ascii')
+            self.lengths = data["lengths"].tolist()
+            self.entry_features = data["entry_features"]
+            self.entry_strands = data["entry_strands"]
+            self.entry_lengths = data["entry_lengths"]
+            self.last_lanes = data["last_lanes"]
+            self.lane_blocks = data["lane_blocks"]
+            self.lane_tops = data["lane_tops"]
+            self.peq = data["peq"]
+
+        offsets = np.cumsum([0] + self.lengths).tolist()
+        self.sequences = [sequence_bytes[offsets[i]:offsets[i + 1]] for i in range(len(self.lengths))]
+        self.header = "@HD\tVN:1.6\tSO:unsorted\n" + "".join(
+            f"@SQ\tSN:{name}\tLN:{length}\n" for name, length in zip(self.names, self.lengths)
+        ) + "@PG\tID:seqimprove-myers\tPN:myers\n"
+
+    def entry_sequence(self, entry: int) -> str:
+        sequence = self.sequences[self.entry_features[entry]]
+        return reverse_complement(sequence) if self.entry_strands[entry] else sequence
+
+    def scan(self, sequence: str, budgets: np.ndarray) -> List[Tuple[int, int, int]]:
+        """
+        Edit distance of every entry (feature strand) ending at every target position.
+
+        Returns (entry, end, distance) for every end (inclusive) within the entry's budget.
+        """
+        codes = base_codes(sequence.upper().encode('ascii')).astype(np.int64)
+        n, lanes = len(codes), len(self.lane_blocks)
+        if n == 0 or lanes == 0:
+            return []
+
+        blocks = int(self.lane_blocks.max()) + 1
+        padded = np.concatenate((np.full(blocks, AMBIGUOUS_CODE), codes, np.full(blocks, AMBIGUOUS_CODE)))
+        peq = self.peq.reshape(-1)
+        lane_peq = np.arange(lanes, dtype=np.int64) * self.peq.shape[1]
+        first = self.lane_blocks == 0
+        tops, last_lanes = self.lane_tops, self.last_lanes
+        last_blocks = self.lane_blocks[last_lanes]
+
+        pv = np.full(lanes, _ALL_ONES, dtype=np.uint64)
+        mv = np.zeros(lanes, dtype=np.uint64)
+        hout = np.zeros(lanes, dtype=np.int64)
+        hin = np.zeros(lanes, dtype=np.int64)
+        distances = self.entry_lengths.copy()
+        hits = []
+
+        for t in range(n + blocks - 1):
+            positions = t - self.lane_blocks
+            eq = peq[lane_peq + padded[positions + blocks]]
+
+            # horizontal delta into block b: what block b - 1 produced for this position last step
+            hin[1:] = hout[:-1]
+            hin[first] = 0
+            negative = (hin < 0).astype(np.uint64)
+            positive = (hin > 0).astype(np.uint64)
+
+            xv = eq | mv
+            eq |= negative
+            xh = (((eq & pv) + pv) ^ pv) | eq
+            ph = mv | ~(xh | pv)
+            mh = pv & xh
+            h = ((ph >> tops) & _ONE).astype(np.int64) - ((mh >> tops) & _ONE).astype(np.int64)
+            ph = (ph << _ONE) | positive
+            mh = (mh << _ONE) | negative
+            new_pv = mh | ~(xv | ph)
+            new_mv = ph & xv
+
+            if t < blocks - 1 or t >= n:
+                # ramp-up / ramp-down: lanes outside the target keep their state
+                active = (positions >= 0) & (positions < n)
+                pv = np.where(active, new_pv, pv)
+                mv = np.where(active, new_mv, mv)
+                h[~active] = 0
+                hout = h
+                distances += h[last_lanes]
+                ends = t - last_blocks
+                within = (distances <= budgets) & (ends >= 0) & (ends < n)
+            else:
+                pv, mv = new_pv, new_mv
+                hout = h
+                distances += h[last_lanes]
+                within = distances <= budgets
+
+            for entry in np.flatnonzero(within).tolist():
+                hits.append((entry, t - int(last_blocks[entry]), int(distances[entry])))
+        return hits
+
+    def find(self, sequence: str, exact_match: bool) -> List[Tuple[int, int, int, int, list]]:
+        """
+        Occurrences of library features in a sequence within the edit budget.
+
+        Returns (query start, query end, feature, strand, operations) sorted by
+        position; operations are in feature (reference) order, None for exact hits.
+        """
+        sequence = sequence.upper()
+        budgets = max_edits(self.entry_lengths, exact_match)
+
+        # one occurrence per run of consecutive end positions: the best end (first on ties);
+        # scan reports each entry's ends in increasing order
+        runs = {}  # entry -> [(best end, best distance, last end)]
+        for entry, end, distance in self.scan(sequence, budgets):
+            entry_runs = runs.setdefault(entry, [])
+            if entry_runs and entry_runs[-1][2] == end - 1:
+                best_end, best_distance, _ = entry_runs[-1]
+                entry_runs[-1] = (end, distance, end) if distance < best_distance else (best_end, best_distance, end)
+            else:
+                entry_runs.append((end, distance, end))
+
+        occurrences = []
+        for entry, entry_runs in runs.items():
+            pattern = self.entry_sequence(entry)
+            m = len(pattern)
+            feature, strand = int(self.entry_features[entry]), int(self.entry_strands[entry])
+            for end, distance, _ in entry_runs:
+                if distance == 0:
+                    occurrences.append((end + 1 - m, end + 1, feature, strand, None))
+                    continue
+                window_start = max(0, end + 1 - m - int(budgets[entry]))
+                start, operations = align_window(pattern, sequence[window_start:end + 1])
+                if strand:
+                    # the reverse complement aligned: express it against the feature's forward strand
+                    operations = [(op, ref and reverse_complement(ref), query and reverse_complement(query))
+                                  for op, ref, query in reversed(operations)]
+                occurrences.append((window_start + start, end + 1, feature, strand, operations))
+        return sorted(occurrences, key=lambda occurrence: occurrence[:4])
+
+    def align(self, target_doc: sbol2.Document, output_path: str, exact_match: bool,
+              query_seq: Optional[str] = None):
+        name, sequence = target_query(target_doc, query_seq)
+        records = []
+        for q_st, q_en, feature, strand, operations in self.find(sequence, exact_match):
+            if operations is None:
+                length = q_en - q_st
+                cigar, nm, md = f"{length}M", 0, str(length)
+            else:
+                cigar, nm, md = cigar_md(operations)
+            # one local alignment per hit, like a chimeric read: first primary, the rest supplementary
+            records.append(sam_record(name, sequence, self.names[feature], 0, q_st, q_en,
+                                      -1 if strand else 1, cigar, nm, md, flag=2048 if records else 0))
+        if not records:
+            records.append(unmapped_sam_record(name, sequence))
+
+        with open(output_path, 'w') as f:
+            f.write(self.header)
+            f.writelines(records)
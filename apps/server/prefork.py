@@ -0,0 +1,79 @@
+"""
+Serve the app from several worker processes that share one copy of the libraries.
+
+The parent binds the port, runs app.load_libraries() (snapshot restore or XML
+parse of every bundled library, plus the FlashText automata) and then forks the
+workers, which all serve that socket with waitress. The workers inherit the
+library objects copy-on-write instead of loading them again. gc.freeze() moves
+them to the permanent generation before the fork, so the workers' garbage
+collections never write to (and so copy) their pages; reference count updates
+still copy the pages of the objects a request touches.
+
+Everything else is per worker, set up by app.setup() on its first request:
+thread pools, index build and annotation jobs (a job is polled on the worker
+that accepted it, so put sticky sessions in front when clients poll), the
+in-memory tiers of the result and Prokka caches, resident aligners. The on-disk
+caches are shared as before. A worker that exits is replaced by a new fork.
+
+Usage: python prefork.py   (SEQIMPROVE_SERVER_WORKERS, SEQIMPROVE_SERVER_PORT)
+"""
+
+import gc
+import os
+import signal
+import socket
+
+from waitress import serve
+
+import app as server
+
+
+def fork_worker(sock: socket.socket) -> int:
+    pid = os.fork()
+    if pid == 0:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        try:
+            serve(server.app, sockets=[sock])
+        finally:
+            os._exit(0)
+    return pid
+
+
+def main():
+    workers = int(os.environ.get("SEQIMPROVE_SERVER_WORKERS") or 2)
+    port = int(os.environ.get("SEQIMPROVE_SERVER_PORT") or 5000)
+
+    sock = socket.create_server(("0.0.0.0", port), backlog=1024)
+    server.load_libraries()
+    # everything loaded so far is left alone by the collector from here on
+    gc.collect()
+    gc.freeze()
+
+    children = {fork_worker(sock) for _ in range(workers)}
+    print(f"Serving on port {port} with {workers} workers: {sorted(children)}")
+
+    stopping = False
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    while children:
+        pid, wait_status = os.wait()
+        children.discard(pid)
+        if not stopping:
+            print(f"Warning: worker {pid} exited ({wait_status}), starting a new one")
+            children.add(fork_worker(sock))
+
+
+if __name__ == "__main__":
+    main()
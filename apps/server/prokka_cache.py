@@ -0,0 +1,184 @@
+"""
+Cache of Prokka results for SeqImprove's codon-aware annotation.
+
+Prokka (gene calling, translation, BLASTP against the library proteins) is the
+slowest annotation stage, and its output only depends on the target sequence,
+its topology and the protein database. Annotation flags (similar protein
+matches, hypothetical proteins) are applied afterwards by filtering the parsed
+ProkkaParser dataframe.
+
+Two tiers:
+- Disk: Prokka's GFF and BLAST outputs under <cache_dir>/prokka/<key>/,
+  survives restarts (LRU by bytes; the newest entry is always kept)
+- Memory: parsed dataframes of recent keys (LRU by entry count)
+"""
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Optional, Tuple
+
+
+PROKKA_CACHE_DIR = "prokka"
+GFF_FILE = "PROKKA_SYNBICT.gff"
+BLAST_FILE = "PROKKA_SYNBICT.blast"
+DEFAULT_MAX_MEMORY_ENTRIES = 32
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+
+
+def make_prokka_key(sequence: str, circular: bool, protein_db_id: str) -> str:
+    """Compute the cache key of a Prokka run (target sequence, topology, protein database)."""
+    key_data = f"{sequence.upper()}|{'circular' if circular else 'linear'}|{protein_db_id}"
+    return hashlib.sha256(key_data.encode('utf-8')).hexdigest()
+
+
+class ProkkaCache:
+    """
+    Disk + memory cache of Prokka outputs and their parsed dataframes.
+
+    Thread-safe. Cached dataframes are shared: callers must copy before mutating.
+    """
+
+    def __init__(self, cache_dir: str, max_memory_entries: int = DEFAULT_MAX_MEMORY_ENTRIES,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.prokka_dir = Path(cache_dir) / PROKKA_CACHE_DIR
+        self.prokka_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        self._dataframes: "OrderedDict[str, Any]" = OrderedDict()  # key -> parsed dataframe
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> bytes on disk, least recently used first
+        self._disk_bytes = 0
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+
+        self._scan_disk()
+
+    @staticmethod
+    def _entry_size(entry_dir: Path) -> int:
+        return sum(path.stat().st_size for path in (entry_dir / GFF_FILE, entry_dir / BLAST_FILE))
+
+    def _scan_disk(self):
+        """Rebuild the disk index from the Prokka directory (oldest use first), then apply the budget."""
+        entries = []
+        for entry_dir in self.prokka_dir.iterdir():
+            if entry_dir.name.startswith(".staging-"):
+                continue
+            try:
+                entries.append((entry_dir.stat().st_mtime, entry_dir.name, self._entry_size(entry_dir)))
+            except OSError as e:
+                print(f"Warning: Dropping incomplete cached Prokka run {entry_dir.name}: {e}")
+                shutil.rmtree(entry_dir, ignore_errors=True)
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    def _add_disk_entry(self, key: str):
+        """Index an entry already on disk as the most recently used. Caller must hold the lock."""
+        try:
+            size = self._entry_size(self.prokka_dir / key)
+        except OSError:
+            return
+        self._disk[key] = size
+        self._disk_bytes += size
+
+    def _evict_disk(self):
+        """Remove least recently used entries over the disk budget, keeping the newest. Caller must hold the lock."""
+        while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            shutil.rmtree(self.prokka_dir / key, ignore_errors=True)
+
+    def get_dataframe(self, key: str) -> Optional[Any]:
+        """Get the parsed dataframe of a Prokka run, or None if not in memory."""
+        with self._lock:
+            df = self._dataframes.get(key)
+            if df is not None:
+                self._dataframes.move_to_end(key)
+                self._hits["memory"] += 1
+            return df
+
+    def put_dataframe(self, key: str, df: Any):
+        """Keep a parsed dataframe in memory (evicting the least recently used)."""
+        with self._lock:
+            self._dataframes[key] = df
+            self._dataframes.move_to_end(key)
+            while len(self._dataframes) > self.max_memory_entries:
+                self._dataframes.popitem(last=False)
+
+    def get_output_paths(self, key: str) -> Optional[Tuple[str, str]]:
+        """Get (gff_path, blast_path) of a cached Prokka run, or None if Prokka has to run."""
+        entry_dir = self.prokka_dir / key
+        gff_path = entry_dir / GFF_FILE
+        blast_path = entry_dir / BLAST_FILE
+        with self._lock:
+            if gff_path.exists() and blast_path.exists():
+                if key in self._disk:
+                    self._disk.move_to_end(key)
+                else:
+                    # stored by another process sharing the cache directory
+                    self._add_disk_entry(key)
+                try:
+                    os.utime(entry_dir)  # last use, for the LRU order after a restart
+                except OSError:
+                    pass
+                self._hits["disk"] += 1
+                return str(gff_path), str(blast_path)
+            self._misses += 1
+            return None
+
+    def store_outputs(self, key: str, gff_path: str, blast_path: str) -> Tuple[str, str]:
+        """Copy Prokka outputs into the cache; returns the cached (gff_path, blast_path)."""
+        entry_dir = self.prokka_dir / key
+
+        # copy into a staging directory, then rename, so readers never see a partial entry
+        staging_dir = Path(tempfile.mkdtemp(prefix=".staging-", dir=self.prokka_dir))
+        try:
+            shutil.copyfile(gff_path, staging_dir / GFF_FILE)
+            shutil.copyfile(blast_path, staging_dir / BLAST_FILE)
+            try:
+                os.rename(staging_dir, entry_dir)
+            except OSError:
+                # a concurrent run of the same target already stored it
+                shutil.rmtree(staging_dir, ignore_errors=True)
+        except OSError:
+            shutil.rmtree(staging_dir, ignore_errors=True)
+            raise
+
+        with self._lock:
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            else:
+                self._add_disk_entry(key)
+            self._evict_disk()
+
+        return str(entry_dir / GFF_FILE), str(entry_dir / BLAST_FILE)
+
+    def clear(self):
+        """Remove all cached Prokka results."""
+        with self._lock:
+            self._dataframes.clear()
+            self._disk.clear()
+            self._disk_bytes = 0
+            shutil.rmtree(self.prokka_dir, ignore_errors=True)
+            self.prokka_dir.mkdir(parents=True, exist_ok=True)
+
+    def get_stats(self) -> dict:
+        """Get statistics about the Prokka cache."""
+        with self._lock:
+            return {
+                "memory_entries": len(self._dataframes),
+                "max_memory_entries": self.max_memory_entries,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": dict(self._hits),
+                "misses": self._misses,
+            }
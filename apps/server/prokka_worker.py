@@ -0,0 +1,35 @@
+"""
+Run ProkkaAligner on one target document in the current working directory.
+
+ProkkaAligner reads ./database_protein.fasta and writes ./PROKKA_SYNBICT/,
+paths relative to the process working directory. app._run_prokka starts this
+script in a per-request scratch directory so several Prokka runs can proceed
+at once without clobbering each other's files.
+
+Usage: python prokka_worker.py <target_sbol.xml>
+"""
+
+import sys
+
+import sbol2
+
+from sequences_to_features import ProkkaAligner
+
+
+def main(target_path: str):
+    sbol2.setHomespace('http://seqimprove.synbiohub.org')
+    sbol2.Config.setOption('validate', True)
+    sbol2.Config.setOption('sbol_typed_uris', False)
+
+    target_doc = sbol2.Document()
+    target_doc.read(target_path)
+
+    # outputs to ./PROKKA_SYNBICT/ (the scratch directory)
+    ProkkaAligner(target_doc).align()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) != 2:
+        print(__doc__.strip().splitlines()[-1], file=sys.stderr)
+        sys.exit(2)
+    main(sys.argv[1])
@@ -0,0 +1,220 @@
+"""
+Content-addressed cache of annotation results for SeqImprove.
+
+Re-annotating the same design with the same libraries, algorithm and flags
+returns the stored result instead of rerunning cleaning, alignment, Prokka
+and annotation.
+
+Two tiers, each with its own byte budget and LRU eviction:
+- Memory: serialized results of recent requests
+- Disk: <cache_dir>/results/<key>.json, survives restarts
+
+Keys hash the target SBOL, the content hashes of the selected libraries, the
+algorithm and every flag, so a changed library never serves a stale result.
+Entries built from a library are also dropped as soon as its hash changes
+(invalidate_library), instead of waiting for eviction.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+RESULTS_DIR = "results"
+DEFAULT_MAX_MEMORY_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_DISK_BYTES = 512 * 1024 * 1024
+
+
+def make_result_key(sbol_content: str, library_hashes: List[str], algorithm: str, flags: Dict[str, Any]) -> str:
+    """Compute the cache key of an annotation request."""
+    key_data = {
+        "sbol": hashlib.sha256(sbol_content.encode('utf-8')).hexdigest(),
+        "libraries": sorted(library_hashes),
+        "algorithm": algorithm.lower(),
+        "flags": flags,
+    }
+    return hashlib.sha256(json.dumps(key_data, sort_keys=True).encode()).hexdigest()
+
+
+class ResultCache:
+    """
+    Memory + disk LRU cache of annotation results (JSON-serializable values).
+
+    Thread-safe. Each entry remembers the library hashes it was built from so
+    it can be invalidated when one of them changes.
+    """
+
+    def __init__(self, cache_dir: str, max_memory_bytes: int = DEFAULT_MAX_MEMORY_BYTES,
+                 max_disk_bytes: int = DEFAULT_MAX_DISK_BYTES):
+        self.results_dir = Path(cache_dir) / RESULTS_DIR
+        self.results_dir.mkdir(parents=True, exist_ok=True)
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+
+        self._lock = threading.Lock()
+        # key -> (serialized value, library hashes), least recently used first
+        self._memory: "OrderedDict[str, tuple[bytes, List[str]]]" = OrderedDict()
+        self._memory_bytes = 0
+        # key -> (file size, library hashes), least recently used first
+        self._disk: "OrderedDict[str, tuple[int, List[str]]]" = OrderedDict()
+        self._disk_bytes = 0
+        self._hits = {"memory": 0, "disk": 0}
+        self._misses = 0
+
+        self._scan_disk()
+
+    def _entry_path(self, key: str) -> Path:
+        return self.results_dir / f"{key}.json"
+
+    def _scan_disk(self):
+        """Rebuild the disk index from the results directory (oldest access first)."""
+        entries = []
+        for path in self.results_dir.glob("*.json"):
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    header = json.loads(f.readline())
+                stat = path.stat()
+            except (OSError, json.JSONDecodeError) as e:
+                print(f"Warning: Dropping unreadable cached result {path.name}: {e}")
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+                continue
+            entries.append((stat.st_mtime, path.stem, stat.st_size, header.get("library_hashes", [])))
+
+        for _, key, size, library_hashes in sorted(entries):
+            self._disk[key] = (size, library_hashes)
+            self._disk_bytes += size
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a cached result, or None on a miss."""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self._hits["memory"] += 1
+                return json.loads(entry[0])
+
+            disk_entry = self._disk.get(key)
+            if disk_entry is None:
+                self._misses += 1
+                return None
+
+            path = self._entry_path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    f.readline()  # header
+                    payload = f.read().encode('utf-8')
+                os.utime(path)
+            except OSError:
+                self._remove_disk_entry(key)
+                self._misses += 1
+                return None
+
+            self._disk.move_to_end(key)
+            self._hits["disk"] += 1
+            # promote to memory
+            self._put_memory(key, payload, disk_entry[1])
+            return json.loads(payload)
+
+    def put(self, key: str, value: Any, library_hashes: List[str]):
+        """Store a result in both tiers."""
+        payload = json.dumps(value).encode('utf-8')
+        header = json.dumps({"library_hashes": library_hashes}).encode('utf-8') + b"\n"
+
+        with self._lock:
+            self._put_memory(key, payload, library_hashes)
+
+            if len(header) + len(payload) > self.max_disk_bytes:
+                return
+
+            # write to temp file then rename, so readers never see a partial entry
+            path = self._entry_path(key)
+            tmp_path = path.with_suffix(".tmp")
+            try:
+                with open(tmp_path, 'wb') as f:
+                    f.write(header)
+                    f.write(payload)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f"Warning: Could not write cached result {key}: {e}")
+                return
+
+            if key in self._disk:
+                self._disk_bytes -= self._disk.pop(key)[0]
+            size = len(header) + len(payload)
+            self._disk[key] = (size, library_hashes)
+            self._disk_bytes += size
+
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                self._remove_disk_entry(next(iter(self._disk)))
+
+    def _put_memory(self, key: str, payload: bytes, library_hashes: List[str]):
+        """Insert into the memory tier and evict LRU entries over budget. Caller must hold the lock."""
+        if len(payload) > self.max_memory_bytes:
+            return
+
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[0])
+        self._memory[key] = (payload, library_hashes)
+        self._memory_bytes += len(payload)
+
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, (evicted, _) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _remove_disk_entry(self, key: str):
+        """Remove an entry from the disk tier. Caller must hold the lock."""
+        entry = self._disk.pop(key, None)
+        if entry is not None:
+            self._disk_bytes -= entry[0]
+        try:
+            self._entry_path(key).unlink()
+        except OSError:
+            pass
+
+    def invalidate_library(self, library_hash: str) -> int:
+        """Drop every result built from a library version. Returns the number of entries removed."""
+        with self._lock:
+            memory_keys = [key for key, (_, hashes) in self._memory.items() if library_hash in hashes]
+            for key in memory_keys:
+                self._memory_bytes -= len(self._memory.pop(key)[0])
+
+            disk_keys = [key for key, (_, hashes) in self._disk.items() if library_hash in hashes]
+            for key in disk_keys:
+                self._remove_disk_entry(key)
+
+            return len(set(memory_keys) | set(disk_keys))
+
+    def on_library_changed(self, abs_path: str, old_hash: str, new_hash: str):
+        """LibraryCache change listener: invalidate results of the previous library version."""
+        removed = self.invalidate_library(old_hash)
+        if removed:
+            print(f"Invalidated {removed} cached results for changed library {os.path.basename(abs_path)}")
+
+    def clear(self):
+        """Remove all cached results."""
+        with self._lock:
+            self._memory.clear()
+            self._memory_bytes = 0
+            for key in list(self._disk):
+                self._remove_disk_entry(key)
+
+    def get_stats(self) -> dict:
+        """Get statistics about the result cache."""
+        with self._lock:
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "max_memory_bytes": self.max_memory_bytes,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "max_disk_bytes": self.max_disk_bytes,
+                "hits": dict(self._hits),
+                "misses": self._misses,
+            }
@@ -0,0 +1,58 @@
+"""
+SAM output for SeqImprove's in-process aligners.
+
+The SYNBICT feature mappers read aligner output from a file, so in-process
+aligners (aligner_engines.MappyEngine, kmer_index.KmerIndexAligner) write the
+same SAM that `minimap2 -a` would: the target is the query and library
+features are the references. SAMFeatureMapper then turns the records into
+inline and reverse-complement matches as for any other aligner.
+"""
+
+from typing import Optional
+
+import sbol2
+
+
+_COMPLEMENT = str.maketrans("ACGTUNacgtun", "TGCAANtgcaan")
+
+
+def reverse_complement(sequence: str) -> str:
+    return sequence.translate(_COMPLEMENT)[::-1]
+
+
+def sam_record(name: str, sequence: str, ref_name: str, ref_start: int, q_st: int, q_en: int, strand: int,
+               cigar: str, nm: int, md: Optional[str], flag: int = 0, mapq: int = 60) -> str:
+    """
+    One SAM line for a local alignment of query[q_st:q_en] (forward query coordinates)
+    to ref_name from 0-based ref_start; strand < 0 means the reverse complement aligned.
+    The unaligned query ends are soft-clipped, or hard-clipped for supplementary
+    records (flag 2048), whose SEQ is then only the aligned part, as `bwa mem` writes them.
+    """
+    clip_left, clip_right = q_st, len(sequence) - q_en
+    clip = "S"
+    if flag & 2048:
+        sequence = sequence[q_st:q_en]
+        clip = "H"
+    if strand < 0:
+        flag |= 16
+        sequence = reverse_complement(sequence)
+        clip_left, clip_right = clip_right, clip_left
+
+    cigar = (f"{clip_left}{clip}" if clip_left else "") + cigar + (f"{clip_right}{clip}" if clip_right else "")
+    tags = f"NM:i:{nm}\ttp:A:{'S' if flag & 256 else 'P'}"
+    if md:
+        tags += f"\tMD:Z:{md}"
+    return f"{name}\t{flag}\t{ref_name}\t{ref_start + 1}\t{mapq}\t{cigar}\t*\t0\t0\t{sequence}\t*\t{tags}\n"
+
+
+def unmapped_sam_record(name: str, sequence: str) -> str:
+    return f"{name}\t4\t*\t0\t0\t*\t*\t0\t0\t{sequence}\t*\n"
+
+
+def target_query(target_doc: sbol2.Document, query_seq: Optional[str]) -> tuple:
+    """(query name, query sequence) of a target, as the SYNBICT aligners take them."""
+    from sequences_to_features.sbol_utils import sbol_sequence
+
+    target_cd = target_doc.componentDefinitions[0] if len(target_doc.componentDefinitions) else None
+    name = target_cd.displayId if target_cd is not None else "query"
+    return name, (query_seq or sbol_sequence(target_doc)).upper()
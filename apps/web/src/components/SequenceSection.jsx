@@ -17,6 +17,8 @@ import { SynBioHubClientLogin } from "./CurationForm";
 import { importLibrary, checkLibraryCache } from "../modules/api";
 
 const WORDSIZE = 8;
+// server default of SEQIMPROVE_MYERS_MAX_TARGET: Myers rejects longer targets
+const MYERS_MAX_TARGET_LENGTH = 20000;
 
 function isValidUrl(string) {
     try {
@@ -295,6 +297,10 @@ function Annotations({ colors }) {
             showErrorNotification('Library not imported', `"${names}" is not cached on the server. Please import it using the SynBioHub button before analyzing.`)
             return
         }
+        if (isMyersTooLong) {
+            showErrorNotification('Sequence too long for Myers', `Myers supports sequences up to ${MYERS_MAX_TARGET_LENGTH} bp. Use BWA, Minimap2 or BLASTN for longer sequences.`)
+            return
+        }
         loadSequenceAnnotations(libs, selectedAlgorithm, similarDNAMatches, allowSimilarMatches, codonMatches, includeHypothetical, isCircular)
     }
 
@@ -304,6 +310,10 @@ function Annotations({ colors }) {
     // (similar/codon/protein matching, circular). Disable and reset them when
     // it is selected so stale values are never sent to the backend.
     const isFlashText = selectedAlgorithm === 'FlashText';
+    // KmerIndex only finds exact DNA matches
+    const isExactOnly = selectedAlgorithm === 'KmerIndex';
+    // Myers scans the whole target position by position; the server rejects long targets
+    const isMyersTooLong = selectedAlgorithm === 'Myers' && (sequence?.length ?? 0) > MYERS_MAX_TARGET_LENGTH;
 
     const handleAlgorithmChange = (value) => {
         setSelectedAlgorithm(value);
@@ -313,6 +323,8 @@ function Annotations({ colors }) {
             setAllowSimilarMatches(false);
             setIncludeHypothetical(false);
             setIsCircular(false);
+        } else if (value === 'KmerIndex') {
+            setSimilarDNAMatches(false);
         }
     };
 
@@ -348,19 +360,25 @@ function Annotations({ colors }) {
                     { value: 'FlashText', label: 'FlashText' },
                     { value: 'BWA', label: 'BWA' },
                     { value: 'Minimap2', label: 'Minimap2' },
-                    { value: 'BLASTN', label: 'BLASTN' }
+                    { value: 'BLASTN', label: 'BLASTN' },
+                    { value: 'KmerIndex', label: 'KmerIndex (exact)' },
+                    { value: 'Myers', label: 'Myers (bit-parallel)' }
                 ]}
             />
+            {isMyersTooLong &&
+                <Text size="sm" color="red" mt={4}>
+                    Myers supports sequences up to {MYERS_MAX_TARGET_LENGTH} bp; this one is {sequence.length} bp. Use BWA, Minimap2 or BLASTN instead.
+                </Text>}
 
             <Group mt="sm" spacing="xs">
                 <Checkbox
                     label="Similar DNA Sequence Matches"
                     checked={similarDNAMatches}
-                    disabled={isFlashText}
+                    disabled={isFlashText || isExactOnly}
                     onChange={(event) => setSimilarDNAMatches(event.currentTarget.checked)}
                 />
                 <Tooltip
-                    label="Allow DNA-level matches with 95%+ sequence identity instead of requiring exact DNA matches (applies to BWA, Minimap2, BLASTN)"
+                    label="Allow DNA-level matches with 95%+ sequence identity instead of requiring exact DNA matches (applies to BWA, Minimap2, BLASTN, Myers)"
                     position="right"
                     withArrow
                     multiline
@@ -451,7 +469,7 @@ function Annotations({ colors }) {
                     onChange={(event) => setIsCircular(event.currentTarget.checked)}
                 />
                 <Tooltip
-                    label="Treat the target as a circular plasmid so features spanning the origin are detected (applies to BWA, Minimap2, BLASTN)"
+                    label="Treat the target as a circular plasmid so features spanning the origin are detected (applies to BWA, Minimap2, BLASTN, KmerIndex, Myers)"
                     position="right"
                     withArrow
                     multiline